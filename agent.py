@@ -1,45 +1,18 @@
+import functools
 import os
-from textwrap import dedent
-from datetime import datetime  
-from dotenv import load_dotenv
-import re
+import sys
 import time
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import (
-    SimpleDocTemplate,
-    Paragraph,
-    Spacer,
-    Table,
-    TableStyle,
-)
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_JUSTIFY
-from reportlab.lib.units import cm
-from interface_perfil import run_profile_app
+from datetime import datetime
+from textwrap import dedent
 
-# Carrega as variáveis de ambiente do arquivo .env
-load_dotenv()
+# As dependências pesadas (agno, reportlab, yfinance, dotenv) são importadas apenas quando
+# usadas, para que `import agent` seja rápido em workers de lote e ferramentas de linha de comando.
 
-from agno.agent import Agent
-from agno.models.google import Gemini
-from agno.tools.yfinance import YFinanceTools
+MODEL_ID = "gemini-1.5-flash"
 
 # --- AGENTE FINANCEIRO INTELIGENTE  ---
-finance_agent = Agent(
-    model=Gemini(id="gemini-1.5-flash"),  
-    tools=[
-        YFinanceTools(
-            stock_price=True,
-            analyst_recommendations=True,
-            stock_fundamentals=True,
-            historical_prices=True,
-            company_info=True,
-            company_news=True,
-        )
-    ],
-    instructions=dedent(
-        """\
+FINANCE_AGENT_INSTRUCTIONS = dedent(
+    """\
 Você é um **Consultor Financeiro Pessoal Exímio e um Analista de Investimentos Sênior de Wall Street**. 💼📈
 
 Sua missão é fornecer **análises financeiras aprofundadas** e **recomendações estratégicas de investimento altamente personalizadas**, com **orientações práticas e acionáveis** sobre o que fazer com o dinheiro do usuário, com base no seu perfil financeiro e objetivos declarados.
@@ -65,13 +38,18 @@ Sua missão é fornecer **análises financeiras aprofundadas** e **recomendaçõ
     - **Dados Fundamentais:** Obtenha preço atual, alta/baixa 52 semanas, P/E, Market Cap, EPS, dividend yield, histórico de dividendos, notícias recentes, **Valor Patrimonial por Ação (VPA), Margens (Bruta, Líquida, EBITDA), Endividamento (Dívida Líquida/EBITDA), Fluxo de Caixa Operacional/Livre, Crescimento de Lucro (CAGR), Recomendação de Consenso de Analistas (se disponível) e Volume Médio Diário**.
     - **Performance Histórica:** Analise tendências de preços (curto, médio e longo prazo) para identificar padrões de crescimento ou desvalorização.
     - **Análise de Dividendos:** Avalie a sustentabilidade e o histórico de pagamento de dividendos, alinhando com o objetivo de renda passiva do usuário.
+    - Quando o prompt trouxer as **MÉTRICAS DE PROVENTOS** pré-calculadas (DY 12m, CAGR, regularidade, meses sem pagamento, yield on cost e renda mensal projetada), use-as na análise de dividendos e na renda passiva, sem buscar o histórico de proventos.
 - **Busca e Comparação Setorial:**
     - **Identifique outras ações líderes no MESMO SETOR** das ações de interesse do usuário (ex: para PETR4, buscar outras de Energia/Petróleo; para ITSA4, buscar outros Bancos/Financeiras).
+    - Quando o prompt trouxer os **INDICADORES DE DESEMPENHO** pré-calculados, use esses retornos, volatilidades e médias móveis como a performance histórica, sem buscar o histórico de preços.
+    - Quando o prompt trouxer a **TABELA COMPARATIVA SETORIAL** pré-calculada, use-a diretamente e não busque novamente os dados das pares listadas.
     - **Compare** as ações de interesse do usuário com essas pares do setor em termos de múltiplos de valuation (P/E, P/VP), crescimento de receita/lucro, dividendos, market share, e perspectivas futuras.
+    - Para consultar várias ações de uma vez (carteira e pares do setor), use a ferramenta `get_stocks_summary` com a lista completa de tickers, em vez de uma chamada por ação.
     - **Avalie a situação delas** e se **compensa migrar** ou diversificar para essas alternativas, apresentando os prós e contras de cada movimento.
 
 
 #### 3. PLANO DE AÇÃO PRÁTICO PARA USO DO DINHEIRO:
+- Quando o prompt trouxer o **PLANO DE ALOCAÇÃO OTIMIZADO** (reserva de emergência, classes de ativos e tickers em % e R$), use exatamente esses valores nas seções de alocação e explique-os ao investidor, sem recalculá-los nem propor outra divisão.
 - **Reserva de Emergência:** Calcule e recomende o valor restante necessário para atingir a meta da reserva de emergência e sugira a melhor alocação para esse fim (ex: Tesouro Selic, CDB de liquidez diária).
 - **Alocação de Investimento Mensal:** Proponha uma **distribuição percentual detalhada da economia mensal disponível** para investir em diferentes classes de ativos (ex: ações, FIIs, renda fixa), alinhada com o perfil de risco e os objetivos (curto, médio e longo prazo).
 - **QUANTO INVESTIR E QUANDO ATINGIR OBJETIVOS:**
@@ -126,17 +104,11 @@ Sua missão é fornecer **análises financeiras aprofundadas** e **recomendaçõ
 - As condições de mercado são voláteis. Consulte sempre um **profissional certificado** antes de tomar decisões de investimento.
 - **Diversificação e disciplina são fundamentais** para a mitigação de riscos.
 """
-    ),
-    add_datetime_to_instructions=True,
-    show_tool_calls=True,
-    markdown=True,
 )
 
 # Este agente receberá a saída do agente principal e a reformulará para o formato final.
-report_refiner_agent = Agent(
-    model=Gemini(id="gemini-1.5-flash"),
-    instructions=dedent(
-        """\
+REPORT_REFINER_INSTRUCTIONS = dedent(
+    """\
         Você é um **Editor Sênior de Relatórios Financeiros e Especialista em Comunicação Corporativa**. 📝✨
         Sua tarefa é receber um rascunho de análise financeira e transformá-lo em um relatório final **único, bem escrito, conciso, e com linguagem profissional, mas fácil de compreender** para um investidor.
 
@@ -155,184 +127,242 @@ report_refiner_agent = Agent(
 
         Seu output deve ser o relatório final completo, pronto para ser apresentado.
         """
-    ),
-    add_datetime_to_instructions=False,
-    show_tool_calls=False,
-    markdown=True,
 )
 
 
-# --- FUNÇÃO DE EXPORTAÇÃO PARA PDF ---
-def export_to_pdf(text_content, filename="relatorio_financeiro.pdf"):
+@functools.lru_cache(maxsize=None)
+def load_environment():
     """
-    Converte um texto Markdown (com tabelas e cabeçalhos simples) em um arquivo PDF.
+    Carrega as variáveis de ambiente do arquivo .env (uma única vez por processo).
     """
-    doc = SimpleDocTemplate(
-        filename,
-        pagesize=A4,
-        rightMargin=2 * cm,
-        leftMargin=2 * cm,
-        topMargin=2 * cm,
-        bottomMargin=2 * cm,
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+def create_model():
+    """
+    Modelo Gemini com limitador de cota. GEMINI_BASE_URL (inclusive no .env) aponta o modelo para
+    outro endpoint compatível com a API do Gemini, como backends_falsos.FakeGeminiServer.
+    """
+    load_environment()
+    from limitador_cota import QuotaAwareGemini
+    from sessao_http import gemini_http_options, shared_sessions_enabled
+
+    base_url = os.getenv("GEMINI_BASE_URL")
+    if shared_sessions_enabled():
+        # Todos os agentes (e relatórios) do processo usam o mesmo pool de conexões.
+        http_options = gemini_http_options(base_url)
+    else:
+        http_options = {"base_url": base_url} if base_url else None
+    return QuotaAwareGemini(
+        id=MODEL_ID,
+        api_key=os.getenv("GOOGLE_API_KEY") or ("local" if base_url else None),
+        client_params={"http_options": http_options} if http_options else None,
     )
-    styles = getSampleStyleSheet()
-    styles["h1"].fontName = "Helvetica-Bold"
-    styles["h1"].fontSize = 18
-    styles["h1"].spaceAfter = 14
-
-    styles["h2"].fontName = "Helvetica-Bold"
-    styles["h2"].fontSize = 14
-    styles["h2"].spaceAfter = 10
-
-    styles["Normal"].fontName = "Helvetica"
-    styles["Normal"].fontSize = 10
-    styles["Normal"].leading = 12
-    styles["Normal"].alignment = TA_JUSTIFY
-
-    styles.add(
-        ParagraphStyle(
-            name="CustomListItem",
-            fontName="Helvetica",
-            fontSize=10,
-            leading=12,
-            leftIndent=12,
-        )
+
+
+def create_finance_agent():
+    """
+    Cria o agente principal de análise, com as ferramentas do Yahoo Finance.
+    """
+    load_environment()
+    from agno.agent import Agent
+    from cache_mercado import CachedYFinanceTools
+
+    return Agent(
+        model=create_model(),
+        tools=[
+            CachedYFinanceTools(
+                stock_price=True,
+                analyst_recommendations=True,
+                stock_fundamentals=True,
+                company_info=True,
+                company_news=True,
+                stocks_summary=True,
+            )
+        ],
+        instructions=FINANCE_AGENT_INSTRUCTIONS,
+        add_datetime_to_instructions=True,
+        show_tool_calls=True,
+        markdown=True,
     )
-    styles.add(
-        ParagraphStyle(
-            name="CustomTableText",
-            fontName="Helvetica",
-            fontSize=9,
-            leading=11,
-            alignment=TA_JUSTIFY,
-        )
+
+
+def create_report_refiner_agent():
+    """
+    Cria o agente que revisa e formata o rascunho da análise.
+    """
+    load_environment()
+    from agno.agent import Agent
+
+    return Agent(
+        model=create_model(),
+        instructions=REPORT_REFINER_INSTRUCTIONS,
+        add_datetime_to_instructions=False,
+        show_tool_calls=False,
+        markdown=True,
     )
 
-    story = []
-    lines = text_content.split("\n")
-    in_table = False
-    table_data = []
-
-    for line in lines:
-        stripped_line = line.strip()
-        if stripped_line.startswith("|") and "|" in stripped_line[1:]:
-            if not in_table:
-                in_table = True
-                table_data = []
-            row = [
-                Paragraph(
-                    cell.strip().replace("- ", "<br/>- "), styles["CustomTableText"]
-                )
-                for cell in stripped_line.split("|")
-                if cell.strip()
-            ]
-            if row:
-                table_data.append(row)
-            continue
-        elif in_table:  
-            in_table = False
-            if table_data:
-                num_cols = len(table_data[0]) if table_data else 0
-                if num_cols > 0:
-                    table_style = TableStyle(
-                        [
-                            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#F2F2F2")),
-                            ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                            ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-                            ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-                            ("BACKGROUND", (0, 1), (-1, -1), colors.white),
-                            ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#CCCCCC")),
-                            ("LEFTPADDING", (0, 0), (-1, -1), 4),
-                            ("RIGHTPADDING", (0, 0), (-1, -1), 4),
-                            ("TOPPADDING", (0, 0), (-1, -1), 4),
-                            ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-                        ]
-                    )
-                    if len(table_data) > 1 and all(
-                        isinstance(c, Paragraph) and "-" in c.text
-                        for c in table_data[1]
-                    ):
-                        table_data = [table_data[0]] + table_data[2:]
-
-                    table_obj = Table(
-                        table_data,
-                        colWidths=(
-                            [doc.width / num_cols] * num_cols if num_cols > 0 else None
-                        ),
-                    )
-                    table_obj.setStyle(table_style)
-                    story.append(table_obj)
-                    story.append(Spacer(1, 0.2 * cm))
-            table_data = []
-
-        if stripped_line.startswith("## "):
-            story.append(Paragraph(stripped_line[3:].strip(), styles["h1"]))
-            story.append(Spacer(1, 0.2 * cm))
-        elif stripped_line.startswith("### "):
-            story.append(Paragraph(stripped_line[4:].strip(), styles["h2"]))
-            story.append(Spacer(1, 0.1 * cm))
-
-        elif stripped_line.startswith("- "):
-            story.append(Paragraph(stripped_line, styles["CustomListItem"]))
-        
-        elif stripped_line:
-            formatted_line = line
-            formatted_line = re.sub(
-                r"\*\*(.*?)\*\*", r"<b>\1</b>", formatted_line
-            )  # Negrito
-            formatted_line = re.sub(
-                r"\*(.*?)\*", r"<i>\1</i>", formatted_line
-            )  # Itálico
-
-            story.append(Paragraph(formatted_line, styles["Normal"]))
-            if not in_table:
-                story.append(Spacer(1, 0.1 * cm))
-        else:
-            story.append(Spacer(1, 0.1 * cm))
-
-    doc.build(story)
-    print(f"Relatório salvo como: {filename}")
 
+@functools.lru_cache(maxsize=None)
+def get_finance_agent():
+    """
+    Agente de análise compartilhado, construído no primeiro uso.
+    """
+    return create_finance_agent()
 
-# --- INÍCIO DO FLUXO PRINCIPAL ---
 
-print("--- Abrindo interface para preenchimento do perfil ---")
+@functools.lru_cache(maxsize=None)
+def get_report_refiner_agent():
+    """
+    Agente de refinamento compartilhado, construído no primeiro uso.
+    """
+    return create_report_refiner_agent()
 
-profile_data = run_profile_app()
 
-if not profile_data:
-    print("Preenchimento do perfil cancelado ou falhou. Encerrando o programa.")
-    exit()
+def __getattr__(name):
+    # Mantém `agent.finance_agent` e `agent.report_refiner_agent` funcionando sem construí-los na importação.
+    if name == "finance_agent":
+        return get_finance_agent()
+    if name == "report_refiner_agent":
+        return get_report_refiner_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-data_analise = datetime.now().strftime("%Y-%m-%d")
 
-economia_mensal_disponivel = profile_data["renda_mensal"] - profile_data["gastos_fixos"]
+# --- FUNÇÃO DE EXPORTAÇÃO PARA PDF ---
+def export_to_pdf(text_content, filename="relatorio_financeiro.pdf"):
+    """
+    Converte um texto Markdown (com tabelas e cabeçalhos simples) em um arquivo PDF.
+    """
+    from rastreamento import profiled, tracer
+    from relatorio_pdf import export_to_pdf as _export_to_pdf
 
-acoes_formatadas = profile_data["acoes_interesse"]
+    with tracer.span("export_to_pdf", caracteres=len(text_content)), profiled("export_to_pdf"):
+        _export_to_pdf(text_content, filename)
 
-obj_curto_formatado = ""
-if profile_data["obj_curto"].strip():
-    obj_curto_formatado += f"- **Curto Prazo (até 1 ano):**\n"
-    obj_curto_formatado += f"    - **Objetivo:** {profile_data['obj_curto']}\n"
-    if profile_data["prazo_curto_meses"].strip():
-        obj_curto_formatado += (
-            f"    - **Prazo Restante:** {profile_data['prazo_curto_meses']} meses.\n"
-        )
 
-obj_medio_formatado = ""
-if profile_data["obj_medio"].strip():
-    obj_medio_formatado += f"- **Médio Prazo (1 a 5 anos):**\n"
-    obj_medio_formatado += f"    - **Objetivo:** {profile_data['obj_medio']}\n"
-    if profile_data["prazo_medio_anos"].strip():
-        obj_medio_formatado += (
-            f"    - **Prazo:** {profile_data['prazo_medio_anos']} anos.\n"
-        )
+# --- MONTAGEM DOS PROMPTS ---
+def build_goal_projection(profile_data):
+    """
+    Tabelas Markdown com a simulação de Monte Carlo dos objetivos do perfil.
+    """
+    from projecao_objetivos import format_projection_markdown, project_goals
+    from rastreamento import tracer
+
+    with tracer.span("projecao_objetivos"):
+        return format_projection_markdown(project_goals(profile_data))
+
 
+def build_analysis_prompt(
+    profile_data, projecao_objetivos=None, compact=False, market_tools=None, analises_por_ticker=None
+):
+    """
+    Monta o prompt de análise a partir do dicionário retornado por run_profile_app(),
+    já com os dados de mercado dos tickers de interesse pré-carregados e as projeções
+    dos objetivos (calculadas aqui se não forem informadas).
+    Cada seção é contada contra o orçamento da etapa; `compact=True` remove do pedido
+    o que já consta nas instruções do agente. `market_tools` substitui as ferramentas
+    do Yahoo Finance usadas no pré-carregamento (ex.: backends_falsos.FakeYFinanceTools).
+    Com `analises_por_ticker` ({ticker: texto}), o prompt passa a consolidar essas análises
+    no lugar dos dados de mercado e da tabela setorial. Perfis com preferência por dividendos
+    recebem as métricas de proventos calculadas localmente no lugar das séries de proventos.
+    """
+    from dividendos import build_dividend_block, dividend_path_requested
+    from pre_carregamento import format_market_data_block, prefetch_market_data
+    from rastreamento import tracer
+
+    if projecao_objetivos is None:
+        projecao_objetivos = build_goal_projection(profile_data)
+
+    data_analise = datetime.now().strftime("%Y-%m-%d")
+
+    economia_mensal_disponivel = profile_data["renda_mensal"] - profile_data["gastos_fixos"]
+
+    acoes_formatadas = profile_data["acoes_interesse"]
+
+    bloco_dados_mercado = bloco_desempenho = bloco_comparativo_setorial = bloco_analises_ticker = ""
+    renda_passiva = dividend_path_requested(profile_data)
+    if analises_por_ticker is not None:
+        # Os dados de mercado e os pares já foram usados nas análises por ticker.
+        from analise_por_ticker import format_ticker_analyses
+
+        bloco_analises_ticker = format_ticker_analyses(analises_por_ticker)
+    else:
+        # Busca os dados dos tickers em paralelo antes da análise, evitando rodadas de ferramentas do modelo.
+        print("--- PRÉ-CARREGANDO DADOS DE MERCADO DAS AÇÕES DE INTERESSE ---")
+        with tracer.span("pre_carregamento"):
+            bloco_dados_mercado = format_market_data_block(
+                prefetch_market_data(profile_data["acoes_interesse"], market_tools, include_dividends=not renda_passiva)
+            )
+
+        # Retornos, volatilidade e médias móveis saem do histórico diário local, atualizado de forma incremental.
+        from indicadores_desempenho import build_performance_block
+
+        print("--- CALCULANDO OS INDICADORES DE DESEMPENHO ---")
+        with tracer.span("indicadores_desempenho"):
+            bloco_desempenho = build_performance_block(profile_data["acoes_interesse"], market_tools)
+
+        # Pares do mesmo setor vêm do índice local, com métricas e notas já calculadas.
+        from comparacao_setorial import build_sector_comparison, format_comparison_markdown
+
+        print("--- MONTANDO A TABELA COMPARATIVA SETORIAL ---")
+        with tracer.span("comparativo_setorial"):
+            bloco_comparativo_setorial = format_comparison_markdown(
+                build_sector_comparison(profile_data["acoes_interesse"], market_tools)
+            )
+    # A divisão da economia mensal entre reserva, classes e tickers sai do otimizador local.
+    from otimizador_carteira import build_allocation_block
+
+    print("--- OTIMIZANDO A ALOCAÇÃO MENSAL ---")
+    with tracer.span("otimizacao_carteira"):
+        bloco_alocacao = build_allocation_block(profile_data, market_tools)
+
+    bloco_proventos = ""
+    if renda_passiva:
+        print("--- CALCULANDO AS MÉTRICAS DE PROVENTOS ---")
+        with tracer.span("metricas_proventos"):
+            bloco_proventos = build_dividend_block(profile_data, market_tools)
+
+    if bloco_analises_ticker:
+        instrucao_comparativo = dedent(
+            """\
+            - Use a seção **Pares do setor** das **ANÁLISES POR TICKER** anexadas abaixo, que já compara cada ação de interesse com as líderes do mesmo setor. Não busque novamente esses dados.
+                    - Complemente apenas com ações que estejam sem análise prévia."""
+        )
+    elif bloco_comparativo_setorial:
+        instrucao_comparativo = dedent(
+            """\
+            - Use a **TABELA COMPARATIVA SETORIAL** anexada abaixo, que já traz as empresas líderes do mesmo setor de cada ação de interesse, as métricas (P/L, P/VP, ROE, dividend yield, dívida/EBITDA, margens, crescimento, VPA, volume médio e consenso), as notas e as posições. Interprete a tabela; não busque novamente esses dados nem refaça os cálculos.
+                    - Complemente apenas com notícias relevantes ou com pares de ações que estejam sem setor no índice."""
+        )
+    else:
+        instrucao_comparativo = dedent(
+            """\
+            - Para cada ação de interesse, identifique **pelo menos 3 a 5 outras empresas líderes do MESMO SETOR** (ex: outros grandes bancos para ITUB4.SA, outras empresas de energia ou siderurgia para GOAU4.SA, outros FIIs para GARE11.SA).
+                    - Apresente uma **tabela comparativa exaustiva** com métricas financeiras chave (P/L, P/VP, dívida/EBITDA, ROE, crescimento de receita, dividend yield, VPA, Margens, Endividamento, Fluxo de Caixa, Crescimento de Lucro, Recomendação de Consenso, Volume Médio Diário) e notícias relevantes."""
+        )
 
-meu_perfil_investidor_formatado = dedent(
-    f"""
+    obj_curto_formatado = ""
+    if profile_data["obj_curto"].strip():
+        obj_curto_formatado += f"- **Curto Prazo (até 1 ano):**\n"
+        obj_curto_formatado += f"    - **Objetivo:** {profile_data['obj_curto']}\n"
+        if profile_data["prazo_curto_meses"].strip():
+            obj_curto_formatado += (
+                f"    - **Prazo Restante:** {profile_data['prazo_curto_meses']} meses.\n"
+            )
+
+    obj_medio_formatado = ""
+    if profile_data["obj_medio"].strip():
+        obj_medio_formatado += f"- **Médio Prazo (1 a 5 anos):**\n"
+        obj_medio_formatado += f"    - **Objetivo:** {profile_data['obj_medio']}\n"
+        if profile_data["prazo_medio_anos"].strip():
+            obj_medio_formatado += (
+                f"    - **Prazo:** {profile_data['prazo_medio_anos']} anos.\n"
+            )
+
+    meu_perfil_investidor_formatado = dedent(
+        f"""
 ### PERFIL DO INVESTIDOR
 
 **1. Informações Básicas:**
@@ -360,11 +390,10 @@ meu_perfil_investidor_formatado = dedent(
 - **Preferência de Renda:** {profile_data["pref_renda"]}.
 - **Outras Considerações:** {profile_data["outras_consideracoes"] if profile_data["outras_consideracoes"] else "N/A"}.
 """
-)
-
+    )
 
-prompt_para_analise = dedent(
-    f"""\
+    pedido = dedent(
+        f"""\
     Com base no meu PERFIL DO INVESTIDOR abaixo, por favor, gere um relatório de consultoria financeira **MUITO DETALHADO, ABRANGENTE E REALISTA**.
     O relatório deve ser uma análise estratégica aprofundada que cubra todos os pontos solicitados com especificidade e insights práticos.
 
@@ -378,11 +407,11 @@ prompt_para_analise = dedent(
           - Sugestão precisa de valores ou quantidades para comprar/vender, considerando meu perfil e valor investido.
 
     **2. Comparativo Setorial e Oportunidades de Migração:**
-        - Para cada ação de interesse, identifique **pelo menos 3 a 5 outras empresas líderes do MESMO SETOR** (ex: outros grandes bancos para ITUB4.SA, outras empresas de energia ou siderurgia para GOAU4.SA, outros FIIs para GARE11.SA).
-        - Apresente uma **tabela comparativa exaustiva** com métricas financeiras chave (P/L, P/VP, dívida/EBITDA, ROE, crescimento de receita, dividend yield, VPA, Margens, Endividamento, Fluxo de Caixa, Crescimento de Lucro, Recomendação de Consenso, Volume Médio Diário) e notícias relevantes.
+        {instrucao_comparativo}
         - Com base nessa comparação e no meu perfil, **avalie EXPLICITAMENTE se compensa migrar** (parcial ou totalmente) ou diversificar para essas empresas alternativas. Forneça os prós e contras específicos de cada ação, e o impacto potencial nos meus objetivos.
 
     **3. Planejamento de Alocação de Capital Mensal (Curto, Médio e Longo Prazo):**
+        - Use o **PLANO DE ALOCAÇÃO OTIMIZADO** anexado abaixo como a divisão da economia mensal entre reserva, renda fixa, FIIs, ações e cada ticker: explique esses percentuais e valores em R$, sem recalculá-los.
         - Dada a minha economia mensal disponível (R$ {economia_mensal_disponivel:.2f}), detalhe um **plano de alocação percentual** para cada um dos meus objetivos:
           - **Curto Prazo:** Como alcançar a reserva de emergência e os objetivos de curto prazo, com sugestões de produtos específicos (ex: Tesouro Selic, CDB de liquidez diária) e o tempo estimado.
           - **Médio Prazo:** Como planejar os objetivos de médio prazo (ex: apartamento), com alocação em investimentos adequados ao prazo e risco.
@@ -403,63 +432,374 @@ prompt_para_analise = dedent(
 
     **5. Conclusão e Próximos Passos:**
         - Resumo das principais recomendações e um chamado à ação para o investidor.
-    {meu_perfil_investidor_formatado}
+    """
+    )
+    if compact:
+        # As instruções do agente já detalham cada seção; o pedido só lista o que é específico do perfil.
+        pedido = dedent(
+            f"""\
+    Com base no meu PERFIL DO INVESTIDOR abaixo, gere o relatório de consultoria financeira seguindo o processo e o formato das suas instruções, com as seções:
+    1. Análise Aprofundada das Ações de Interesse ({acoes_formatadas}): desempenho (12 meses, 3 e 5 anos), dividendos, recomendação (Comprar, Vender, Manter) e valores/quantidades sugeridos.
+    2. Comparativo Setorial e Oportunidades de Migração:
+        {instrucao_comparativo}
+    3. Planejamento de Alocação de Capital Mensal (R$ {economia_mensal_disponivel:.2f}) por objetivo, em % e em R$, explicando o PLANO DE ALOCAÇÃO OTIMIZADO anexado.
+    4. Roteiro de Investimento e Desafios, com realismo sobre prazos, riscos e disciplina.
+    5. Conclusão e Próximos Passos.
+    """
+        )
 
-"""
-)
+    from orcamento_prompt import PromptBudget, deduplicate_lines
+
+    orcamento = PromptBudget("analise")
+    orcamento.add("instrucoes", FINANCE_AGENT_INSTRUCTIONS, in_prompt=False)
+    orcamento.add("pedido", deduplicate_lines(pedido, FINANCE_AGENT_INSTRUCTIONS) + "\n" if compact else pedido)
+    orcamento.add("perfil", meu_perfil_investidor_formatado)
+    orcamento.add("dados_mercado", bloco_dados_mercado and "\n" + bloco_dados_mercado, trimmable=True)
+    orcamento.add("desempenho", bloco_desempenho and "\n" + bloco_desempenho, trimmable=True)
+    orcamento.add("comparativo_setorial", bloco_comparativo_setorial and "\n" + bloco_comparativo_setorial, trimmable=True)
+    orcamento.add("analises_ticker", bloco_analises_ticker and "\n" + bloco_analises_ticker, trimmable=True)
+    orcamento.add("proventos", bloco_proventos and "\n" + bloco_proventos, trimmable=True)
+    orcamento.add("alocacao", "\n" + bloco_alocacao)
+    orcamento.add(
+        "projecoes",
+        "\n### PROJEÇÕES DOS OBJETIVOS (SIMULAÇÃO DE MONTE CARLO)\n"
+        "Use estes prazos e valores ao responder QUANDO cada objetivo será atingido; não refaça os cálculos.\n"
+        + projecao_objetivos,
+    )
+    orcamento.enforce()
+    print(orcamento.summary())
+    tracer.instant(f"orcamento:{orcamento.stage}", "prompt", total=orcamento.total_tokens(), **orcamento.tokens())
+    return orcamento.render()
 
-print("--- INICIANDO ANÁLISE INICIAL DETALHADA ---")
-
-analise_bruta_completa = ""
-try:
-    for chunk in finance_agent.run(prompt_para_analise, stream=True):
-        content = getattr(chunk, "content", "")
-        if isinstance(content, str) and content.strip():
-            analise_bruta_completa += content
-except Exception as e:
-    print(f"\nERRO na execução do finance_agent: {e}")
-    if "RESOURCE_EXHAUSTED" in str(e):
-        print(
-            "Cota da API do Gemini excedida. Por favor, aguarde e tente novamente, ou considere usar o modelo 'flash' ou habilitar o faturamento."
-        )
-    exit()
+
+def analysis_cache_key(profile_data, compact=False, map_reduce=False):
+    """
+    Material da chave do cache de respostas da análise: o perfil e a data dos dados de mercado.
+    O prompt traz cotações do momento, que mudariam a chave a cada execução do mesmo perfil.
+    """
+    from checkpoints import profile_hash
+
+    return {
+        "perfil": profile_hash(profile_data),
+        "dados_mercado": datetime.now().strftime("%Y-%m-%d"),
+        "compacto": bool(compact),
+        "por_ticker": bool(map_reduce),
+    }
 
 
-print("\n--- INICIANDO REFINAMENTO E FORMATAÇÃO DO RELATÓRIO FINAL ---")
-prompt_para_refinamento = dedent(
-    f"""\
+def build_refinement_prompt(analise_bruta_completa, compact=False):
+    """
+    Monta o prompt do agente de refinamento a partir do rascunho da análise.
+    No modo compacto o rascunho é enxugado antes; acima do orçamento, ele é cortado por seção.
+    """
+    from orcamento_prompt import PromptBudget, compact_draft
+    from rastreamento import tracer
+
+    if compact:
+        analise_bruta_completa = compact_draft(analise_bruta_completa)
+
+    orcamento = PromptBudget("refinamento")
+    orcamento.add("instrucoes", REPORT_REFINER_INSTRUCTIONS, in_prompt=False)
+    orcamento.add(
+        "pedido",
+        dedent(
+            """\
     Por favor, refine e formate o seguinte rascunho de análise financeira em um relatório único, conciso, profissional e fácil de compreender.
     Certifique-se de que todos os pontos estejam cobertos e inclua a seção de Aviso Legal e Divulgação de Riscos que você conhece.
 
     RASCUNHO DA ANÁLISE FINANCEIRA:
-    {analise_bruta_completa}
-"""
-)
-print("\n--- Aguardando para evitar limite de cota... ---")
-time.sleep(60)  # Pausa de 60 segundos antes de chamar o próximo agente
-
-
-output_lines_final = []
-relatorio_final_texto = ""
-try:
-    for chunk in report_refiner_agent.run(prompt_para_refinamento, stream=True):
-        content = getattr(chunk, "content", "")
-        if isinstance(content, str) and content.strip():
-            relatorio_final_texto += content
-except Exception as e:
-    print(f"\nERRO na execução do report_refiner_agent: {e}")
-    if "RESOURCE_EXHAUSTED" in str(e):
+    """
+        ),
+    )
+    orcamento.add("rascunho", analise_bruta_completa, trimmable=True)
+    orcamento.enforce()
+    print(orcamento.summary())
+    tracer.instant(f"orcamento:{orcamento.stage}", "prompt", total=orcamento.total_tokens(), **orcamento.tokens())
+    return orcamento.render()
+
+
+def run_agent_stream(agent, prompt, on_chunk=None, name="agente"):
+    """
+    Executa o agente em modo streaming e retorna o texto completo gerado.
+    Se `on_chunk` for informado, cada trecho é repassado assim que chega.
+    O span do stream registra o tempo até o primeiro trecho, a quantidade de trechos e a vazão.
+    """
+    from limitador_cota import estimate_tokens
+    from rastreamento import profiled, tracer
+
+    partes = []
+    with tracer.span(f"stream:{name}", "stream") as span, profiled(f"stream_{name}"):
+        inicio = time.perf_counter()
+        for chunk in agent.run(prompt, stream=True):
+            content = getattr(chunk, "content", "")
+            if isinstance(content, str) and content.strip():
+                if not partes:
+                    span["primeiro_trecho_s"] = round(time.perf_counter() - inicio, 3)
+                partes.append(content)
+                tracer.progress(f"stream:{name}", trecho=content)
+                if on_chunk:
+                    on_chunk(content)
+        texto = "".join(partes)
+        duracao = max(time.perf_counter() - inicio, 1e-9)
+        span.update(
+            trechos=len(partes),
+            caracteres=len(texto),
+            tokens_estimados=estimate_tokens(texto),
+            caracteres_por_s=round(len(texto) / duracao, 1),
+            tokens_por_s=round(estimate_tokens(texto) / duracao, 1),
+        )
+    return texto
+
+
+def _print_agent_error(agent_name, error):
+    print(f"\nERRO na execução do {agent_name}: {error}")
+    if "RESOURCE_EXHAUSTED" in str(error):
         print(
-            "Cota da API do Gemini excedida. Por favor, aguarde e tente novamente, ou considere usar o modelo 'flash' ou habilitar o faturamento."
+            "Cota da API do Gemini excedida mesmo após as novas tentativas. Por favor, aguarde e tente novamente, ou considere habilitar o faturamento."
         )
-    exit()
 
 
-# --- EXPORTAR PARA PDF ---
-if relatorio_final_texto:
-    print("\n--- EXPORTANDO RELATÓRIO PARA PDF ---")
-    export_to_pdf(relatorio_final_texto, "Relatorio_Financeiro_Personalizado.pdf")
-else:
-    print("\nNão foi possível gerar o relatório final para exportação em PDF.")
+PROJECTION_SECTION_TITLE = "\n\n## 📊 Projeções dos Objetivos (Simulação de Monte Carlo)\n"
+INCOME_SECTION_TITLE = "\n\n## 💰 Renda Passiva Mensal Projetada (Proventos)\n"
+
+
+def build_income_section(profile_data, market_tools=None):
+    """
+    Tabela da renda passiva projetada por posição para o PDF ("" fora do caminho de dividendos).
+    """
+    from dividendos import build_income_section as _build_income_section
+    from rastreamento import tracer
+
+    with tracer.span("renda_passiva"):
+        return _build_income_section(profile_data, market_tools)
+
+
+def final_sections(projecao_objetivos, renda_passiva=""):
+    """
+    Seções calculadas localmente que são anexadas ao fim do PDF.
+    """
+    return PROJECTION_SECTION_TITLE + projecao_objetivos + (renda_passiva and INCOME_SECTION_TITLE + renda_passiva)
+
+
+def generate_report(
+    profile_data,
+    filename,
+    analysis_agent=None,
+    refiner_agent=None,
+    use_response_cache=True,
+    compact=None,
+    market_tools=None,
+    map_reduce=None,
+    ticker_agent_factory=None,
+    checkpoint=None,
+):
+    """
+    Executa o pipeline completo (análise -> refinamento -> PDF) para um perfil.
+    Retorna True se o refinamento foi concluído, ou False se o PDF contém o rascunho
+    da análise. Erros na etapa de análise são propagados.
+    Com `use_response_cache=False`, as respostas armazenadas dos agentes são ignoradas.
+    `compact=None` segue a variável PROMPT_COMPACT; `market_tools` é repassado ao pré-carregamento.
+    Com `map_reduce=True` (ou ANALISE_POR_TICKER=1), cada ação é analisada antes por um
+    sub-agente próprio (criado por `ticker_agent_factory`) e a análise principal as consolida.
+    Com `checkpoint` (checkpoints.open_run), cada etapa concluída é gravada e as já gravadas
+    são reaproveitadas, assim como o trecho parcial de um stream interrompido.
+    """
+    from analise_por_ticker import map_reduce_requested, run_ticker_analyses
+    from cache_respostas import keyed_by, with_response_cache
+    from orcamento_prompt import compact_mode_requested
+    from rastreamento import profiled, tracer
+
+    if compact is None:
+        compact = compact_mode_requested()
+    if map_reduce is None:
+        map_reduce = map_reduce_requested()
+
+    with tracer.span("relatorio", arquivo=filename, compacto=compact, por_ticker=map_reduce) as span:
+        analysis_agent = with_response_cache(analysis_agent or get_finance_agent(), use_response_cache)
+        refiner_agent = with_response_cache(refiner_agent or get_report_refiner_agent(), use_response_cache)
+
+        projecao_objetivos = _checkpointed(checkpoint, "projecao", lambda: build_goal_projection(profile_data))
+        renda_passiva = _checkpointed(
+            checkpoint, "renda_passiva", lambda: build_income_section(profile_data, market_tools)
+        )
+
+        def montar_prompt_analise():
+            analises_por_ticker = None
+            if map_reduce:
+                with tracer.span("analises_por_ticker"):
+                    analises_por_ticker = run_ticker_analyses(
+                        profile_data["acoes_interesse"], market_tools, ticker_agent_factory, use_cache=use_response_cache
+                    )
+            return build_analysis_prompt(profile_data, projecao_objetivos, compact, market_tools, analises_por_ticker)
+
+        prompt_para_analise = _checkpointed(checkpoint, "prompt_analise", montar_prompt_analise)
+        analysis_agent = keyed_by(
+            analysis_agent, analysis_cache_key(profile_data, compact, map_reduce), prompt_para_analise
+        )
+
+        print("--- INICIANDO ANÁLISE INICIAL DETALHADA ---")
+        try:
+            analise_bruta_completa = _checkpointed_stream(
+                checkpoint, "analise", analysis_agent, prompt_para_analise, name="finance_agent"
+            )
+        except Exception as e:
+            _print_agent_error("finance_agent", e)
+            raise
+
+        from relatorio_pdf import StreamingPdfRenderer
+
+        print("\n--- INICIANDO REFINAMENTO E FORMATAÇÃO DO RELATÓRIO FINAL ---")
+        # O PDF é montado enquanto o refinador gera o texto; a espera pela cota é
+        # feita pelo QuotaAwareGemini, apenas quando necessária.
+        renderer = StreamingPdfRenderer(filename)
+        refinado = True
+        try:
+            # Um prompt de refinamento acima do orçamento também leva ao rascunho sem refinamento.
+            prompt_para_refinamento = _checkpointed(
+                checkpoint, "prompt_refinamento", lambda: build_refinement_prompt(analise_bruta_completa, compact)
+            )
+            relatorio_final_texto = _checkpointed_stream(
+                checkpoint,
+                "refinado",
+                refiner_agent,
+                prompt_para_refinamento,
+                on_chunk=renderer.feed,
+                name="report_refiner_agent",
+            )
+        except Exception as e:
+            _print_agent_error("report_refiner_agent", e)
+            # Não descarta a análise já gerada: exporta o rascunho sem refinamento.
+            print("Exportando a análise inicial sem refinamento.")
+            relatorio_final_texto = analise_bruta_completa
+            renderer = StreamingPdfRenderer(filename)
+            renderer.feed(relatorio_final_texto)
+            refinado = False
+
+        # --- EXPORTAR PARA PDF ---
+        if not relatorio_final_texto:
+            raise RuntimeError("Não foi possível gerar o relatório final para exportação em PDF.")
+        print("\n--- FINALIZANDO RELATÓRIO EM PDF ---")
+        renderer.feed(final_sections(projecao_objetivos, renda_passiva))
+        with tracer.span("export_to_pdf", fluxo=len(renderer.story)), profiled("export_to_pdf"):
+            renderer.close()
+        if checkpoint is not None:
+            checkpoint.mark("pdf", refinado=refinado, arquivo=filename)
+        span["refinado"] = refinado
+        return refinado
+
+
+def _checkpointed(checkpoint, stage, build):
+    """
+    Texto da etapa gravado no checkpoint ou, na falta dele, produzido por `build()` e gravado.
+    """
+    if checkpoint is None:
+        return build()
+    texto = checkpoint.load(stage)
+    if texto is None:
+        texto = checkpoint.save(stage, build())
+    return texto
+
+
+def _checkpointed_stream(checkpoint, stage, agent, prompt, on_chunk=None, name="agente"):
+    """
+    Como run_agent_stream, mas reaproveitando a etapa (ou o trecho parcial) gravada no checkpoint.
+    """
+    if checkpoint is None:
+        return run_agent_stream(agent, prompt, on_chunk=on_chunk, name=name)
+    texto = checkpoint.load(stage)
+    if texto is not None:
+        print(f"Etapa '{stage}' reaproveitada da execução {checkpoint.id}.")
+        if on_chunk:
+            on_chunk(texto)
+        return texto
+
+    from checkpoints import run_stage_stream
+
+    return run_stage_stream(checkpoint, stage, agent, prompt, on_chunk=on_chunk, name=name)
+
+
+# --- INÍCIO DO FLUXO PRINCIPAL ---
+def main(argv=None):
+    """
+    Abre o formulário do perfil e gera o relatório em PDF. Retorna o código de saída.
+    """
+    import argparse
+
+    from analise_por_ticker import get_shared_store, map_reduce_requested
+    from cache_mercado import get_shared_cache
+    from cache_respostas import get_shared_response_cache
+    from checkpoints import open_run
+    from interface_perfil import run_report_app
+    from pre_carregamento import SpeculativePrefetcher
+    from rastreamento import export_trace
+    from regeneracao_incremental import generate_incremental_report, incremental_requested
+    from sessao_http import connection_stats
+
+    parser = argparse.ArgumentParser(description="Consultor financeiro pessoal com IA.")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignora as respostas dos agentes armazenadas em cache e consulta o Gemini novamente",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Usa prompts compactos (sem trechos repetidos das instruções e com o rascunho enxugado)",
+    )
+    parser.add_argument(
+        "--por-ticker",
+        action="store_true",
+        help="Analisa cada ação em paralelo (com resultados reaproveitados no mesmo dia) antes da consolidação",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Refaz apenas as seções do último relatório afetadas pelas mudanças no perfil",
+    )
+    args = parser.parse_args(argv)
+
+    filename = "Relatorio_Financeiro_Personalizado.pdf"
+    incremental = args.incremental or incremental_requested()
+    checkpoint = None
+
+    def gerar(profile_data):
+        # Executado fora da thread da interface, que exibe o progresso e a prévia do texto.
+        nonlocal checkpoint
+        if incremental:
+            # No modo incremental, as seções gravadas a cada relatório já servem de ponto de retomada.
+            return generate_incremental_report(profile_data, filename, use_response_cache=not args.no_cache)
+        checkpoint = open_run(profile_data, filename)
+        return generate_report(
+            profile_data,
+            filename,
+            use_response_cache=not args.no_cache,
+            compact=args.compact or None,
+            map_reduce=args.por_ticker or None,
+            checkpoint=checkpoint,
+        )
+
+    print("--- Abrindo interface para preenchimento do perfil ---")
+    profile_data, erro = run_report_app(gerar, filename, SpeculativePrefetcher())
+
+    if not profile_data:
+        print("Preenchimento do perfil cancelado ou falhou. Encerrando o programa.")
+        return 0
+
+    print(get_shared_cache().summary())
+    print(get_shared_response_cache().summary())
+    print(connection_stats.summary())
+    if args.por_ticker or map_reduce_requested() or incremental:
+        print(get_shared_store().summary())
+    export_trace()
+
+    if erro is not None:
+        print(f"\n{erro}")
+        if checkpoint is not None:
+            print(f"As etapas concluídas foram salvas. Para retomar: python checkpoints.py {checkpoint.id}")
+        return 1
+    print("\n--- PROCESSO CONCLUÍDO ---")
+    return 0
+
 
-print("\n--- PROCESSO CONCLUÍDO ---")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from textwrap import dedent
+
+from cache_respostas import ResponseCache, bypass_requested, response_key
+from rastreamento import tracer
+
+# Análises por ticker ficam separadas das respostas completas: são compartilhadas entre perfis.
+CACHE_DIR = os.getenv("TICKER_ANALYSIS_CACHE_DIR", os.path.join(".cache", "analises_ticker"))
+# Sub-análises simultâneas; todas passam pelo mesmo limitador de cota do Gemini.
+MAX_WORKERS = int(os.getenv("TICKER_ANALYSIS_WORKERS", "8"))
+
+TICKER_AGENT_INSTRUCTIONS = dedent(
+    """\
+Você é um **Analista de Ações Sênior** especializado na B3. Você analisa UMA ação por vez, de forma objetiva e independente do perfil de qualquer investidor.
+
+Use os dados pré-carregados, os indicadores de desempenho e a tabela setorial enviados no pedido; recorra às ferramentas apenas para notícias recentes ou informações ausentes.
+
+Responda em português, em Markdown, com exatamente este formato (no máximo ~350 palavras):
+
+### <TICKER> — <Nome da empresa>
+- **Fundamentos:** P/L, P/VP, ROE, margens, endividamento e crescimento, com leitura crítica.
+- **Desempenho:** variação recente do preço e tendência.
+- **Dividendos:** histórico, dividend yield atual e sustentabilidade.
+- **Pares do setor:** posição da ação na tabela setorial e quais pares se destacam (e por quê).
+- **Recomendação:** Comprar, Manter ou Vender — justificativa em uma ou duas frases.
+- **Riscos:** principais riscos e catalisadores.
+
+Não sugira valores ou quantidades: a adaptação à carteira de cada investidor é feita depois.
+"""
+)
+
+
+def map_reduce_requested():
+    """
+    ANALISE_POR_TICKER=1 ativa a análise por ticker sem alterar a linha de comando.
+    """
+    return os.getenv("ANALISE_POR_TICKER", "").lower() in ("1", "true", "sim", "yes")
+
+
+def create_ticker_agent():
+    """
+    Cria o sub-agente que analisa uma única ação.
+    """
+    from agent import create_model, load_environment
+
+    load_environment()
+    from agno.agent import Agent
+    from cache_mercado import CachedYFinanceTools
+
+    return Agent(
+        model=create_model(),
+        tools=[CachedYFinanceTools(stock_price=True, analyst_recommendations=True, company_news=True)],
+        instructions=TICKER_AGENT_INSTRUCTIONS,
+        add_datetime_to_instructions=False,
+        show_tool_calls=False,
+        markdown=True,
+    )
+
+
+def build_ticker_prompt(ticker, market_tools=None):
+    """
+    Monta o pedido de análise de um ticker: dados de mercado pré-carregados, indicadores de
+    desempenho do histórico local e a tabela do setor com os líderes do índice. Nada do perfil do investidor entra no prompt.
+    """
+    from comparacao_setorial import build_sector_comparison, format_comparison_markdown
+    from indicadores_desempenho import build_performance_block
+    from orcamento_prompt import PromptBudget
+    from pre_carregamento import format_market_data_block, prefetch_market_data
+
+    orcamento = PromptBudget("ticker")
+    orcamento.add("instrucoes", TICKER_AGENT_INSTRUCTIONS, in_prompt=False)
+    orcamento.add("pedido", f"Analise a ação {ticker} na data de {datetime.now():%Y-%m-%d}.\n\n")
+    orcamento.add(
+        "dados_mercado", format_market_data_block(prefetch_market_data(ticker, market_tools)), trimmable=True
+    )
+    orcamento.add("desempenho", "\n" + build_performance_block(ticker, market_tools), trimmable=True)
+    orcamento.add(
+        "comparativo_setorial",
+        "\n" + format_comparison_markdown(build_sector_comparison(ticker, market_tools)),
+        trimmable=True,
+    )
+    orcamento.enforce()
+    tracer.instant(f"orcamento:{orcamento.stage}", "prompt", total=orcamento.total_tokens(), **orcamento.tokens())
+    return orcamento.render()
+
+
+class TickerAnalysisStore:
+    """
+    Guarda o texto de cada análise por (ticker, data) no formato do cache de respostas.
+    Pedidos simultâneos do mesmo ticker esperam a primeira execução em vez de repeti-la.
+    """
+
+    def __init__(self, directory=CACHE_DIR):
+        self.cache = ResponseCache(directory)
+        self._lock = threading.Lock()
+        self._key_locks = {}  # chave -> [lock, pedidos em andamento]; removida quando o último termina
+
+    def key(self, ticker, date):
+        from agent import MODEL_ID
+
+        return response_key(MODEL_ID, TICKER_AGENT_INSTRUCTIONS, f"{ticker}@{date}")
+
+    def get_or_compute(self, ticker, date, compute, use_cache=True):
+        """
+        Retorna (texto, veio_do_cache), executando `compute()` apenas na falta da entrada.
+        """
+        if not use_cache:
+            return compute(), False
+        key = self.key(ticker, date)
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                chunks = self.cache.load(key)
+                if chunks is not None:
+                    self.cache.record_hit()
+                    return "".join(chunks), True
+                self.cache.record_miss()
+                text = compute()
+                if text:
+                    self.cache.store(key, [text])
+                return text, False
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+
+    def summary(self):
+        return f"Cache de análises por ticker: {self.cache.hits} acertos, {self.cache.misses} falhas ({self.cache.directory})"
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_store():
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = TickerAnalysisStore()
+        return _shared_store
+
+
+def analyze_ticker(ticker, market_tools=None, agent_factory=None, store=None, use_cache=True):
+    """
+    Análise de um ticker: reaproveita a do dia quando existir; caso contrário, busca os dados,
+    executa um sub-agente próprio e grava o resultado.
+    """
+    from agent import run_agent_stream
+
+    store = store or get_shared_store()
+    agent_factory = agent_factory or create_ticker_agent
+
+    def compute():
+        prompt = build_ticker_prompt(ticker, market_tools)
+        return run_agent_stream(agent_factory(), prompt, name="analise_ticker")
+
+    with tracer.span("analise_ticker", ticker=ticker) as span:
+        text, cached = store.get_or_compute(
+            ticker, datetime.now().strftime("%Y-%m-%d"), compute, use_cache and not bypass_requested()
+        )
+        span["cache"] = "acerto" if cached else "falha"
+    return text
+
+
+def run_ticker_analyses(
+    acoes_interesse, market_tools=None, agent_factory=None, store=None, use_cache=True, max_workers=MAX_WORKERS
+):
+    """
+    Executa em paralelo a análise de cada ticker do perfil; a latência total acompanha a do
+    ticker mais lento. Retorna {ticker: texto}, com None para os tickers cuja análise falhou.
+    """
+    from pre_carregamento import parse_tickers
+
+    tickers = parse_tickers(acoes_interesse)
+    if not tickers:
+        return {}
+
+    print(f"--- ANALISANDO {len(tickers)} AÇÕES EM PARALELO ---")
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers)))) as executor:
+        futures = {
+            ticker: executor.submit(analyze_ticker, ticker, market_tools, agent_factory, store, use_cache)
+            for ticker in tickers
+        }
+
+    analyses = {}
+    for ticker, future in futures.items():
+        try:
+            analyses[ticker] = future.result() or None
+        except Exception as e:
+            print(f"\nERRO na análise de {ticker}: {e}")
+            analyses[ticker] = None
+    return analyses
+
+
+def format_ticker_analyses(analyses):
+    """
+    Bloco com as análises por ticker para o prompt de consolidação.
+    """
+    if not analyses:
+        return ""
+    lines = [
+        f"### ANÁLISES POR TICKER (concluídas em {datetime.now():%Y-%m-%d})",
+        "Análises independentes de cada ação, já com fundamentos, dividendos, recomendação e pares do setor. "
+        "Consolide-as nas seções 1 e 2, adaptando recomendações, valores e quantidades ao perfil; "
+        "não refaça as buscas nem as comparações.",
+        "",
+    ]
+    missing = []
+    for ticker, text in analyses.items():
+        if text:
+            lines.append(text.strip())
+            lines.append("")
+        else:
+            missing.append(ticker)
+    if missing:
+        lines.append("Sem análise prévia (analise com as ferramentas): " + ", ".join(missing))
+        lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,374 @@
+import asyncio
+import json
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+from collections import Counter
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cache_respostas import CachedChunk
+
+# Tamanho típico de um trecho do stream do Gemini, em caracteres.
+DEFAULT_CHUNK_CHARS = 200
+
+
+def split_chunks(text, chunk_chars=DEFAULT_CHUNK_CHARS):
+    """
+    Divide o texto em trechos de ~`chunk_chars` caracteres, como chegam do stream.
+    """
+    return [text[i : i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+
+
+def load_recorded_chunks(path):
+    """
+    Lê os trechos de uma resposta gravada pelo cache de respostas (`.cache/respostas/**.jsonl`).
+    """
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class FakeModel:
+    def __init__(self, id="gemini-falso"):
+        self.id = id
+
+
+class FakeAgent:
+    """
+    Substituto do Agent do agno para testes e benchmarks sem rede: `run(prompt, stream=True)`
+    (ou `await arun(...)`) reproduz os trechos informados, aguardando `first_chunk_latency` antes do primeiro
+    e `chunk_latency` entre os demais. `chunks` também pode ser uma função do prompt.
+    """
+
+    def __init__(
+        self,
+        chunks,
+        first_chunk_latency=0.0,
+        chunk_latency=0.0,
+        model_id="gemini-falso",
+        instructions="",
+        sleep=time.sleep,
+    ):
+        self.chunks = chunks
+        self.first_chunk_latency = first_chunk_latency
+        self.chunk_latency = chunk_latency
+        self.model = FakeModel(model_id)
+        self.instructions = instructions
+        self.tools = []
+        self._sleep = sleep
+        self.prompts = []
+
+    @classmethod
+    def from_text(cls, text, chunk_chars=DEFAULT_CHUNK_CHARS, **kwargs):
+        return cls(split_chunks(text, chunk_chars), **kwargs)
+
+    @classmethod
+    def from_recording(cls, path, **kwargs):
+        return cls(load_recorded_chunks(path), **kwargs)
+
+    def run(self, prompt, stream=False, **kwargs):
+        self.prompts.append(prompt)
+        chunks = self.chunks(prompt) if callable(self.chunks) else self.chunks
+        if not stream:
+            self._sleep(self.first_chunk_latency + self.chunk_latency * max(0, len(chunks) - 1))
+            return CachedChunk("".join(chunks))
+        return self._stream(chunks)
+
+    def _stream(self, chunks):
+        for i, content in enumerate(chunks):
+            delay = self.first_chunk_latency if i == 0 else self.chunk_latency
+            if delay:
+                self._sleep(delay)
+            yield CachedChunk(content)
+
+    async def arun(self, prompt, stream=False, **kwargs):
+        self.prompts.append(prompt)
+        chunks = self.chunks(prompt) if callable(self.chunks) else self.chunks
+        if not stream:
+            await asyncio.sleep(self.first_chunk_latency + self.chunk_latency * max(0, len(chunks) - 1))
+            return CachedChunk("".join(chunks))
+        return self._astream(chunks)
+
+    async def _astream(self, chunks):
+        for i, content in enumerate(chunks):
+            delay = self.first_chunk_latency if i == 0 else self.chunk_latency
+            if delay:
+                await asyncio.sleep(delay)
+            yield CachedChunk(content)
+
+
+def _synthetic_payload(endpoint, symbol):
+    """
+    Payload determinístico por ticker, no mesmo formato devolvido pelas ferramentas do agno.
+    """
+    rng = random.Random(f"{endpoint}:{symbol}")
+    price = round(rng.uniform(5, 120), 2)
+    if endpoint == "price":
+        return f"{price:.4f}"
+    if endpoint in ("fundamentals", "financial_ratios", "company_info"):
+        ebitda = rng.uniform(1e9, 2e10)
+        return json.dumps(
+            {
+                "symbol": symbol,
+                "longName": f"Empresa {symbol}",
+                "currentPrice": price,
+                "trailingPE": round(rng.uniform(3, 25), 2),
+                "priceToBook": round(rng.uniform(0.5, 4), 2),
+                "returnOnEquity": round(rng.uniform(0.02, 0.3), 4),
+                "trailingAnnualDividendYield": round(rng.uniform(0, 0.12), 4),
+                "totalDebt": round(ebitda * rng.uniform(0.2, 4)),
+                "ebitda": round(ebitda),
+                "profitMargins": round(rng.uniform(0, 0.35), 4),
+                "revenueGrowth": round(rng.uniform(-0.1, 0.25), 4),
+                "earningsGrowth": round(rng.uniform(-0.3, 0.4), 4),
+                "bookValue": round(price / rng.uniform(0.5, 4), 2),
+                "averageDailyVolume3Month": round(rng.uniform(1e5, 5e7)),
+                "recommendationKey": rng.choice(["buy", "hold", "strong_buy", "underperform"]),
+            }
+        )
+    if endpoint == "dividends":
+        today = datetime.now()
+        return json.dumps(
+            {
+                f"{(today - timedelta(days=30 * i)):%Y-%m-%d}T00:00:00.000": round(rng.uniform(0.05, 1.2), 4)
+                for i in range(1, 13)
+            }
+        )
+    if endpoint == "history":
+        today = datetime.now()
+        return json.dumps(
+            {
+                f"{(today - timedelta(days=30 * i)):%Y-%m-%d}T00:00:00.000": {
+                    "Close": round(price * rng.uniform(0.8, 1.2), 2)
+                }
+                for i in range(12, 0, -1)
+            }
+        )
+    return json.dumps({"symbol": symbol, "endpoint": endpoint})
+
+
+def synthetic_daily_history(symbol, start, years=7):
+    """
+    Pregões diários determinísticos (dias úteis até hoje) a partir de `start`, no formato de
+    historico_precos.download_history. FIIs (final 11) pagam proventos mensais; ações, trimestrais.
+    """
+    import numpy as np
+
+    today = np.datetime64(date.today(), "D")
+    dates = np.arange(today - np.timedelta64(365 * years, "D"), today + 1, dtype="datetime64[D]")
+    dates = dates[np.is_busday(dates)]
+    rng = np.random.default_rng(zlib.crc32(symbol.upper().encode()))
+    close = rng.uniform(5, 120) * np.exp(np.cumsum(rng.normal(0.0003, 0.018, len(dates))))
+    spread = np.abs(rng.normal(0, 0.01, len(dates)))
+    days = dates.astype(int)
+    monthly = symbol.upper().removesuffix(".SA").endswith("11")
+    pays = (days % 30 == 0) if monthly else (days % 91 == 0)
+    dividends = np.where(pays, close * rng.uniform(0.006, 0.012) * (3 if not monthly else 1), 0.0)
+
+    keep = dates >= np.datetime64(start, "D")
+    return {
+        "data": dates[keep],
+        "abertura": (close * (1 - spread / 2))[keep],
+        "maxima": (close * (1 + spread))[keep],
+        "minima": (close * (1 - spread))[keep],
+        "fechamento": close[keep],
+        "volume": rng.uniform(1e5, 5e7, len(dates))[keep].round(),
+        "dividendos": dividends[keep],
+        "desdobramentos": np.zeros(int(keep.sum())),
+    }
+
+
+class FakeYFinanceTools:
+    """
+    Substituto de CachedYFinanceTools: devolve payloads gravados ({endpoint: {ticker: payload}})
+    ou, na falta deles, payloads sintéticos determinísticos, após `latency` segundos por chamada.
+    O histórico diário sintético fica em um armazenamento colunar próprio (`history_store`),
+    em uma pasta temporária, para não se misturar ao histórico real.
+    """
+
+    def __init__(self, payloads=None, latency=0.0, sleep=time.sleep):
+        from historico_precos import PriceHistoryStore
+
+        self.payloads = payloads or {}
+        self.latency = latency
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        history_dir = tempfile.mkdtemp(prefix="historico_falso_")
+        self.history_store = PriceHistoryStore(history_dir, fetch=self.fetch_price_history)
+        weakref.finalize(self, shutil.rmtree, history_dir, True)
+
+    @classmethod
+    def from_market_cache(cls, path, **kwargs):
+        """
+        Usa como gravação as respostas armazenadas no cache de mercado (`.cache/mercado.sqlite3`).
+        """
+        payloads = {}
+        with sqlite3.connect(path) as conn:
+            for ticker, endpoint, payload in conn.execute("SELECT ticker, endpoint, payload FROM entries"):
+                if endpoint == "history":
+                    payload = json.dumps(json.loads(payload)["rows"])
+                payloads.setdefault(endpoint, {})[ticker] = payload
+        return cls(payloads, **kwargs)
+
+    def _call(self, endpoint, symbol):
+        with self._lock:
+            self.calls[endpoint] += 1
+        if self.latency:
+            self._sleep(self.latency)
+        recorded = self.payloads.get(endpoint, {}).get(symbol.upper())
+        return recorded if recorded is not None else _synthetic_payload(endpoint, symbol.upper())
+
+    def get_current_stock_price(self, symbol):
+        return self._call("price", symbol)
+
+    def get_company_info(self, symbol):
+        return self._call("company_info", symbol)
+
+    def get_historical_stock_prices(self, symbol, period="1mo", interval="1d"):
+        return self._call("history", symbol)
+
+    def get_stock_fundamentals(self, symbol):
+        return self._call("fundamentals", symbol)
+
+    def get_income_statements(self, symbol):
+        return self._call("income_statements", symbol)
+
+    def get_key_financial_ratios(self, symbol):
+        return self._call("financial_ratios", symbol)
+
+    def get_analyst_recommendations(self, symbol):
+        return self._call("analyst_recommendations", symbol)
+
+    def get_company_news(self, symbol, num_stories=3):
+        return self._call("news", symbol)
+
+    def get_technical_indicators(self, symbol, period="3mo"):
+        return self._call("technical_indicators", symbol)
+
+    def get_dividends(self, symbol):
+        return self._call("dividends", symbol)
+
+    def download_quotes(self, tickers, start):
+        """
+        Equivalente ao download em lote de cotacoes_lote: uma chamada para todos os tickers.
+        """
+        with self._lock:
+            self.calls["quotes_batch"] += 1
+        if self.latency:
+            self._sleep(self.latency)
+        return {ticker: synthetic_daily_history(ticker, start) for ticker in tickers}
+
+    def fetch_price_history(self, symbol, start):
+        with self._lock:
+            self.calls["daily_history"] += 1
+        if self.latency:
+            self._sleep(self.latency)
+        return synthetic_daily_history(symbol, start)
+
+
+class FakeGeminiServer:
+    """
+    Endpoint HTTP local compatível com a API do Gemini (`generateContent` e
+    `streamGenerateContent?alt=sse`), para exercitar os agentes reais sem rede: com
+    `GEMINI_BASE_URL=servidor.url`, o QuotaAwareGemini conversa com este servidor.
+    `chunks` é a lista de trechos de cada resposta ou uma função do prompt recebido;
+    os prompts ficam em `prompts`.
+    """
+
+    def __init__(self, chunks, first_chunk_latency=0.0, chunk_latency=0.0, host="127.0.0.1", port=0):
+        self.chunks = chunks
+        self.first_chunk_latency = first_chunk_latency
+        self.chunk_latency = chunk_latency
+        self.prompts = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="gemini-falso", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _respond(self, body):
+        contents = body.get("contents") or [{}]
+        prompt = "".join(part.get("text", "") for part in contents[-1].get("parts", []))
+        with self._lock:
+            self.prompts.append(prompt)
+        chunks = self.chunks(prompt) if callable(self.chunks) else self.chunks
+        return prompt, list(chunks) or [""]
+
+    @staticmethod
+    def _payload(text, prompt, last):
+        candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+        if last:
+            candidate["finishReason"] = "STOP"
+        prompt_tokens, output_tokens = len(prompt) // 4, len(text) // 4
+        return {
+            "candidates": [candidate],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            },
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 com keep-alive, como o endpoint real: permite medir o reuso de conexões.
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _write_chunk(self, data):
+                self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                prompt, chunks = server._respond(body)
+                if ":streamGenerateContent" not in self.path:
+                    data = json.dumps(server._payload("".join(chunks), prompt, True)).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, text in enumerate(chunks):
+                    delay = server.first_chunk_latency if i == 0 else server.chunk_latency
+                    if delay:
+                        time.sleep(delay)
+                    payload = server._payload(text, prompt, i == len(chunks) - 1)
+                    self._write_chunk(b"data: " + json.dumps(payload).encode("utf-8") + b"\r\n\r\n")
+                self._write_chunk(b"")
+
+        return Handler
@@ -0,0 +1,54 @@
+"""
+Benchmark do otimizador de carteira (otimizador_carteira.py) com históricos sintéticos.
+
+Mede, para carteiras de tamanhos crescentes, o tempo da covariância a partir dos históricos
+diários e o tempo total da otimização (reserva, classes e paridade de risco por ticker).
+
+Uso:
+    python benchmarks/bench_otimizador.py
+    python benchmarks/bench_otimizador.py --ativos 50 200 800 --repeticoes 5
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends_falsos import synthetic_daily_history
+from bench_pipeline import PROFILE
+from otimizador_carteira import COVARIANCE_DAYS, covariance_from_histories, optimize_allocation
+
+
+def synthetic_histories(count):
+    """
+    Históricos com um pouco mais que a janela da covariância; um terço dos tickers termina em 11 (FIIs).
+    """
+    start = date.today() - timedelta(days=int(COVARIANCE_DAYS * 1.5))
+    tickers = [f"Z{i:03d}{'11' if i % 3 == 0 else '3'}.SA" for i in range(count)]
+    return {ticker: synthetic_daily_history(ticker, start, years=5) for ticker in tickers}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ativos", type=int, nargs="+", default=[10, 100, 300, 500])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'ativos':>8}{'covariância (ms)':>18}{'otimização (ms)':>18}")
+    for count in args.ativos:
+        histories = synthetic_histories(count)
+        covariance, total = [], []
+        for _ in range(args.repeticoes):
+            start = time.perf_counter()
+            covariance_from_histories(histories)
+            covariance.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            optimize_allocation(PROFILE, histories)
+            total.append(time.perf_counter() - start)
+        print(f"{count:>8}{min(covariance) * 1000:>18.1f}{min(total) * 1000:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Benchmark da conversão Markdown -> PDF com relatórios sintéticos grandes.
+
+Compara o tokenizador atual (relatorio_pdf.export_to_pdf) com a rotina original,
+que aplicava re.sub sem pré-compilação e recriava estilos a cada tabela. Mede o
+tempo de conversão em flowables (parse) e o tempo total com a paginação do ReportLab.
+Com --relatorios N, compara também a geração de N PDFs em sequência com o
+PdfRenderService (um processo por núcleo).
+
+Uso:
+    python benchmarks/bench_pdf.py --linhas 10000 --tabelas 300
+    python benchmarks/bench_pdf.py --linhas 2000 --tabelas 50 --relatorios 16
+"""
+import argparse
+import gc
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_JUSTIFY
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from relatorio_pdf import StreamingPdfRenderer, export_to_pdf
+from renderizacao_paralela import PdfRenderService
+
+
+def synthetic_report(lines, tables):
+    """
+    Gera um relatório no formato emitido pelo refinador: cabeçalhos, listas,
+    parágrafos com ênfase e `tables` tabelas comparativas distribuídas no texto.
+    """
+    table_every = max(1, lines // max(1, tables))
+    out = []
+    n = 0
+    next_table = table_every
+    while len(out) < lines:
+        n += 1
+        if len(out) >= next_table:
+            next_table += table_every
+            out.append("| Ticker | P/L | P/VP | DY | ROE | Recomendação |")
+            out.append("|---|---|---|---|---|---|")
+            for i in range(6):
+                out.append(
+                    f"| ITUB{i}.SA | {8 + i}.2 | 1.{i} | {6 + i}.1% | 18% | **Manter** - revisar em 6 meses |"
+                )
+            out.append("")
+        elif n % 40 == 1:
+            out.append(f"## {n // 40 + 1}. Seção do relatório 📈")
+        elif n % 10 == 0:
+            out.append(f"### Subseção {n}")
+        elif n % 3 == 0:
+            out.append(f"- **Item {n}:** aportar R$ {n * 10:.2f} em *renda fixa* (Tesouro Selic).")
+        else:
+            out.append(
+                f"O ativo apresenta **dividend yield** de {n % 12}% e *crescimento* consistente, "
+                "com margens acima da média do setor e endividamento controlado."
+            )
+    return "\n".join(out[:lines])
+
+
+def legacy_story(text_content, doc):
+    """
+    Cópia da rotina original de export_to_pdf (antes do tokenizador), usada como referência.
+    """
+    styles = getSampleStyleSheet()
+    styles["h1"].fontName = "Helvetica-Bold"
+    styles["h1"].fontSize = 18
+    styles["h1"].spaceAfter = 14
+    styles["h2"].fontName = "Helvetica-Bold"
+    styles["h2"].fontSize = 14
+    styles["h2"].spaceAfter = 10
+    styles["Normal"].fontName = "Helvetica"
+    styles["Normal"].fontSize = 10
+    styles["Normal"].leading = 12
+    styles["Normal"].alignment = TA_JUSTIFY
+    styles.add(ParagraphStyle(name="CustomListItem", fontName="Helvetica", fontSize=10, leading=12, leftIndent=12))
+    styles.add(
+        ParagraphStyle(name="CustomTableText", fontName="Helvetica", fontSize=9, leading=11, alignment=TA_JUSTIFY)
+    )
+
+    story = []
+    in_table = False
+    table_data = []
+    for line in text_content.split("\n"):
+        stripped_line = line.strip()
+        if stripped_line.startswith("|") and "|" in stripped_line[1:]:
+            if not in_table:
+                in_table = True
+                table_data = []
+            row = [
+                Paragraph(cell.strip().replace("- ", "<br/>- "), styles["CustomTableText"])
+                for cell in stripped_line.split("|")
+                if cell.strip()
+            ]
+            if row:
+                table_data.append(row)
+            continue
+        elif in_table:
+            in_table = False
+            if table_data:
+                num_cols = len(table_data[0])
+                table_style = TableStyle(
+                    [
+                        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#F2F2F2")),
+                        ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+                        ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+                        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                        ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+                        ("BACKGROUND", (0, 1), (-1, -1), colors.white),
+                        ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#CCCCCC")),
+                        ("LEFTPADDING", (0, 0), (-1, -1), 4),
+                        ("RIGHTPADDING", (0, 0), (-1, -1), 4),
+                        ("TOPPADDING", (0, 0), (-1, -1), 4),
+                        ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+                    ]
+                )
+                if len(table_data) > 1 and all(isinstance(c, Paragraph) and "-" in c.text for c in table_data[1]):
+                    table_data = [table_data[0]] + table_data[2:]
+                table_obj = Table(table_data, colWidths=[doc.width / num_cols] * num_cols)
+                table_obj.setStyle(table_style)
+                story.append(table_obj)
+                story.append(Spacer(1, 0.2 * cm))
+            table_data = []
+
+        if stripped_line.startswith("## "):
+            story.append(Paragraph(stripped_line[3:].strip(), styles["h1"]))
+            story.append(Spacer(1, 0.2 * cm))
+        elif stripped_line.startswith("### "):
+            story.append(Paragraph(stripped_line[4:].strip(), styles["h2"]))
+            story.append(Spacer(1, 0.1 * cm))
+        elif stripped_line.startswith("- "):
+            story.append(Paragraph(stripped_line, styles["CustomListItem"]))
+        elif stripped_line:
+            formatted_line = re.sub(r"\*\*(.*?)\*\*", r"<b>\1</b>", line)
+            formatted_line = re.sub(r"\*(.*?)\*", r"<i>\1</i>", formatted_line)
+            story.append(Paragraph(formatted_line, styles["Normal"]))
+            story.append(Spacer(1, 0.1 * cm))
+        else:
+            story.append(Spacer(1, 0.1 * cm))
+    return story
+
+
+def _new_doc(path):
+    return SimpleDocTemplate(path, pagesize=A4, rightMargin=2 * cm, leftMargin=2 * cm, topMargin=2 * cm, bottomMargin=2 * cm)
+
+
+def run_legacy(text, path):
+    doc = _new_doc(path)
+    start = time.perf_counter()
+    story = legacy_story(text, doc)
+    parsed = time.perf_counter()
+    doc.build(story)
+    return parsed - start, time.perf_counter() - start
+
+
+def run_current(text, path):
+    renderer = StreamingPdfRenderer(path)
+    start = time.perf_counter()
+    renderer.feed(text)
+    parsed = time.perf_counter()
+    renderer.close()
+    return parsed - start, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--linhas", type=int, default=10_000)
+    parser.add_argument("--tabelas", type=int, default=300)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--relatorios", type=int, default=0, help="PDFs na comparação sequencial x pool de processos")
+    parser.add_argument("--processos", type=int, default=None, help="Processos do PdfRenderService (padrão: núcleos)")
+    args = parser.parse_args(argv)
+
+    text = synthetic_report(args.linhas, args.tabelas)
+    print(f"Relatório sintético: {args.linhas} linhas, {text.count(chr(10) + '|---')} tabelas, {len(text) / 1024:.0f} KiB")
+    print(f"{'implementação':<16}{'parse (ms)':>12}{'total (ms)':>12}{'linhas/s (parse)':>18}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, func in (("original", run_legacy), ("tokenizador", run_current)):
+            results = []
+            for _ in range(args.repeticoes):
+                gc.collect()
+                results.append(func(text, os.path.join(tmp, f"{name}.pdf")))
+            parse = min(r[0] for r in results)
+            total = min(r[1] for r in results)
+            print(f"{name:<16}{parse * 1000:>12.1f}{total * 1000:>12.1f}{args.linhas / parse:>18.0f}")
+
+        if args.relatorios:
+            bench_service(text, tmp, args.relatorios, args.processos)
+
+
+def bench_service(text, tmp, count, workers):
+    """
+    Relatórios por segundo gerando `count` PDFs em sequência e pelo PdfRenderService.
+    """
+    start = time.perf_counter()
+    for i in range(count):
+        export_to_pdf(text, os.path.join(tmp, f"sequencial_{i}.pdf"))
+    sequential = time.perf_counter() - start
+
+    with PdfRenderService(max_workers=workers) as service:
+        service.submit(text, os.path.join(tmp, "aquecimento.pdf")).result()
+        start = time.perf_counter()
+        results = service.render_all((text, os.path.join(tmp, f"paralelo_{i}.pdf")) for i in range(count))
+        parallel = time.perf_counter() - start
+    errors = [e for e in results.values() if e]
+    print(f"\n{count} relatórios ({workers or os.cpu_count()} processos, {len(errors)} erros)")
+    print(f"{'sequencial':<16}{sequential:>10.2f}s{count / sequential:>10.1f} relatórios/s")
+    print(f"{'PdfRenderService':<16}{parallel:>10.2f}s{count / parallel:>10.1f} relatórios/s")
+
+
+if __name__ == "__main__":
+    main()
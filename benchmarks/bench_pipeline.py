@@ -0,0 +1,157 @@
+"""
+Benchmark do pipeline completo sem rede, com os backends falsos (backends_falsos.py).
+
+Os agentes reproduzem relatórios sintéticos em trechos, com latência configurável para o
+primeiro trecho e entre trechos, e as ferramentas do Yahoo Finance devolvem payloads
+determinísticos. Mede, para relatórios pequenos, típicos e enormes:
+  - relatórios por minuto de ponta a ponta (análise -> refinamento -> PDF);
+  - tempo até o primeiro byte do PDF em disco (TTFB), a partir do início do relatório;
+  - páginas por segundo de export_to_pdf.
+
+Uso:
+    python benchmarks/bench_pipeline.py --relatorios 5
+    python benchmarks/bench_pipeline.py --latencia-primeiro-trecho 1.5 --latencia-trecho 0.05 --workers 4
+"""
+import argparse
+import contextlib
+import gc
+import io
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends_falsos import FakeAgent, FakeYFinanceTools
+from bench_pdf import synthetic_report
+from relatorio_pdf import StreamingPdfRenderer
+
+# Tamanho de cada cenário: (linhas, tabelas).
+SIZES = {
+    "pequeno": (40, 1),
+    "tipico": (400, 8),
+    "enorme": (10_000, 300),
+}
+
+PROFILE = {
+    "nome": "Perfil de Benchmark",
+    "renda_mensal": 8000.0,
+    "gastos_fixos": 4500.0,
+    "reservas_emergencia": 12000.0,
+    "tolerancia_risco": "Moderada",
+    "nivel_conhecimento": "Intermediário",
+    "obj_curto": "Completar a reserva de emergência de R$ 25.000",
+    "prazo_curto_meses": "12",
+    "obj_medio": "Entrada de apartamento de R$ 120 mil",
+    "prazo_medio_anos": "5",
+    "obj_longo": "Aposentadoria com renda passiva",
+    "acoes_interesse": "ITUB4.SA, GOAU4.SA, MXRF11.SA",
+    "setores_interesse": "Bancos, Siderurgia, FIIs",
+    "pref_renda": "Dividendo",
+    "outras_consideracoes": "",
+}
+
+
+def _wait_first_byte(path, start, stop, result):
+    while not stop.is_set():
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            result.append(time.perf_counter() - start)
+            return
+        time.sleep(0.001)
+
+
+def run_report(text, filename, args):
+    """
+    Gera um relatório com agentes e ferramentas falsos; retorna (duração, TTFB do PDF).
+    """
+    import agent
+
+    kwargs = {"first_chunk_latency": args.latencia_primeiro_trecho, "chunk_latency": args.latencia_trecho}
+    analysis_agent = FakeAgent.from_text(text, **kwargs)
+    refiner_agent = FakeAgent.from_text(text, **kwargs)
+    tools = FakeYFinanceTools(latency=args.latencia_ferramenta)
+
+    stop = threading.Event()
+    first_byte = []
+    start = time.perf_counter()
+    watcher = threading.Thread(target=_wait_first_byte, args=(filename, start, stop, first_byte), daemon=True)
+    watcher.start()
+    agent.generate_report(
+        PROFILE, filename, analysis_agent, refiner_agent, use_response_cache=False, market_tools=tools
+    )
+    elapsed = time.perf_counter() - start
+    watcher.join(timeout=1)
+    stop.set()
+    return elapsed, first_byte[0] if first_byte else elapsed
+
+
+def bench_end_to_end(name, text, tmp, args):
+    """
+    Relatórios por minuto e TTFB mediano do PDF; a primeira execução (aquecimento) não é contada.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_report(text, os.path.join(tmp, f"{name}_aquecimento.pdf"), args)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results = list(
+                executor.map(
+                    lambda i: run_report(text, os.path.join(tmp, f"{name}_{i}.pdf"), args),
+                    range(args.relatorios),
+                )
+            )
+        wall = time.perf_counter() - start
+    return args.relatorios / wall * 60, statistics.median(r[1] for r in results)
+
+
+def bench_export(text, tmp, repetitions):
+    """
+    Melhor tempo de export_to_pdf em `repetitions` execuções; retorna (segundos, páginas).
+    """
+    best = None
+    pages = 0
+    for i in range(repetitions):
+        gc.collect()
+        renderer = StreamingPdfRenderer(os.path.join(tmp, f"export_{len(text)}_{i}.pdf"))
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            renderer.feed(text)
+            renderer.close()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        pages = renderer.doc.page
+    return best, pages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--relatorios", type=int, default=5, help="Relatórios por cenário (ponta a ponta)")
+    parser.add_argument("--workers", type=int, default=1, help="Relatórios gerados em paralelo")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Repetições de export_to_pdf")
+    parser.add_argument("--latencia-primeiro-trecho", type=float, default=0.0, help="Segundos até o 1º trecho")
+    parser.add_argument("--latencia-trecho", type=float, default=0.0, help="Segundos entre trechos")
+    parser.add_argument("--latencia-ferramenta", type=float, default=0.0, help="Segundos por chamada ao Yahoo Finance")
+    parser.add_argument("--cenarios", nargs="+", choices=list(SIZES), default=list(SIZES))
+    args = parser.parse_args(argv)
+
+    print(
+        f"Latências: 1º trecho {args.latencia_primeiro_trecho}s, entre trechos {args.latencia_trecho}s, "
+        f"ferramentas {args.latencia_ferramenta}s; {args.workers} worker(s)"
+    )
+    print(f"{'cenário':<10}{'KiB':>8}{'relatórios/min':>16}{'TTFB PDF (ms)':>15}{'páginas':>9}{'páginas/s':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.cenarios:
+            text = synthetic_report(*SIZES[name])
+            per_minute, ttfb = bench_end_to_end(name, text, tmp, args)
+            export_time, pages = bench_export(text, tmp, args.repeticoes)
+            print(
+                f"{name:<10}{len(text) / 1024:>8.0f}{per_minute:>16.1f}{ttfb * 1000:>15.0f}"
+                f"{pages:>9}{pages / export_time:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Mede o tempo de inicialização a frio de `import agent` em processos novos.
+
+Compara a importação do módulo (dependências pesadas adiadas) com a importação
+antecipada de agno, reportlab, yfinance e dotenv, que era o custo pago por todo
+processo antes da construção preguiçosa dos agentes.
+
+Uso:
+    python benchmarks/tempo_importacao.py --repeticoes 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "python vazio": "pass",
+    "import agent": "import agent",
+    "dependências pesadas (antes)": (
+        "import dotenv, reportlab.platypus, reportlab.lib.styles, "
+        "agno.agent, agno.models.google, agno.tools.yfinance, yfinance"
+    ),
+}
+
+
+def measure(code, repetitions):
+    """
+    Executa `python -c code` em processos novos e retorna os tempos em milissegundos.
+    """
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    print(f"{'cenário':<32}{'mediana (ms)':>14}{'mínimo (ms)':>14}")
+    for name, code in SCENARIOS.items():
+        try:
+            timings = measure(code, args.repeticoes)
+        except subprocess.CalledProcessError:
+            print(f"{name:<32}{'indisponível (dependência ausente)':>28}")
+            continue
+        print(f"{name:<32}{statistics.median(timings):>14.1f}{min(timings):>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
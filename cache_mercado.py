@@ -0,0 +1,446 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import yfinance as yf
+from agno.tools.yfinance import YFinanceTools
+
+from rastreamento import tracer
+from sessao_http import install_yfinance_session
+
+CACHE_PATH = os.getenv("MARKET_CACHE_PATH", os.path.join(".cache", "mercado.sqlite3"))
+CACHE_MAX_BYTES = int(os.getenv("MARKET_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Validade de cada endpoint, em segundos.
+ENDPOINT_TTLS = {
+    "price": 30,
+    "technical_indicators": 15 * 60,
+    "news": 60 * 60,
+    "company_info": 24 * 60 * 60,
+    "fundamentals": 24 * 60 * 60,
+    "income_statements": 24 * 60 * 60,
+    "financial_ratios": 24 * 60 * 60,
+    "analyst_recommendations": 24 * 60 * 60,
+    "dividends": 24 * 60 * 60,
+    # Linha resumida da ferramenta de vários tickers (cotacoes_lote).
+    "quote_summary": 5 * 60,
+}
+# O histórico é incremental: após esse intervalo, busca apenas os pregões novos.
+HISTORY_REFRESH_SECONDS = 60 * 60
+
+# Janela aproximada (em dias) de cada período aceito pelo yfinance.
+PERIOD_DAYS = {
+    "1d": 1,
+    "5d": 5,
+    "1mo": 31,
+    "3mo": 92,
+    "6mo": 183,
+    "1y": 366,
+    "2y": 731,
+    "5y": 1827,
+    "10y": 3653,
+    "max": 365 * 100,
+}
+
+
+def _period_days(period):
+    if period == "ytd":
+        today = datetime.now()
+        return (today - datetime(today.year, 1, 1)).days + 1
+    return PERIOD_DAYS.get(period, PERIOD_DAYS["1mo"])
+
+
+def _is_error_payload(payload):
+    """
+    As ferramentas do agno devolvem mensagens de erro como texto; essas não são armazenadas.
+    """
+    return not payload or payload.startswith(("Error", "Could not"))
+
+
+class MarketDataCache:
+    """
+    Cache persistente (SQLite) dos dados de mercado, indexado por (ticker, endpoint, parâmetros).
+    Mantém o tamanho total abaixo de `max_bytes` descartando as entradas menos acessadas (LRU).
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, clock=time.time):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                ticker TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                params TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (ticker, endpoint, params)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries (last_access)")
+        self._conn.commit()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    @staticmethod
+    def _params_key(params):
+        return json.dumps(params or {}, sort_keys=True)
+
+    def get(self, ticker, endpoint, params=None):
+        """
+        Retorna (payload, fetched_at) da entrada armazenada, ou None.
+        """
+        key = (ticker.upper(), endpoint, self._params_key(params))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, fetched_at FROM entries WHERE ticker=? AND endpoint=? AND params=?",
+                key,
+            ).fetchone()
+            if row:
+                self._conn.execute(
+                    "UPDATE entries SET last_access=? WHERE ticker=? AND endpoint=? AND params=?",
+                    (self._clock(),) + key,
+                )
+                self._conn.commit()
+        return row
+
+    def put(self, ticker, endpoint, params, payload):
+        now = self._clock()
+        size = len(payload.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ticker.upper(), endpoint, self._params_key(params), payload, size, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT rowid, size FROM entries ORDER BY last_access ASC"
+        ).fetchall()
+        stale = []
+        for rowid, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((rowid,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE rowid=?", stale)
+
+    def _count(self, endpoint, hit):
+        # Os contadores são compartilhados entre threads do lote e do pré-carregamento.
+        with self._lock:
+            (self.hits if hit else self.misses)[endpoint] += 1
+
+    def get_fresh(self, ticker, endpoint, params=None):
+        """
+        Payload ainda dentro do TTL do endpoint, ou None; conta o acerto ou a falha.
+        """
+        row = self.get(ticker, endpoint, params)
+        if row and self._clock() - row[1] < ENDPOINT_TTLS[endpoint]:
+            self._count(endpoint, True)
+            return row[0]
+        self._count(endpoint, False)
+        return None
+
+    def get_or_fetch(self, ticker, endpoint, params, fetch):
+        """
+        Serve do disco enquanto a entrada estiver dentro do TTL do endpoint; caso contrário,
+        chama `fetch()` e armazena o resultado.
+        """
+        with tracer.span(f"yfinance:{endpoint}", "ferramenta", ticker=ticker) as span:
+            row = self.get(ticker, endpoint, params)
+            if row and self._clock() - row[1] < ENDPOINT_TTLS[endpoint]:
+                self._count(endpoint, True)
+                span["cache"] = "acerto"
+                return row[0]
+            self._count(endpoint, False)
+            span["cache"] = "falha"
+            payload = fetch()
+            if not _is_error_payload(payload):
+                self.put(ticker, endpoint, params, payload)
+            else:
+                span["erro"] = payload[:200]
+            return payload
+
+    def get_history(self, ticker, period="1mo", interval="1d"):
+        """
+        Histórico de preços em modo append-only: os pregões já armazenados são reaproveitados
+        e apenas as barras posteriores à última data salva são baixadas.
+        """
+        params = {"interval": interval}
+        days = _period_days(period)
+        with tracer.span("yfinance:history", "ferramenta", ticker=ticker, periodo=period) as span:
+            row = self.get(ticker, "history", params)
+            stored = json.loads(row[0]) if row else None
+
+            if stored and stored["days"] >= days and self._clock() - row[1] < HISTORY_REFRESH_SECONDS:
+                self._count("history", True)
+                span["cache"] = "acerto"
+            else:
+                self._count("history", False)
+                history = yf.Ticker(ticker)
+                if stored and stored["days"] >= days and stored["rows"]:
+                    span["cache"] = "incremental"
+                    last_date = max(stored["rows"])[:10]
+                    frame = history.history(start=last_date, interval=interval)
+                    stored["rows"].update(json.loads(frame.to_json(orient="index", date_format="iso")))
+                else:
+                    span["cache"] = "falha"
+                    frame = history.history(period=period, interval=interval)
+                    stored = {
+                        "days": days,
+                        "rows": json.loads(frame.to_json(orient="index", date_format="iso")),
+                    }
+                if stored["rows"]:
+                    self.put(ticker, "history", params, json.dumps(stored))
+
+        cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        window = {k: v for k, v in sorted(stored["rows"].items()) if k[:10] >= cutoff}
+        return json.dumps(window)
+
+    def stats(self):
+        """
+        Contadores de acertos e falhas por endpoint desde a criação do cache.
+        """
+        with self._lock:
+            endpoints = sorted(set(self.hits) | set(self.misses))
+            return {e: {"hits": self.hits[e], "misses": self.misses[e]} for e in endpoints}
+
+    def summary(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+        return f"Cache de mercado: {hits} acertos, {misses} falhas ({self.path})"
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """
+    Instância única do cache por processo, compartilhada por todas as ferramentas.
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = MarketDataCache()
+        return _shared_cache
+
+
+class CachedYFinanceTools(YFinanceTools):
+    """
+    YFinanceTools com as mesmas ferramentas, mas servidas pelo cache em disco.
+    Adiciona também as ferramentas `get_dividends` (histórico de proventos) e
+    `get_stocks_summary` (resumo de vários tickers em uma única chamada).
+    """
+
+    def __init__(self, cache=None, dividends=False, stocks_summary=False, **kwargs):
+        self.cache = cache or get_shared_cache()
+        install_yfinance_session()
+        super().__init__(**kwargs)
+        if dividends:
+            self.register(self.get_dividends)
+        if stocks_summary:
+            self.register(self.get_stocks_summary)
+
+    def get_current_stock_price(self, symbol: str) -> str:
+        """
+        Use this function to get the current stock price for a given symbol.
+
+        Args:
+            symbol (str): The stock symbol.
+
+        Returns:
+            str: The current stock price or error message.
+        """
+        return self.cache.get_or_fetch(
+            symbol, "price", {}, lambda: super(CachedYFinanceTools, self).get_current_stock_price(symbol)
+        )
+
+    def get_company_info(self, symbol: str) -> str:
+        """
+        Use this function to get company information and overview for a given stock symbol.
+
+        Args:
+            symbol (str): The stock symbol.
+
+        Returns:
+            str: JSON containing company profile and overview.
+        """
+        return self.cache.get_or_fetch(
+            symbol, "company_info", {}, lambda: super(CachedYFinanceTools, self).get_company_info(symbol)
+        )
+
+    def get_historical_stock_prices(self, symbol: str, period: str = "1mo", interval: str = "1d") -> str:
+        """
+        Use this function to get the historical stock price for a given symbol.
+
+        Args:
+            symbol (str): The stock symbol.
+            period (str): The period for which to retrieve historical prices. Defaults to "1mo".
+                        Valid periods: 1d,5d,1mo,3mo,6mo,1y,2y,5y,10y,ytd,max
+            interval (str): The interval between data points. Defaults to "1d".
+                        Valid intervals: 1d,5d,1wk,1mo,3mo
+
+        Returns:
+          str: The current stock price or error message.
+        """
+        try:
+            return self.cache.get_history(symbol, period, interval)
+        except Exception as e:
+            return f"Error fetching historical prices for {symbol}: {e}"
+
+    def get_stock_fundamentals(self, symbol: str) -> str:
+        """
+        Use this function to get fundamental data for a given stock symbol yfinance API.
+
+        Args:
+            symbol (str): The stock symbol.
+
+        Returns:
+            str: A JSON string containing fundamental data or an error message.
+        """
+        return self.cache.get_or_fetch(
+            symbol, "fundamentals", {}, lambda: super(CachedYFinanceTools, self).get_stock_fundamentals(symbol)
+        )
+
+    def get_income_statements(self, symbol: str) -> str:
+        """
+        Use this function to get income statements for a given stock symbol.
+
+        Args:
+            symbol (str): The stock symbol.
+
+        Returns:
+            dict: JSON containing income statements or an empty dictionary.
+        """
+        return self.cache.get_or_fetch(
+            symbol, "income_statements", {}, lambda: super(CachedYFinanceTools, self).get_income_statements(symbol)
+        )
+
+    def get_key_financial_ratios(self, symbol: str) -> str:
+        """
+        Use this function to get key financial ratios for a given stock symbol.
+
+        Args:
+            symbol (str): The stock symbol.
+
+        Returns:
+            dict: JSON containing key financial ratios.
+        """
+        return self.cache.get_or_fetch(
+            symbol, "financial_ratios", {}, lambda: super(CachedYFinanceTools, self).get_key_financial_ratios(symbol)
+        )
+
+    def get_analyst_recommendations(self, symbol: str) -> str:
+        """
+        Use this function to get analyst recommendations for a given stock symbol.
+
+        Args:
+            symbol (str): The stock symbol.
+
+        Returns:
+            str: JSON containing analyst recommendations.
+        """
+        return self.cache.get_or_fetch(
+            symbol,
+            "analyst_recommendations",
+            {},
+            lambda: super(CachedYFinanceTools, self).get_analyst_recommendations(symbol),
+        )
+
+    def get_company_news(self, symbol: str, num_stories: int = 3) -> str:
+        """
+        Use this function to get company news and press releases for a given stock symbol.
+
+        Args:
+            symbol (str): The stock symbol.
+            num_stories (int): The number of news stories to return. Defaults to 3.
+
+        Returns:
+            str: JSON containing company news and press releases.
+        """
+        return self.cache.get_or_fetch(
+            symbol,
+            "news",
+            {"num_stories": num_stories},
+            lambda: super(CachedYFinanceTools, self).get_company_news(symbol, num_stories),
+        )
+
+    def get_technical_indicators(self, symbol: str, period: str = "3mo") -> str:
+        """
+        Use this function to get technical indicators for a given stock symbol.
+
+        Args:
+            symbol (str): The stock symbol.
+            period (str): The time period for which to retrieve technical indicators.
+                Valid periods: 1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max. Defaults to 3mo.
+
+        Returns:
+            str: JSON containing technical indicators.
+        """
+        return self.cache.get_or_fetch(
+            symbol,
+            "technical_indicators",
+            {"period": period},
+            lambda: super(CachedYFinanceTools, self).get_technical_indicators(symbol, period),
+        )
+
+    def get_dividends(self, symbol: str) -> str:
+        """
+        Use this function to get the dividend payment history for a given stock or REIT (FII) symbol.
+
+        Args:
+            symbol (str): The stock symbol.
+
+        Returns:
+            str: JSON mapping payment dates to dividend amounts per share.
+        """
+
+        def fetch():
+            try:
+                series = yf.Ticker(symbol).dividends
+                return series.to_json(date_format="iso")
+            except Exception as e:
+                return f"Error fetching dividends for {symbol}: {e}"
+
+        return self.cache.get_or_fetch(symbol, "dividends", {}, fetch)
+
+    def get_stocks_summary(self, symbols: list[str]) -> str:
+        """
+        Use this function to get, in a single call, a summary table for several stock or REIT (FII) symbols:
+        price, 1-day and 12-month change, 52-week range, P/E, P/B, ROE, debt/EBITDA, net margin,
+        trailing 12-month dividends and yield, last dividend and analyst consensus.
+        Prefer it over the single-symbol functions when covering a portfolio and its sector peers.
+
+        Args:
+            symbols (list[str]): The stock symbols, e.g. ["PETR4.SA", "VALE3.SA", "MXRF11.SA"].
+
+        Returns:
+            str: A Markdown table with one row per symbol or an error message.
+        """
+        from cotacoes_lote import format_quotes_table, get_shared_fetcher
+
+        try:
+            tickers, rows = get_shared_fetcher().fetch(symbols, self)
+        except Exception as e:
+            return f"Error fetching summary for {symbols}: {e}"
+        return format_quotes_table(tickers, rows)
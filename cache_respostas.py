@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", os.path.join(".cache", "respostas"))
+CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_DAYS", "30")) * 24 * 60 * 60
+
+
+def bypass_requested():
+    """
+    RESPONSE_CACHE_BYPASS=1 desativa o cache de respostas sem alterar o código.
+    """
+    return os.getenv("RESPONSE_CACHE_BYPASS", "").lower() in ("1", "true", "sim", "yes")
+
+
+def response_key(model_id, instructions, prompt, tools=()):
+    """
+    Hash de conteúdo da chamada: modelo, instruções, prompt e ferramentas disponíveis.
+    Os resultados pré-carregados das ferramentas fazem parte do prompt e, portanto, da chave.
+    """
+    material = json.dumps(
+        {
+            "model": model_id,
+            "instructions": instructions,
+            "prompt": prompt,
+            "tools": sorted(tools),
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class CachedChunk:
+    """
+    Trecho reproduzido do cache, com a mesma interface (`content`) dos RunResponse do agno.
+    """
+
+    def __init__(self, content):
+        self.content = content
+
+
+class ResponseCache:
+    """
+    Armazena cada resposta completa como um arquivo JSONL (um trecho por linha) em
+    `<dir>/<hash[:2]>/<hash>.jsonl`. Respostas interrompidas nunca são gravadas.
+    Entradas expiram após o TTL e as menos usadas são descartadas acima de `max_bytes`.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.jsonl")
+
+    def load(self, key):
+        """
+        Retorna a lista de trechos armazenados para `key`, ou None.
+        """
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                chunks = [json.loads(line) for line in f]
+            os.utime(path)  # marca o uso para a política LRU
+            return chunks
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key, chunks):
+        """
+        Grava a resposta de forma atômica e aplica a política de descarte.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith(".jsonl"):
+                        path = os.path.join(root, name)
+                        stat = os.stat(path)
+                        entries.append((stat.st_mtime, stat.st_size, path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            now = time.time()
+            for mtime, size, path in entries:
+                if total <= self.max_bytes and now - mtime <= self.ttl:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def record_hit(self):
+        # O cache é compartilhado pelas threads do lote e pelos workers do serviço.
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def summary(self):
+        return f"Cache de respostas: {self.hits} acertos, {self.misses} falhas ({self.directory})"
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_response_cache():
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+        return _shared_cache
+
+
+def _tool_names(agent):
+    names = []
+    for tool in getattr(agent, "tools", None) or []:
+        functions = getattr(tool, "functions", None)
+        names.extend(functions.keys() if functions else [getattr(tool, "name", type(tool).__name__)])
+    return names
+
+
+class CachedAgent:
+    """
+    Envolve um Agent do agno: `run(prompt, stream=True)` (ou `arun`) reproduz a resposta armazenada
+    trecho a trecho quando houver acerto; caso contrário, repassa o stream real e o grava
+    ao final. Os demais atributos são delegados ao agente original.
+    Com `key_material` (ver keyed_by), a chave usa esse material no lugar do texto de `keyed_prompt`.
+    """
+
+    def __init__(self, agent, cache=None, key_material=None, keyed_prompt=None):
+        self.agent = agent
+        self.cache = cache or get_shared_response_cache()
+        self.key_material = key_material
+        self.keyed_prompt = keyed_prompt
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
+
+    def cache_key(self, prompt):
+        instructions = self.agent.instructions
+        if not isinstance(instructions, str):
+            instructions = json.dumps(instructions, ensure_ascii=False, default=str)
+        if self.key_material is not None and prompt == self.keyed_prompt:
+            prompt = json.dumps(self.key_material, ensure_ascii=False, sort_keys=True, default=str)
+        return response_key(self.agent.model.id, instructions, prompt, _tool_names(self.agent))
+
+    def run(self, prompt, stream=False, **kwargs):
+        if not stream:
+            return self.agent.run(prompt, stream=False, **kwargs)
+        return self._run_stream(prompt, **kwargs)
+
+    def _run_stream(self, prompt, **kwargs):
+        key = self.cache_key(prompt)
+        chunks = self.cache.load(key)
+        if chunks is not None:
+            self.cache.record_hit()
+            for content in chunks:
+                yield CachedChunk(content)
+            return
+
+        self.cache.record_miss()
+        recorded = []
+        for chunk in self.agent.run(prompt, stream=True, **kwargs):
+            content = getattr(chunk, "content", None)
+            if isinstance(content, str):
+                recorded.append(content)
+            yield chunk
+        if recorded:
+            self.cache.store(key, recorded)
+
+    async def arun(self, prompt, stream=False, **kwargs):
+        """
+        Equivalente assíncrono de `run`: com `stream=True`, retorna um iterador assíncrono.
+        """
+        if not stream:
+            return await self.agent.arun(prompt, stream=False, **kwargs)
+        return self._arun_stream(prompt, **kwargs)
+
+    async def _arun_stream(self, prompt, **kwargs):
+        key = self.cache_key(prompt)
+        chunks = self.cache.load(key)
+        if chunks is not None:
+            self.cache.record_hit()
+            for content in chunks:
+                yield CachedChunk(content)
+            return
+
+        self.cache.record_miss()
+        recorded = []
+        async for chunk in await self.agent.arun(prompt, stream=True, **kwargs):
+            content = getattr(chunk, "content", None)
+            if isinstance(content, str):
+                recorded.append(content)
+            yield chunk
+        if recorded:
+            self.cache.store(key, recorded)
+
+
+def keyed_by(agent, key_material, prompt):
+    """
+    Faz o agente com cache usar `key_material` como chave quando receber exatamente `prompt`, para
+    prompts que trazem dados do momento (cotações) e mudariam a chave a cada execução. Outros
+    prompts, como a continuação de um stream interrompido, seguem com a chave pelo texto.
+    Sem cache, retorna o agente inalterado.
+    """
+    if not isinstance(agent, CachedAgent):
+        return agent
+    return CachedAgent(agent.agent, agent.cache, key_material, prompt)
+
+
+def with_response_cache(agent, enabled=True):
+    """
+    Retorna o agente com cache de respostas, a menos que o cache esteja desativado
+    pelo parâmetro ou por RESPONSE_CACHE_BYPASS.
+    """
+    if not enabled or bypass_requested() or isinstance(agent, CachedAgent):
+        return agent
+    return CachedAgent(agent)
@@ -0,0 +1,257 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Cada execução fica em <RUNS_DIR>/<hash do perfil>[-<job>]/, com um arquivo por etapa concluída.
+RUNS_DIR = os.getenv("PIPELINE_RUNS_DIR", os.path.join(".cache", "execucoes"))
+# Execuções interrompidas mais antigas que isso recomeçam do zero (os dados de mercado envelhecem).
+MAX_AGE_SECONDS = float(os.getenv("CHECKPOINT_MAX_AGE_HOURS", "24")) * 60 * 60
+
+# Etapas na ordem do pipeline; o perfil é gravado como perfil.json e as demais como <etapa>.md.
+STAGES = ("perfil", "projecao", "renda_passiva", "prompt_analise", "analise", "prompt_refinamento", "refinado", "pdf")
+STATE_FILE = "estado.json"
+
+
+def checkpoints_enabled():
+    """
+    PIPELINE_CHECKPOINTS=0 desativa os pontos de retomada.
+    """
+    return os.getenv("PIPELINE_CHECKPOINTS", "1").lower() not in ("0", "false", "nao", "no")
+
+
+def profile_hash(profile_data):
+    material = json.dumps(profile_data, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+def _write_atomic(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def continuation_prompt(prompt, partial):
+    """
+    Pedido para o modelo continuar um stream interrompido sem repetir o que já foi gerado.
+    """
+    return (
+        prompt
+        + "\n\n---\nA resposta a este pedido foi interrompida. Abaixo está o texto já gerado; "
+        "CONTINUE exatamente do ponto em que ele parou, sem repetir nem resumir o trecho anterior.\n\n"
+        + partial
+    )
+
+
+class RunCheckpoint:
+    """
+    Pontos de retomada de uma execução do pipeline: cada etapa concluída é gravada de forma
+    atômica, e os streams em andamento são anexados a `<etapa>.parcial` trecho a trecho.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.state = self._load_state()
+
+    @property
+    def id(self):
+        return os.path.basename(self.directory)
+
+    def _load_state(self):
+        try:
+            with open(os.path.join(self.directory, STATE_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"etapas": {}, "criado_em": time.time()}
+
+    def _save_state(self):
+        self.state["atualizado_em"] = time.time()
+        _write_atomic(os.path.join(self.directory, STATE_FILE), json.dumps(self.state, ensure_ascii=False, indent=2))
+
+    def done(self, stage):
+        return stage in self.state["etapas"]
+
+    def completed(self):
+        return self.done("pdf") and self.state.get("refinado", False)
+
+    def last_stage(self):
+        # Um PDF com o rascunho (refinamento falhou) não encerra a execução.
+        return next(
+            (s for s in reversed(STAGES) if self.done(s) and (s != "pdf" or self.completed())),
+            None,
+        )
+
+    def _path(self, stage, suffix=None):
+        return os.path.join(self.directory, stage + (suffix or (".json" if stage == "perfil" else ".md")))
+
+    def load(self, stage):
+        """
+        Texto gravado da etapa, ou None se ela ainda não foi concluída.
+        """
+        if not self.done(stage):
+            return None
+        try:
+            with open(self._path(stage), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def save(self, stage, text):
+        _write_atomic(self._path(stage), text)
+        try:
+            os.remove(self._path(stage, ".parcial"))
+        except FileNotFoundError:
+            pass
+        self.mark(stage)
+        return text
+
+    def mark(self, stage, **info):
+        self.state["etapas"][stage] = time.time()
+        self.state.update(info)
+        self._save_state()
+
+    def load_partial(self, stage):
+        try:
+            with open(self._path(stage, ".parcial"), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return ""
+
+    def partial_writer(self, stage):
+        return open(self._path(stage, ".parcial"), "a", encoding="utf-8")
+
+    def reset(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        self.state = {"etapas": {}, "criado_em": time.time()}
+
+
+def open_run(profile_data, filename=None, runs_dir=RUNS_DIR, job=None):
+    """
+    Ponto de retomada do perfil: continua uma execução interrompida recente ou começa uma nova.
+    `job` separa execuções simultâneas do mesmo perfil (ex.: perfis repetidos em um lote), que
+    de outra forma gravariam na mesma pasta. Retorna None se os checkpoints estiverem desativados.
+    """
+    if not checkpoints_enabled():
+        return None
+    run_id = profile_hash(profile_data) + (f"-{job}" if job else "")
+    run = RunCheckpoint(os.path.join(runs_dir, run_id))
+    stale = time.time() - run.state.get("atualizado_em", run.state["criado_em"]) > MAX_AGE_SECONDS
+    if run.completed() or stale:
+        run.reset()
+    if run.last_stage():
+        print(f"--- RETOMANDO A EXECUÇÃO {run.id} APÓS A ETAPA '{run.last_stage()}' ---")
+    else:
+        run.save("perfil", json.dumps(profile_data, ensure_ascii=False, indent=2))
+    run.mark("perfil", nome=profile_data.get("nome"), arquivo=filename or run.state.get("arquivo"))
+    return run
+
+
+def run_stage_stream(run, stage, agent, prompt, on_chunk=None, name="agente"):
+    """
+    Executa o agente em streaming gravando cada trecho em `<etapa>.parcial`. Se já houver um
+    trecho parcial de uma execução interrompida, ele é reaproveitado e o modelo só continua
+    o texto. Ao final, a etapa é gravada por inteiro.
+    """
+    from agent import run_agent_stream
+
+    partial = run.load_partial(stage)
+    if partial:
+        print(f"Reaproveitando {len(partial)} caracteres já gerados na etapa '{stage}'.")
+        prompt = continuation_prompt(prompt, partial)
+        if on_chunk:
+            on_chunk(partial)
+
+    with run.partial_writer(stage) as writer:
+
+        def handle(chunk):
+            writer.write(chunk)
+            writer.flush()
+            if on_chunk:
+                on_chunk(chunk)
+
+        text = run_agent_stream(agent, prompt, on_chunk=handle, name=name)
+    return run.save(stage, partial + text)
+
+
+async def run_stage_stream_async(run, stage, agent, prompt, name="agente"):
+    """
+    Versão assíncrona de run_stage_stream, usada pelo modo em lote assíncrono.
+    """
+    import asyncio
+
+    from execucao_assincrona import run_agent_stream_async
+
+    partial = await asyncio.to_thread(run.load_partial, stage)
+    if partial:
+        print(f"Reaproveitando {len(partial)} caracteres já gerados na etapa '{stage}'.")
+        prompt = continuation_prompt(prompt, partial)
+
+    with run.partial_writer(stage) as writer:
+
+        def handle(chunk):
+            writer.write(chunk)
+            writer.flush()
+
+        text = await run_agent_stream_async(agent, prompt, on_chunk=handle, name=name)
+    return await asyncio.to_thread(run.save, stage, partial + text)
+
+
+def list_runs(runs_dir=RUNS_DIR):
+    if not os.path.isdir(runs_dir):
+        return []
+    runs = [RunCheckpoint(os.path.join(runs_dir, name)) for name in sorted(os.listdir(runs_dir))]
+    return sorted(runs, key=lambda run: run.state.get("atualizado_em", 0), reverse=True)
+
+
+def resume(run_id, filename=None, runs_dir=RUNS_DIR, **report_kwargs):
+    """
+    Continua a execução `run_id` a partir da última etapa concluída e gera o PDF.
+    """
+    from agent import generate_report
+
+    directory = os.path.join(runs_dir, run_id)
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f"Execução não encontrada: {run_id}")
+    run = RunCheckpoint(directory)
+    profile_text = run.load("perfil")
+    if profile_text is None:
+        raise FileNotFoundError(f"Execução sem perfil gravado: {run_id}")
+    filename = filename or run.state.get("arquivo") or "Relatorio_Financeiro_Personalizado.pdf"
+    print(f"--- RETOMANDO A EXECUÇÃO {run.id} APÓS A ETAPA '{run.last_stage()}' ---")
+    return generate_report(json.loads(profile_text), filename, checkpoint=run, **report_kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lista e retoma execuções interrompidas do relatório.")
+    parser.add_argument("execucao", nargs="?", help="Identificador da execução a retomar (omita para listar)")
+    parser.add_argument("-o", "--output", help="Arquivo PDF de saída (padrão: o da execução original)")
+    parser.add_argument("--limpar", action="store_true", help="Remove as execuções já concluídas")
+    args = parser.parse_args(argv)
+
+    if args.execucao:
+        try:
+            resume(args.execucao, args.output)
+        except Exception as e:
+            print(f"\n{e}")
+            return 1
+        return 0
+
+    for run in list_runs():
+        if args.limpar and run.completed():
+            shutil.rmtree(run.directory)
+            continue
+        atualizado = time.strftime("%Y-%m-%d %H:%M", time.localtime(run.state.get("atualizado_em", 0)))
+        situacao = "concluída" if run.completed() else f"parou após '{run.last_stage()}'"
+        print(f"{run.id}  {atualizado}  {run.state.get('nome') or '-'}  ({situacao})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from cache_mercado import CachedYFinanceTools
+from pre_carregamento import parse_tickers
+
+# Índice local de tickers da B3 por setor, em ordem aproximada de relevância (líderes primeiro).
+SECTOR_INDEX_PATH = os.getenv(
+    "SECTOR_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "setores_b3.json")
+)
+
+# Quantidade de pares, além das ações de interesse, incluídas em cada setor.
+MAX_PEERS = 5
+MAX_WORKERS = 8
+
+# Métricas numéricas da tabela: (chave, rótulo, direção, formato).
+# Direção +1: maior é melhor; -1: menor é melhor; 0: apenas informativa (fora da nota).
+METRICS = [
+    ("pl", "P/L", -1, "x"),
+    ("pvp", "P/VP", -1, "x"),
+    ("roe", "ROE", 1, "%"),
+    ("dy", "DY", 1, "%"),
+    ("divida_ebitda", "Dív./EBITDA", -1, "x"),
+    ("margem_liquida", "Margem Líq.", 1, "%"),
+    ("cresc_receita", "Cresc. Receita", 1, "%"),
+    ("cresc_lucro", "Cresc. Lucro", 1, "%"),
+    ("vpa", "VPA", 0, "R$"),
+    ("volume_medio", "Vol. Médio", 0, "vol"),
+]
+DIRECTIONS = np.array([m[2] for m in METRICS], dtype=float)
+SCORED = DIRECTIONS != 0
+
+
+@functools.lru_cache(maxsize=1)
+def load_sector_index(path=SECTOR_INDEX_PATH):
+    """
+    Lê o índice {setor: [tickers]} e monta também o mapa reverso {ticker: setor}.
+    """
+    with open(path, encoding="utf-8") as f:
+        sectors = json.load(f)
+    by_ticker = {}
+    for sector, tickers in sectors.items():
+        for ticker in tickers:
+            by_ticker.setdefault(ticker.upper(), sector)
+    return sectors, by_ticker
+
+
+def _base_ticker(ticker):
+    return ticker.upper().removesuffix(".SA")
+
+
+def peer_groups(tickers, max_peers=MAX_PEERS):
+    """
+    Agrupa os tickers de interesse por setor e completa cada grupo com os líderes do índice.
+    Tickers fora do índice ficam no grupo None, sem pares.
+    """
+    sectors, by_ticker = load_sector_index()
+    groups = {}
+    for ticker in tickers:
+        groups.setdefault(by_ticker.get(_base_ticker(ticker)), []).append(f"{_base_ticker(ticker)}.SA")
+    for sector, members in groups.items():
+        if sector is None:
+            continue
+        peers = [f"{t}.SA" for t in sectors[sector] if f"{t}.SA" not in members]
+        members.extend(peers[:max_peers])
+    return groups
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return np.nan
+    return float(value)
+
+
+def _dividend_yield(info):
+    # trailingAnnualDividendYield vem em fração; dividendYield, nas versões recentes do yfinance, em %.
+    value = _number(info.get("trailingAnnualDividendYield"))
+    if np.isnan(value):
+        value = _number(info.get("dividendYield"))
+        if value > 1:
+            value /= 100
+    return value
+
+
+def _metric_row(info):
+    """
+    Extrai as métricas de METRICS do `info` do yfinance (retornado por get_key_financial_ratios).
+    """
+    ebitda = _number(info.get("ebitda"))
+    total_debt = _number(info.get("totalDebt"))
+    pl = _number(info.get("trailingPE"))
+    if np.isnan(pl):
+        pl = _number(info.get("forwardPE"))
+    return [
+        pl,
+        _number(info.get("priceToBook")),
+        _number(info.get("returnOnEquity")),
+        _dividend_yield(info),
+        total_debt / ebitda if ebitda > 0 else np.nan,
+        _number(info.get("profitMargins")),
+        _number(info.get("revenueGrowth")),
+        _number(info.get("earningsGrowth")),
+        _number(info.get("bookValue")),
+        _number(info.get("averageDailyVolume3Month", info.get("averageVolume"))),
+    ]
+
+
+def fetch_peer_ratios(tickers, tools=None, max_workers=MAX_WORKERS):
+    """
+    Busca em paralelo (e via cache de mercado) os indicadores de cada ticker.
+    Retorna {ticker: dict do yfinance ou None se indisponível}.
+    """
+    tools = tools or CachedYFinanceTools()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        payloads = dict(zip(tickers, executor.map(tools.get_key_financial_ratios, tickers)))
+
+    ratios = {}
+    for ticker, payload in payloads.items():
+        try:
+            info = json.loads(payload)
+        except (TypeError, ValueError):
+            info = None
+        ratios[ticker] = info if isinstance(info, dict) else None
+    return ratios
+
+
+def build_metric_matrix(tickers, ratios):
+    """
+    Matriz (tickers x métricas) em float, com NaN onde o dado não existe.
+    """
+    empty = [np.nan] * len(METRICS)
+    return np.array([_metric_row(ratios[t]) if ratios.get(t) else empty for t in tickers], dtype=float)
+
+
+def score_peers(values):
+    """
+    Z-scores e posições por métrica dentro do grupo, já orientados pela direção de cada
+    métrica (positivo = melhor), e a nota composta (média dos z-scores disponíveis).
+    P/L e P/VP negativos (prejuízo/patrimônio negativo) ficam fora da nota.
+    Retorna (z, posicoes, nota, posicao_geral); posições começam em 1 e NaN indica sem dado.
+    """
+    values = values.copy()
+    multiples = values[:, :2]
+    multiples[multiples <= 0] = np.nan
+
+    signed = values[:, SCORED] * DIRECTIONS[SCORED]
+    valid = ~np.isnan(signed)
+    count = valid.sum(axis=0)
+    filled = np.where(valid, signed, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = filled.sum(axis=0) / count
+        variance = (np.where(valid, signed - mean, 0.0) ** 2).sum(axis=0) / count
+        std = np.sqrt(variance)
+        z = np.where(std > 0, (signed - mean) / std, 0.0)
+    z[~valid] = np.nan
+
+    ranks = _rank_columns(signed)
+    z_count = valid.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        composite = np.where(z_count > 0, np.where(valid, z, 0.0).sum(axis=1) / z_count, np.nan)
+    overall = _rank_columns(composite[:, None])[:, 0]
+    return z, ranks, composite, overall
+
+
+def _rank_columns(scores):
+    """
+    Posição (1 = melhor) de cada linha em cada coluna, com maior pontuação primeiro.
+    """
+    valid = ~np.isnan(scores)
+    order = np.argsort(np.where(valid, -scores, np.inf), axis=0, kind="stable")
+    ranks = np.empty(scores.shape)
+    np.put_along_axis(ranks, order, np.arange(1, scores.shape[0] + 1, dtype=float)[:, None], axis=0)
+    ranks[~valid] = np.nan
+    return ranks
+
+
+def build_sector_comparison(acoes_interesse, tools=None, max_peers=MAX_PEERS):
+    """
+    Monta a comparação setorial das ações de interesse com seus pares do índice local.
+    Retorna uma lista de grupos, cada um com as métricas, notas e posições já calculadas.
+    """
+    tickers = parse_tickers(acoes_interesse)
+    if not tickers:
+        return []
+    groups = peer_groups(tickers, max_peers)
+    all_tickers = list(dict.fromkeys(t for members in groups.values() for t in members))
+    ratios = fetch_peer_ratios(all_tickers, tools)
+
+    interest = {f"{_base_ticker(t)}.SA" for t in tickers}
+    comparison = []
+    for sector, members in groups.items():
+        values = build_metric_matrix(members, ratios)
+        z, ranks, composite, overall = score_peers(values)
+        comparison.append(
+            {
+                "setor": sector,
+                "tickers": members,
+                "interesse": [t in interest for t in members],
+                "valores": values,
+                "z": z,
+                "posicoes": ranks,
+                "nota": composite,
+                "posicao": overall,
+                "consenso": [(ratios.get(t) or {}).get("recommendationKey") or "N/A" for t in members],
+                "indisponiveis": [t for t in members if not ratios.get(t)],
+            }
+        )
+    return comparison
+
+
+def _format_value(value, kind):
+    if np.isnan(value):
+        return "N/A"
+    if kind == "%":
+        return f"{value * 100:.1f}%".replace(".", ",")
+    if kind == "R$":
+        return f"R$ {value:.2f}".replace(".", ",")
+    if kind == "vol":
+        if value >= 1_000_000:
+            return f"{value / 1_000_000:.1f} mi".replace(".", ",")
+        return f"{value / 1_000:.0f} mil"
+    return f"{value:.1f}".replace(".", ",")
+
+
+def format_comparison_markdown(comparison):
+    """
+    Tabelas Markdown (uma por setor, ordenadas pela nota) para o prompt de análise.
+    """
+    if not comparison:
+        return ""
+    lines = [
+        f"### TABELA COMPARATIVA SETORIAL (Yahoo Finance, {datetime.now():%Y-%m-%d})",
+        "Tabelas já calculadas: interprete-as diretamente, sem buscar novamente os dados das pares. "
+        "Nota = média dos z-scores no setor (positivo = melhor que a média dos pares); "
+        "ações de interesse em negrito.",
+        "",
+    ]
+    header = ["Ticker"] + [m[1] for m in METRICS] + ["Consenso", "Nota", "Posição"]
+    for group in comparison:
+        if group["setor"] is None:
+            lines.append(
+                "Sem setor no índice local (compare usando as ferramentas): "
+                + ", ".join(group["tickers"])
+            )
+            lines.append("")
+            continue
+        lines.append(f"**{group['setor']}**")
+        lines.append("")
+        lines.append("| " + " | ".join(header) + " |")
+        lines.append("|" + "---|" * len(header))
+        order = np.argsort(np.where(np.isnan(group["posicao"]), np.inf, group["posicao"]), kind="stable")
+        size = len(group["tickers"])
+        for i in order:
+            ticker = group["tickers"][i].removesuffix(".SA")
+            cells = [f"**{ticker}**" if group["interesse"][i] else ticker]
+            cells += [_format_value(v, m[3]) for v, m in zip(group["valores"][i], METRICS)]
+            nota = group["nota"][i]
+            cells.append(group["consenso"][i])
+            cells.append("N/A" if np.isnan(nota) else f"{nota:+.2f}".replace(".", ","))
+            cells.append("N/A" if np.isnan(group["posicao"][i]) else f"{int(group['posicao'][i])}º de {size}")
+            lines.append("| " + " | ".join(cells) + " |")
+        if group["indisponiveis"]:
+            lines.append("")
+            lines.append("Sem dados disponíveis: " + ", ".join(group["indisponiveis"]))
+        lines.append("")
+    return "\n".join(lines)
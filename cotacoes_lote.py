@@ -0,0 +1,274 @@
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+from rastreamento import tracer
+
+# Janela do download em lote: 12 meses de pregões mais uma semana para a base da variação anual.
+WINDOW_DAYS = 372
+# Endpoint do cache de mercado com a linha resumida de cada ticker (validade em ENDPOINT_TTLS).
+ENDPOINT = "quote_summary"
+# Indicadores de comparacao_setorial exibidos na tabela resumida.
+SUMMARY_METRICS = ("pl", "pvp", "roe", "divida_ebitda", "margem_liquida")
+
+
+def normalize_symbols(symbols):
+    """
+    Tickers em maiúsculas, sem repetições e na ordem recebida; os da B3 ganham o sufixo .SA.
+    Aceita uma lista ou um texto separado por vírgulas/espaços.
+    """
+    from pre_carregamento import TICKER_PATTERN
+
+    if isinstance(symbols, str):
+        symbols = symbols.replace(",", " ").split()
+    tickers = []
+    for symbol in symbols or []:
+        symbol = str(symbol).strip().upper()
+        match = TICKER_PATTERN.fullmatch(symbol)
+        ticker = f"{match.group(1)}.SA" if match else symbol
+        if ticker and ticker not in tickers:
+            tickers.append(ticker)
+    return tickers
+
+
+def download_quotes(tickers, start):
+    """
+    Pregões diários de todos os tickers desde `start` em um único `yf.download`.
+    Retorna {ticker: colunas no formato de historico_precos}, omitindo os tickers sem dados.
+    """
+    import yfinance as yf
+
+    from sessao_http import install_yfinance_session
+
+    install_yfinance_session()
+    frame = yf.download(
+        tickers,
+        start=start.isoformat(),
+        interval="1d",
+        auto_adjust=False,
+        actions=True,
+        group_by="ticker",
+        threads=True,
+        progress=False,
+    )
+    quotes = {}
+    if frame is None or frame.empty:
+        return quotes
+    available = set(frame.columns.get_level_values(0))
+    for ticker in tickers:
+        if ticker not in available:
+            continue
+        bars = frame[ticker].dropna(subset=["Close"])
+        if bars.empty:
+            continue
+        quotes[ticker] = {
+            "data": np.array(bars.index.strftime("%Y-%m-%d"), dtype="datetime64[D]"),
+            "maxima": bars["High"].to_numpy(float),
+            "minima": bars["Low"].to_numpy(float),
+            "fechamento": bars["Close"].to_numpy(float),
+            "dividendos": bars["Dividends"].fillna(0).to_numpy(float) if "Dividends" in bars else np.zeros(len(bars)),
+        }
+    return quotes
+
+
+def _value(x):
+    return None if x is None or not np.isfinite(x) else round(float(x), 4)
+
+
+def summarize_quotes(columns):
+    """
+    Preço, variações de 1 dia e 12 meses, faixa de 52 semanas e proventos dos últimos 12 meses.
+    """
+    dates = np.asarray(columns["data"], dtype="datetime64[D]")
+    close = np.asarray(columns["fechamento"], dtype=float)
+    valid = np.isfinite(close)
+    if not valid.any():
+        return {}
+    dates, close = dates[valid], close[valid]
+    high = np.asarray(columns.get("maxima", columns["fechamento"]), dtype=float)[valid]
+    low = np.asarray(columns.get("minima", columns["fechamento"]), dtype=float)[valid]
+    dividends = np.nan_to_num(np.asarray(columns["dividendos"], dtype=float)[valid])
+
+    year = dates > dates[-1] - np.timedelta64(365, "D")
+    paid = np.flatnonzero(dividends > 0)
+    base = close[np.argmax(dates >= dates[-1] - np.timedelta64(365, "D"))]
+    return {
+        "preco": _value(close[-1]),
+        "var_dia": _value(close[-1] / close[-2] - 1) if len(close) > 1 else None,
+        "var_12m": _value(close[-1] / base - 1) if dates[0] <= dates[-1] - np.timedelta64(358, "D") else None,
+        "minima_52s": _value(np.nanmin(low[year])),
+        "maxima_52s": _value(np.nanmax(high[year])),
+        "proventos_12m": _value(dividends[year].sum()),
+        "ultimo_provento": [str(dates[paid[-1]]), _value(dividends[paid[-1]])] if len(paid) else None,
+    }
+
+
+class BulkQuoteFetcher:
+    """
+    Resumo de mercado de vários tickers por chamada: um download em lote dos pregões (preço e
+    proventos) e os indicadores de cada ticker pelo cache de mercado, em paralelo.
+    As linhas ficam no cache de mercado; um ticker que já está sendo buscado por outra chamada
+    (de outro agente ou relatório) não é buscado de novo: a chamada espera a busca em andamento.
+    """
+
+    def __init__(self, download=download_quotes):
+        self.download = download
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.batches = 0
+        self.merged = 0
+
+    def fetch(self, symbols, tools):
+        """
+        Retorna (tickers normalizados, {ticker: linha resumida ou None se não houver dados}).
+        """
+        tickers = normalize_symbols(symbols)
+        cache = getattr(tools, "cache", None)
+        rows = {}
+        missing = []
+        for ticker in tickers:
+            payload = cache.get_fresh(ticker, ENDPOINT) if cache else None
+            if payload:
+                rows[ticker] = json.loads(payload)
+            else:
+                missing.append(ticker)
+
+        # Chave inclui a origem dos dados: backends falsos não se misturam ao cache real.
+        source = id(cache) if cache else id(tools)
+        owned, waiting = {}, {}
+        with self._lock:
+            for ticker in missing:
+                future = self._inflight.get((source, ticker))
+                if future is None:
+                    owned[ticker] = self._inflight[(source, ticker)] = Future()
+                else:
+                    waiting[ticker] = future
+            self.merged += len(waiting)
+
+        if owned:
+            try:
+                fetched = self._fetch_rows(list(owned), tools, cache)
+                for ticker, future in owned.items():
+                    future.set_result(fetched.get(ticker))
+            except Exception as e:
+                for future in owned.values():
+                    future.set_exception(e)
+            finally:
+                with self._lock:
+                    for ticker in owned:
+                        self._inflight.pop((source, ticker), None)
+        for ticker, future in {**owned, **waiting}.items():
+            rows[ticker] = future.result()
+        return tickers, rows
+
+    def _fetch_rows(self, tickers, tools, cache):
+        from comparacao_setorial import METRICS, _metric_row, fetch_peer_ratios
+
+        keys = [m[0] for m in METRICS]
+        download = getattr(tools, "download_quotes", None) or self.download
+        with tracer.span("cotacoes_lote", "ferramenta", tickers=len(tickers)) as span:
+            with self._lock:
+                self.batches += 1
+            # O lote de pregões e os indicadores (por ticker, via cache) são buscados ao mesmo tempo.
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                prices = executor.submit(download, tickers, date.today() - timedelta(days=WINDOW_DAYS))
+                ratios = fetch_peer_ratios(tickers, tools)
+            try:
+                quotes = prices.result()
+            except Exception as e:
+                # Sem o lote de preços, a tabela segue com os indicadores do cache de mercado.
+                span["erro"] = str(e)[:200]
+                quotes = {}
+            span["sem_precos"] = len(tickers) - len(quotes)
+
+        rows = {}
+        for ticker in tickers:
+            info = ratios.get(ticker)
+            row = summarize_quotes(quotes[ticker]) if ticker in quotes else {}
+            if info:
+                metrics = dict(zip(keys, _metric_row(info)))
+                row["nome"] = info.get("shortName") or info.get("longName")
+                row["consenso"] = info.get("recommendationKey")
+                row.update({key: _value(metrics[key]) for key in SUMMARY_METRICS})
+                row["dy_indicadores"] = _value(metrics["dy"])
+            if not row:
+                rows[ticker] = None
+                continue
+            rows[ticker] = row
+            if cache:
+                cache.put(ticker, ENDPOINT, None, json.dumps(row))
+        return rows
+
+    def summary(self):
+        return f"Cotações em lote: {self.batches} downloads, {self.merged} tickers aguardaram uma busca em andamento"
+
+
+_shared_fetcher = None
+_shared_fetcher_lock = threading.Lock()
+
+
+def get_shared_fetcher():
+    global _shared_fetcher
+    with _shared_fetcher_lock:
+        if _shared_fetcher is None:
+            _shared_fetcher = BulkQuoteFetcher()
+        return _shared_fetcher
+
+
+def _number(value):
+    return np.nan if value is None else value
+
+
+def format_quotes_table(tickers, rows):
+    """
+    Tabela Markdown com uma linha por ticker, na ordem pedida.
+    """
+    from comparacao_setorial import METRICS, _format_value
+
+    labels = {m[0]: m[1] for m in METRICS}
+    kinds = {m[0]: m[3] for m in METRICS}
+    header = ["Ticker", "Nome", "Preço", "Dia", "12m", "Mín./Máx. 52s"]
+    header += [labels[key] for key in SUMMARY_METRICS] + ["Proventos 12m", "DY 12m", "Último provento", "Consenso"]
+    lines = [
+        f"Resumo de {len(tickers)} ativos (Yahoo Finance, {date.today():%Y-%m-%d}). "
+        "Variações e proventos calculados pelos pregões dos últimos 12 meses.",
+        "",
+        "| " + " | ".join(header) + " |",
+        "|" + "---|" * len(header),
+    ]
+    missing = []
+    for ticker in tickers:
+        row = rows.get(ticker)
+        if not row:
+            missing.append(ticker)
+            continue
+        price = _number(row.get("preco"))
+        dividends = _number(row.get("proventos_12m"))
+        dividend_yield = dividends / price if row.get("preco") and row.get("proventos_12m") is not None else np.nan
+        if np.isnan(dividend_yield):
+            dividend_yield = _number(row.get("dy_indicadores"))
+        last = row.get("ultimo_provento")
+        low, high = _number(row.get("minima_52s")), _number(row.get("maxima_52s"))
+        cells = [
+            ticker.removesuffix(".SA"),
+            row.get("nome") or "N/A",
+            _format_value(price, "R$"),
+            _format_value(_number(row.get("var_dia")), "%"),
+            _format_value(_number(row.get("var_12m")), "%"),
+            "N/A" if np.isnan(low) else f"{_format_value(low, 'R$')} – {_format_value(high, 'R$')}",
+        ]
+        cells += [_format_value(_number(row.get(key)), kinds[key]) for key in SUMMARY_METRICS]
+        cells += [
+            _format_value(dividends, "R$"),
+            _format_value(dividend_yield, "%"),
+            f"{last[0]} ({_format_value(last[1], 'R$')})" if last else "N/A",
+            row.get("consenso") or "N/A",
+        ]
+        lines.append("| " + " | ".join(cells) + " |")
+    if missing:
+        lines.append("")
+        lines.append("Sem dados disponíveis: " + ", ".join(missing))
+    return "\n".join(lines) + "\n"
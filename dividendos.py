@@ -0,0 +1,236 @@
+from datetime import date, datetime
+
+import numpy as np
+
+# Perfis cuja preferência de renda inclui proventos recebem as métricas e a renda projetada.
+DIVIDEND_PREFERENCES = ("Dividendo", "Ambos")
+# Janela da matriz mensal de proventos: cobre o CAGR de 5 anos (do ano mais antigo ao mais recente).
+MONTHS = 60
+# Regularidade: trimestres com pelo menos um pagamento nos últimos 3 anos.
+REGULARITY_QUARTERS = 12
+
+
+def dividend_path_requested(profile_data):
+    return profile_data.get("pref_renda") in DIVIDEND_PREFERENCES
+
+
+def monthly_dividend_matrix(histories, as_of=None, months=MONTHS):
+    """
+    Soma os proventos por mês em uma matriz (tickers x meses), do mais antigo ao mês de `as_of`
+    (o mês atual, por padrão), em uma única passagem sobre as séries concatenadas.
+    Retorna (tickers, matriz, primeiro mês coberto por cada histórico como índice de coluna).
+    """
+    tickers = list(histories)
+    last_month = np.datetime64(as_of or date.today(), "M")
+    first_month = last_month - (months - 1)
+
+    rows = np.concatenate([np.full(len(histories[t]["data"]), i) for i, t in enumerate(tickers)])
+    dates = np.concatenate([np.asarray(histories[t]["data"], dtype="datetime64[D]") for t in tickers])
+    values = np.concatenate([np.asarray(histories[t]["dividendos"], dtype=float) for t in tickers])
+    columns = (dates.astype("datetime64[M]") - first_month).astype(int)
+    inside = (columns >= 0) & (columns < months) & (values > 0)
+
+    matrix = np.zeros((len(tickers), months))
+    np.add.at(matrix, (rows[inside], columns[inside]), values[inside])
+
+    starts = np.array(
+        [(np.asarray(histories[t]["data"][:1], dtype="datetime64[M]") - first_month).astype(int)[0] for t in tickers]
+    )
+    return tickers, matrix, np.clip(starts, 0, months)
+
+
+def compute_dividend_metrics(histories, as_of=None):
+    """
+    Métricas de proventos de todos os tickers de uma vez: soma dos últimos 12 meses por ação/cota,
+    dividend yield sobre o último fechamento, CAGR dos proventos anuais (até 5 anos), regularidade,
+    meses sem pagamento nos últimos 12 e meses desde o último pagamento. Ausentes ficam como NaN.
+    """
+    tickers, matrix, starts = monthly_dividend_matrix(histories, as_of)
+    n = len(tickers)
+    months = matrix.shape[1]
+    covered = np.arange(months) >= starts[:, None]
+
+    price = np.array([float(histories[t]["fechamento"][-1]) for t in tickers])
+    ttm = matrix[:, -12:].sum(axis=1)
+
+    # Somas de janelas de 12 meses terminadas no mês atual (coluna 4) e nos anos anteriores.
+    annual = matrix.reshape(n, months // 12, 12).sum(axis=2)
+    annual_covered = covered.reshape(n, months // 12, 12).all(axis=2)
+    base_ok = annual_covered[:, :-1] & (annual[:, :-1] > 0)
+    base = np.argmax(base_ok, axis=1)
+    years = annual.shape[1] - 1 - base
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cagr = (annual[:, -1] / annual[np.arange(n), base]) ** (1 / years) - 1
+        cagr[~base_ok.any(axis=1)] = np.nan
+
+        quarters = matrix[:, -3 * REGULARITY_QUARTERS :].reshape(n, REGULARITY_QUARTERS, 3).sum(axis=2) > 0
+        quarters_covered = covered[:, -3 * REGULARITY_QUARTERS :].reshape(n, REGULARITY_QUARTERS, 3).any(axis=2)
+        regularity = (quarters & quarters_covered).sum(axis=1) / quarters_covered.sum(axis=1)
+
+        dividend_yield = ttm / price
+
+    recent = matrix[:, -12:]
+    without_payment = ((recent == 0) & covered[:, -12:]).sum(axis=1).astype(float)
+    paid = matrix > 0
+    since_last = np.where(paid.any(axis=1), np.argmax(paid[:, ::-1], axis=1), np.nan)
+
+    return {
+        "tickers": tickers,
+        "mes": str(np.datetime64(as_of or date.today(), "M")),
+        "preco": price,
+        "proventos_12m": ttm,
+        "dy_12m": dividend_yield,
+        "cagr": cagr,
+        "cagr_anos": np.where(np.isnan(cagr), 0, years),
+        "regularidade": regularity,
+        "meses_sem_pagamento": without_payment,
+        "meses_desde_ultimo": since_last,
+    }
+
+
+def project_passive_income(metrics, positions):
+    """
+    Renda mensal projetada de cada posição no ritmo dos proventos dos últimos 12 meses.
+    A quantidade vem do perfil ou é estimada pelo valor investido dividido pelo preço médio
+    (ou, sem ele, pelo último fechamento). O yield on cost exige o preço médio.
+    """
+    tickers = metrics["tickers"]
+
+    def column(name):
+        return np.array([(positions.get(t) or {}).get(name) or np.nan for t in tickers], dtype=float)
+
+    invested, quantity, average = column("investido"), column("quantidade"), column("preco_medio")
+    price = metrics["preco"]
+    estimated = np.isnan(quantity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        quantity = np.where(np.isnan(quantity), invested / np.where(np.isnan(average), price, average), quantity)
+        invested = np.where(np.isnan(invested), quantity * np.where(np.isnan(average), price, average), invested)
+        yield_on_cost = metrics["proventos_12m"] / average
+        monthly_income = quantity * metrics["proventos_12m"] / 12
+
+    held = ~np.isnan(monthly_income)
+    return {
+        "tickers": tickers,
+        "investido": invested,
+        "quantidade": quantity,
+        "estimada": estimated,
+        "yield_on_cost": yield_on_cost,
+        "renda_mensal": monthly_income,
+        "renda_mensal_total": float(monthly_income[held].sum()) if held.any() else 0.0,
+        "posicoes": int(held.sum()),
+    }
+
+
+def _pct(value):
+    return "N/A" if np.isnan(value) else f"{value * 100:.1f}%".replace(".", ",")
+
+
+def _brl(value):
+    return "N/A" if np.isnan(value) else f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _months_ago(value):
+    if np.isnan(value):
+        return "N/A"
+    return {0: "este mês", 1: "há 1 mês"}.get(int(value), f"há {int(value)} meses")
+
+
+def _quantity(value, estimated):
+    if np.isnan(value):
+        return "N/A"
+    text = f"{value:,.0f}" if value >= 10 or value == int(value) else f"{value:,.2f}"
+    return ("~" if estimated else "") + text.replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def format_dividend_metrics_markdown(metrics, income=None):
+    """
+    Tabela Markdown com as métricas de proventos (e a renda de cada posição) para o prompt de análise.
+    """
+    if not metrics or not metrics["tickers"]:
+        return ""
+    header = ["Ticker", "Proventos 12m", "DY 12m", "CAGR proventos", "Regularidade", "Meses sem pagar (12m)", "Último pagamento"]
+    if income:
+        header += ["Yield on cost", "Renda mensal projetada"]
+    lines = [
+        f"### MÉTRICAS DE PROVENTOS (histórico local até {metrics['mes']}, gerado em {datetime.now():%Y-%m-%d})",
+        "Proventos por ação/cota já somados a partir do histórico local; regularidade = trimestres com pagamento "
+        "nos últimos 3 anos. Use estas métricas na análise de dividendos e na renda passiva, sem buscar o histórico de proventos.",
+        "",
+        "| " + " | ".join(header) + " |",
+        "|" + "---|" * len(header),
+    ]
+    for i, ticker in enumerate(metrics["tickers"]):
+        cagr = metrics["cagr"][i]
+        cells = [
+            ticker.removesuffix(".SA"),
+            _brl(metrics["proventos_12m"][i]),
+            _pct(metrics["dy_12m"][i]),
+            "N/A" if np.isnan(cagr) else f"{_pct(cagr)} a.a. ({int(metrics['cagr_anos'][i])}a)",
+            _pct(metrics["regularidade"][i]),
+            "N/A" if np.isnan(metrics["meses_sem_pagamento"][i]) else str(int(metrics["meses_sem_pagamento"][i])),
+            _months_ago(metrics["meses_desde_ultimo"][i]),
+        ]
+        if income:
+            cells += [_pct(income["yield_on_cost"][i]), _brl(income["renda_mensal"][i])]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def format_income_markdown(metrics, income):
+    """
+    Tabela da renda passiva mensal projetada por posição, anexada ao PDF final.
+    """
+    if not metrics or not metrics["tickers"]:
+        return ""
+    lines = [
+        "Projeção no ritmo dos proventos pagos nos últimos 12 meses (sem reinvestimento nem novos aportes). "
+        "Quantidades com ~ foram estimadas pelo valor investido.",
+        "",
+        "| Ativo | Valor investido | Quantidade | Proventos 12m por cota | DY 12m | Yield on cost | Renda mensal |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for i, ticker in enumerate(metrics["tickers"]):
+        lines.append(
+            f"| {ticker.removesuffix('.SA')} | {_brl(income['investido'][i])} "
+            f"| {_quantity(income['quantidade'][i], income['estimada'][i])} "
+            f"| {_brl(metrics['proventos_12m'][i])} | {_pct(metrics['dy_12m'][i])} "
+            f"| {_pct(income['yield_on_cost'][i])} | {_brl(income['renda_mensal'][i])} |"
+        )
+    lines.append(f"| **Total** | | | | | | **{_brl(income['renda_mensal_total'])}** |")
+    return "\n".join(lines) + "\n"
+
+
+def analyze_dividends(acoes_interesse, market_tools=None, as_of=None):
+    """
+    Atualiza o histórico local dos tickers do perfil e devolve (métricas, renda projetada),
+    ou (None, None) se nenhum ticker tiver histórico.
+    """
+    from historico_precos import history_store_for
+    from pre_carregamento import parse_positions, parse_tickers
+
+    histories = history_store_for(market_tools).get_many(parse_tickers(acoes_interesse))
+    if not histories:
+        return None, None
+    metrics = compute_dividend_metrics(histories, as_of)
+    return metrics, project_passive_income(metrics, parse_positions(acoes_interesse))
+
+
+def build_dividend_block(profile_data, market_tools=None):
+    """
+    Bloco do prompt de análise com as métricas de proventos, apenas para perfis com preferência
+    por renda passiva.
+    """
+    if not dividend_path_requested(profile_data):
+        return ""
+    metrics, income = analyze_dividends(profile_data["acoes_interesse"], market_tools)
+    return format_dividend_metrics_markdown(metrics, income)
+
+
+def build_income_section(profile_data, market_tools=None):
+    """
+    Seção do PDF com a renda passiva mensal projetada por posição ("" fora do caminho de renda passiva).
+    """
+    if not dividend_path_requested(profile_data):
+        return ""
+    metrics, income = analyze_dividends(profile_data["acoes_interesse"], market_tools)
+    return format_income_markdown(metrics, income)
@@ -0,0 +1,270 @@
+import asyncio
+import os
+import time
+
+import agent as agent_module
+from checkpoints import open_run
+from lote import _slug, job_id, load_profiles, normalize_profile, write_manifest
+from rastreamento import tracer
+from renderizacao_paralela import PdfRenderService
+
+# Intervalo da amostragem de uso da cota, registrada no rastreamento.
+UTILIZATION_SAMPLE_SECONDS = 5.0
+
+
+async def run_agent_stream_async(agent, prompt, on_chunk=None, name="agente"):
+    """
+    Versão assíncrona de agent.run_agent_stream: consome `await agent.arun(prompt, stream=True)`
+    e devolve o texto completo, liberando o event loop enquanto o modelo gera.
+    `on_chunk(texto)` é chamado a cada trecho recebido.
+    """
+    from limitador_cota import estimate_tokens
+
+    partes = []
+    with tracer.span(f"stream:{name}", "stream") as span:
+        inicio = time.perf_counter()
+        async for chunk in await agent.arun(prompt, stream=True):
+            content = getattr(chunk, "content", "")
+            if isinstance(content, str) and content.strip():
+                if not partes:
+                    span["primeiro_trecho_s"] = round(time.perf_counter() - inicio, 3)
+                partes.append(content)
+                if on_chunk:
+                    on_chunk(content)
+        texto = "".join(partes)
+        duracao = max(time.perf_counter() - inicio, 1e-9)
+        span.update(
+            trechos=len(partes),
+            caracteres=len(texto),
+            tokens_estimados=estimate_tokens(texto),
+            tokens_por_s=round(estimate_tokens(texto) / duracao, 1),
+        )
+    return texto
+
+
+def _render_pdf(text_content, filename):
+    from relatorio_pdf import export_to_pdf
+
+    export_to_pdf(text_content, filename)
+
+
+async def generate_report_async(
+    profile_data,
+    filename,
+    analysis_agent,
+    refiner_agent,
+    pdf_service=None,
+    use_response_cache=True,
+    compact=None,
+    market_tools=None,
+    map_reduce=None,
+    checkpoint=None,
+):
+    """
+    Mesmo pipeline de agent.generate_report, sem bloquear o event loop: a montagem do prompt
+    (e, com `map_reduce`, as análises por ticker) roda em thread, os agentes são consumidos
+    com `arun` e o PDF é gerado em `pdf_service` (um PdfRenderService no modo em lote;
+    None gera o PDF em uma thread deste processo). Com `checkpoint`, as etapas são gravadas
+    e reaproveitadas como em agent.generate_report.
+    """
+    from analise_por_ticker import map_reduce_requested, run_ticker_analyses
+    from cache_respostas import keyed_by, with_response_cache
+    from orcamento_prompt import compact_mode_requested
+
+    if compact is None:
+        compact = compact_mode_requested()
+    if map_reduce is None:
+        map_reduce = map_reduce_requested()
+    analysis_agent = with_response_cache(analysis_agent, use_response_cache)
+    refiner_agent = with_response_cache(refiner_agent, use_response_cache)
+
+    with tracer.span("relatorio", arquivo=filename, compacto=compact, por_ticker=map_reduce) as span:
+        projecao_objetivos = await asyncio.to_thread(
+            agent_module._checkpointed,
+            checkpoint,
+            "projecao",
+            lambda: agent_module.build_goal_projection(profile_data),
+        )
+        renda_passiva = await asyncio.to_thread(
+            agent_module._checkpointed,
+            checkpoint,
+            "renda_passiva",
+            lambda: agent_module.build_income_section(profile_data, market_tools),
+        )
+
+        def montar_prompt_analise():
+            analises_por_ticker = None
+            if map_reduce:
+                with tracer.span("analises_por_ticker"):
+                    analises_por_ticker = run_ticker_analyses(
+                        profile_data["acoes_interesse"], market_tools, use_cache=use_response_cache
+                    )
+            return agent_module.build_analysis_prompt(
+                profile_data, projecao_objetivos, compact, market_tools, analises_por_ticker
+            )
+
+        prompt_para_analise = await asyncio.to_thread(
+            agent_module._checkpointed, checkpoint, "prompt_analise", montar_prompt_analise
+        )
+        analysis_agent = keyed_by(
+            analysis_agent, agent_module.analysis_cache_key(profile_data, compact, map_reduce), prompt_para_analise
+        )
+
+        try:
+            analise_bruta_completa = await _checkpointed_stream_async(
+                checkpoint, "analise", analysis_agent, prompt_para_analise, name="finance_agent"
+            )
+        except Exception as e:
+            agent_module._print_agent_error("finance_agent", e)
+            raise
+
+        refinado = True
+        try:
+            prompt_para_refinamento = await asyncio.to_thread(
+                agent_module._checkpointed,
+                checkpoint,
+                "prompt_refinamento",
+                lambda: agent_module.build_refinement_prompt(analise_bruta_completa, compact),
+            )
+            relatorio_final_texto = await _checkpointed_stream_async(
+                checkpoint, "refinado", refiner_agent, prompt_para_refinamento, name="report_refiner_agent"
+            )
+        except Exception as e:
+            agent_module._print_agent_error("report_refiner_agent", e)
+            print("Exportando a análise inicial sem refinamento.")
+            relatorio_final_texto = analise_bruta_completa
+            refinado = False
+
+        if not relatorio_final_texto:
+            raise RuntimeError("Não foi possível gerar o relatório final para exportação em PDF.")
+        texto_pdf = relatorio_final_texto + agent_module.final_sections(projecao_objetivos, renda_passiva)
+        with tracer.span("export_to_pdf", caracteres=len(texto_pdf)):
+            if pdf_service is None:
+                await asyncio.to_thread(_render_pdf, texto_pdf, filename)
+            else:
+                await asyncio.wrap_future(pdf_service.submit(texto_pdf, filename))
+        if checkpoint is not None:
+            await asyncio.to_thread(checkpoint.mark, "pdf", refinado=refinado, arquivo=filename)
+        span["refinado"] = refinado
+        return refinado
+
+
+async def _checkpointed_stream_async(checkpoint, stage, agent, prompt, name="agente"):
+    """
+    Como agent._checkpointed_stream, para o stream assíncrono.
+    """
+    if checkpoint is None:
+        return await run_agent_stream_async(agent, prompt, name=name)
+    texto = await asyncio.to_thread(checkpoint.load, stage)
+    if texto is not None:
+        print(f"Etapa '{stage}' reaproveitada da execução {checkpoint.id}.")
+        return texto
+
+    from checkpoints import run_stage_stream_async
+
+    return await run_stage_stream_async(checkpoint, stage, agent, prompt, name=name)
+
+
+async def _process_profile_async(
+    semaphore,
+    index,
+    record,
+    output_dir,
+    pdf_service,
+    use_response_cache,
+    compact,
+    agent_factory,
+    market_tools,
+    map_reduce,
+):
+    entry = {"indice": index, "nome": record.get("nome"), "pdf": None, "status": "erro", "erro": None}
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            profile_data = normalize_profile(record)
+            filename = os.path.join(output_dir, f"{index:04d}_{_slug(profile_data['nome'])}.pdf")
+            checkpoint = open_run(profile_data, filename, job=job_id(filename))
+            entry["execucao"] = checkpoint.id if checkpoint else None
+            # Cada relatório usa seus próprios agentes, pois o Agent guarda estado da execução.
+            analysis_agent, refiner_agent = agent_factory()
+            refinado = await generate_report_async(
+                profile_data,
+                filename,
+                analysis_agent,
+                refiner_agent,
+                pdf_service,
+                use_response_cache,
+                compact,
+                market_tools,
+                map_reduce,
+                checkpoint,
+            )
+            entry["pdf"] = filename
+            entry["status"] = "ok" if refinado else "sem_refinamento"
+        except Exception as e:
+            entry["erro"] = str(e)
+        entry["duracao_s"] = round(time.perf_counter() - start, 2)
+    return entry
+
+
+def _default_agents():
+    return agent_module.create_finance_agent(), agent_module.create_report_refiner_agent()
+
+
+async def _sample_quota_utilization(model_id):
+    from limitador_cota import shared_limiter
+
+    while True:
+        requests, tokens = shared_limiter.utilization(model_id)
+        tracer.instant("cota:utilizacao", "cota", requisicoes=round(requests, 3), tokens=round(tokens, 3))
+        await asyncio.sleep(UTILIZATION_SAMPLE_SECONDS)
+
+
+async def run_batch_async(
+    input_path,
+    output_dir,
+    concurrency=8,
+    pdf_workers=None,
+    use_response_cache=True,
+    compact=None,
+    agent_factory=None,
+    market_tools=None,
+    map_reduce=None,
+):
+    """
+    Gera os relatórios de todos os perfis em um único event loop, com até `concurrency`
+    relatórios em andamento. As chamadas ao Gemini passam pelo limitador compartilhado,
+    que só segura um relatório quando a cota de fato exige, e os PDFs são gerados em um
+    pool de `pdf_workers` processos. Grava o manifesto e retorna a lista de entradas.
+    """
+    records = load_profiles(input_path)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"--- PROCESSANDO {len(records)} PERFIS DE FORMA ASSÍNCRONA ({concurrency} simultâneos) ---")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    agent_factory = agent_factory or _default_agents
+    sampler = asyncio.create_task(_sample_quota_utilization(agent_module.MODEL_ID))
+    try:
+        with PdfRenderService(max_workers=pdf_workers) as pdf_service:
+            entries = await asyncio.gather(
+                *(
+                    _process_profile_async(
+                        semaphore,
+                        index,
+                        record,
+                        output_dir,
+                        pdf_service,
+                        use_response_cache,
+                        compact,
+                        agent_factory,
+                        market_tools,
+                        map_reduce,
+                    )
+                    for index, record in enumerate(records, start=1)
+                )
+            )
+    finally:
+        sampler.cancel()
+
+    write_manifest(input_path, output_dir, entries)
+    return list(entries)
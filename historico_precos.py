@@ -0,0 +1,257 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+from rastreamento import tracer
+
+HISTORY_DIR = os.getenv("PRICE_HISTORY_DIR", os.path.join(".cache", "historico"))
+# Profundidade da primeira carga: cobre o retorno de 5 anos com folga.
+HISTORY_YEARS = int(os.getenv("PRICE_HISTORY_YEARS", "6"))
+# Intervalo mínimo entre duas atualizações do mesmo ticker.
+REFRESH_SECONDS = 60 * 60
+MAX_WORKERS = 8
+
+# Uma coluna por arquivo binário, sem cabeçalho, lida como memmap.
+# As datas são dias desde 1970-01-01; os preços não são ajustados por proventos
+# (o ajuste mudaria o passado a cada dividendo e quebraria a gravação append-only).
+COLUMNS = {
+    "data": np.dtype("<i8"),
+    "abertura": np.dtype("<f8"),
+    "maxima": np.dtype("<f8"),
+    "minima": np.dtype("<f8"),
+    "fechamento": np.dtype("<f8"),
+    "volume": np.dtype("<f8"),
+    "dividendos": np.dtype("<f8"),
+}
+META_FILE = "meta.json"
+
+
+def download_history(ticker, start):
+    """
+    Pregões diários desde `start` (inclusive) pelo yfinance, no formato de COLUMNS,
+    mais a coluna "desdobramentos" (usada apenas para detectar desdobramentos).
+    """
+    import yfinance as yf
+
+    from sessao_http import install_yfinance_session
+
+    install_yfinance_session()
+    frame = yf.Ticker(ticker).history(start=start.isoformat(), interval="1d", auto_adjust=False, actions=True)
+    columns = {
+        "data": np.array(frame.index.strftime("%Y-%m-%d"), dtype="datetime64[D]"),
+        "abertura": frame["Open"].to_numpy(float),
+        "maxima": frame["High"].to_numpy(float),
+        "minima": frame["Low"].to_numpy(float),
+        "fechamento": frame["Close"].to_numpy(float),
+        "volume": frame["Volume"].to_numpy(float),
+    }
+    empty = np.zeros(len(frame))
+    columns["dividendos"] = frame["Dividends"].to_numpy(float) if "Dividends" in frame else empty
+    columns["desdobramentos"] = frame["Stock Splits"].to_numpy(float) if "Stock Splits" in frame else empty
+    return columns
+
+
+def _to_days(dates):
+    return np.asarray(dates, dtype="datetime64[D]").astype("<i8")
+
+
+class PriceHistoryStore:
+    """
+    Histórico diário (OHLCV e proventos) por ticker em formato colunar:
+    `<dir>/<TICKER>/<coluna>[.<geração>].bin` mais `meta.json` com a quantidade de linhas
+    válidas e a geração dos arquivos. As atualizações baixam apenas os pregões a partir da
+    última data gravada e os anexam ao fim dos arquivos (o último pregão é regravado, pois
+    pode ter sido parcial). Um desdobramento no trecho novo provoca a recarga completa do
+    ticker, gravada em uma geração nova: leitores que já leram o meta continuam na anterior.
+    """
+
+    def __init__(self, directory=HISTORY_DIR, fetch=download_history, clock=time.time, years=HISTORY_YEARS):
+        self.directory = directory
+        self.fetch = fetch
+        self._clock = clock
+        self.years = years
+        self._lock = threading.Lock()
+        self._ticker_locks = {}
+
+    def _path(self, ticker, name):
+        return os.path.join(self.directory, ticker.upper(), name)
+
+    def _column_path(self, ticker, name, generation):
+        # A geração 0 mantém os nomes anteriores à troca por gerações.
+        return self._path(ticker, f"{name}.bin" if not generation else f"{name}.{generation}.bin")
+
+    def _ticker_lock(self, ticker):
+        with self._lock:
+            return self._ticker_locks.setdefault(ticker.upper(), threading.Lock())
+
+    def meta(self, ticker):
+        try:
+            with open(self._path(ticker, META_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, ticker, meta):
+        path = self._path(ticker, META_FILE)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def load(self, ticker):
+        """
+        Colunas do ticker como memmaps somente leitura ("data" em datetime64[D]), ou None.
+        """
+        meta = self.meta(ticker)
+        if not meta or not meta["linhas"]:
+            return None
+        try:
+            return self._open_columns(ticker, meta)
+        except (OSError, ValueError):
+            # Uma recarga terminou entre a leitura do meta e a abertura: usa a geração nova.
+            meta = self.meta(ticker)
+            return self._open_columns(ticker, meta) if meta and meta["linhas"] else None
+
+    def _open_columns(self, ticker, meta):
+        rows = meta["linhas"]
+        generation = meta.get("geracao", 0)
+        columns = {
+            name: np.memmap(self._column_path(ticker, name, generation), dtype=dtype, mode="r", shape=(rows,))
+            for name, dtype in COLUMNS.items()
+        }
+        columns["data"] = columns["data"].view("datetime64[D]")
+        return columns
+
+    def _append_columns(self, ticker, new, offset, generation):
+        """
+        Grava as novas linhas a partir da linha `offset`, sem encolher os arquivos: leitores
+        com memmap aberto continuam válidos, e os bytes além de `linhas` são ignorados.
+        """
+        for name, dtype in COLUMNS.items():
+            with open(self._column_path(ticker, name, generation), "r+b") as f:
+                f.seek(offset * dtype.itemsize)
+                f.write(np.ascontiguousarray(new[name], dtype=dtype).tobytes())
+
+    def _replace_columns(self, ticker, new, generation):
+        """
+        Recarga completa: as colunas são gravadas nos arquivos da geração `generation`, que só
+        passa a valer com a troca atômica do meta. Os arquivos em uso não são encolhidos.
+        """
+        directory = self._path(ticker, "")
+        os.makedirs(directory, exist_ok=True)
+        for name, dtype in COLUMNS.items():
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(np.ascontiguousarray(new[name], dtype=dtype).tobytes())
+            os.replace(tmp_path, self._column_path(ticker, name, generation))
+
+    def _remove_generation(self, ticker, generation):
+        for name in COLUMNS:
+            try:
+                os.remove(self._column_path(ticker, name, generation))
+            except OSError:
+                # Inexistente, ou ainda mapeado por um leitor no Windows: fica para a próxima recarga.
+                pass
+
+    def update(self, ticker):
+        """
+        Atualiza o ticker se a última atualização for mais antiga que REFRESH_SECONDS.
+        Retorna o modo usado: "acerto", "incremental" ou "completa".
+        """
+        with self._ticker_lock(ticker), tracer.span("historico_precos", "ferramenta", ticker=ticker) as span:
+            meta = self.meta(ticker)
+            now = self._clock()
+            if meta and now - meta["atualizado_em"] < REFRESH_SECONDS:
+                span["cache"] = "acerto"
+                return "acerto"
+
+            stored = self.load(ticker)
+            mode = "completa"
+            if stored is not None:
+                new = self.fetch(ticker, stored["data"][-1].astype(object))
+                if not np.any(np.asarray(new.get("desdobramentos", ()), dtype=float) != 0):
+                    mode = "incremental"
+            if mode == "completa":
+                new = self.fetch(ticker, date.today() - timedelta(days=365 * self.years + 7))
+
+            new = self._clean(new)
+            generation = meta.get("geracao", 0) if meta else 0
+            if mode == "incremental":
+                # Os pregões a partir da primeira data nova substituem os gravados.
+                rows = meta["linhas"]
+                if len(new["data"]):
+                    rows = int(np.searchsorted(_to_days(stored["data"]), new["data"][0]))
+                    self._append_columns(ticker, new, rows, generation)
+                rows += len(new["data"])
+                self._write_meta(ticker, {"linhas": rows, "atualizado_em": now, "geracao": generation})
+            else:
+                rows = len(new["data"])
+                self._replace_columns(ticker, new, generation + 1)
+                self._write_meta(ticker, {"linhas": rows, "atualizado_em": now, "geracao": generation + 1})
+                # A geração anterior fica para os leitores em andamento; a de antes dela é removida.
+                if generation:
+                    self._remove_generation(ticker, generation - 1)
+            span.update(cache="incremental" if mode == "incremental" else "falha", linhas_novas=len(new["data"]))
+            return mode
+
+    @staticmethod
+    def _clean(new):
+        """
+        Converte as datas, ordena e descarta pregões sem fechamento.
+        """
+        dates = _to_days(new["data"])
+        order = np.argsort(dates, kind="stable")
+        close = np.asarray(new["fechamento"], dtype=float)[order]
+        valid = np.isfinite(close)
+        cleaned = {"data": dates[order][valid]}
+        for name in COLUMNS:
+            if name != "data":
+                values = np.asarray(new.get(name, np.zeros(len(dates))), dtype=float)[order][valid]
+                cleaned[name] = np.nan_to_num(values) if name in ("volume", "dividendos") else values
+        return cleaned
+
+    def get(self, ticker):
+        """
+        Atualiza (se necessário) e devolve as colunas do ticker; None se não houver dados.
+        """
+        try:
+            self.update(ticker)
+        except Exception as e:
+            # Sem rede, segue com o que já estiver gravado.
+            tracer.instant("historico_precos:erro", "ferramenta", ticker=ticker, erro=str(e)[:200])
+        return self.load(ticker)
+
+    def get_many(self, tickers, max_workers=MAX_WORKERS):
+        """
+        Atualiza em paralelo e devolve {ticker: colunas}, omitindo os tickers sem dados.
+        """
+        if not tickers:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(tickers))) as executor:
+            histories = dict(zip(tickers, executor.map(self.get, tickers)))
+        return {ticker: columns for ticker, columns in histories.items() if columns is not None}
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_history():
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = PriceHistoryStore()
+        return _shared_store
+
+
+def history_store_for(market_tools=None):
+    """
+    Armazenamento próprio de `market_tools` (`history_store`, como nos backends falsos) ou o compartilhado.
+    """
+    return getattr(market_tools, "history_store", None) or get_shared_history()
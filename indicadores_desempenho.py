@@ -0,0 +1,130 @@
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+# Retorno total (preço + proventos, sem reinvestimento) em cada janela, em dias corridos.
+HORIZONS = [("1m", 30), ("12m", 365), ("3a", 3 * 365), ("5a", 5 * 365)]
+TRADING_DAYS = 252
+MOVING_AVERAGES = (50, 200)
+
+
+def align_histories(histories):
+    """
+    Alinha os históricos na grade comum de pregões: matrizes (tickers x datas) de fechamento,
+    com o último preço repetido nos dias sem negócio, e de proventos (zero nos demais dias).
+    Retorna (tickers, datas, fechamentos, proventos).
+    """
+    tickers = list(histories)
+    dates = np.unique(np.concatenate([np.asarray(histories[t]["data"]) for t in tickers]))
+    closes = np.full((len(tickers), len(dates)), np.nan)
+    dividends = np.zeros((len(tickers), len(dates)))
+    for i, ticker in enumerate(tickers):
+        index = np.searchsorted(dates, histories[ticker]["data"])
+        closes[i, index] = histories[ticker]["fechamento"]
+        dividends[i, index] = histories[ticker]["dividendos"]
+
+    # Preenchimento para frente: em cada posição, o índice do último fechamento conhecido.
+    valid = ~np.isnan(closes)
+    last = np.where(valid, np.arange(len(dates)), 0)
+    np.maximum.accumulate(last, axis=1, out=last)
+    closes = np.take_along_axis(closes, last, axis=1)
+    return tickers, dates, closes, dividends
+
+
+def compute_performance(histories, as_of=None):
+    """
+    Indicadores de todos os tickers de uma vez: retorno total por janela (HORIZONS),
+    volatilidade anualizada e queda máxima em 12 meses, médias móveis (MOVING_AVERAGES)
+    e distância do preço à média de 200 pregões. Valores ausentes ficam como NaN.
+    """
+    tickers, dates, closes, dividends = align_histories(histories)
+    if as_of is not None:
+        end = np.searchsorted(dates, np.datetime64(as_of, "D"), side="right")
+        dates, closes, dividends = dates[:end], closes[:, :end], dividends[:, :end]
+    price = closes[:, -1]
+    cumulative_dividends = np.cumsum(dividends, axis=1)
+
+    returns = {}
+    for label, days in HORIZONS:
+        start = np.searchsorted(dates, dates[-1] - np.timedelta64(days, "D"), side="right") - 1
+        if start < 0:
+            returns[label] = np.full(len(tickers), np.nan)
+            continue
+        paid = cumulative_dividends[:, -1] - cumulative_dividends[:, start]
+        returns[label] = (price + paid) / closes[:, start] - 1
+
+    year = closes[:, -TRADING_DAYS:]
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        daily = np.diff(np.log(year), axis=1)
+        volatility = np.nanstd(daily, axis=1) * np.sqrt(TRADING_DAYS)
+        volatility[np.sum(~np.isnan(daily), axis=1) < 20] = np.nan
+        drawdown = np.nanmin(year / np.fmax.accumulate(year, axis=1) - 1, axis=1)
+
+        averages = {}
+        for window in MOVING_AVERAGES:
+            recent = closes[:, -window:]
+            average = np.nanmean(recent, axis=1)
+            average[np.sum(~np.isnan(recent), axis=1) < window] = np.nan
+            averages[window] = average
+        distance = price / averages[200] - 1
+
+    return {
+        "tickers": tickers,
+        "data": str(dates[-1]),
+        "preco": price,
+        "retornos": returns,
+        "volatilidade": volatility,
+        "queda_maxima": drawdown,
+        "medias": averages,
+        "distancia_mm200": distance,
+    }
+
+
+def _pct(value):
+    return "N/A" if np.isnan(value) else f"{value * 100:+.1f}%".replace(".", ",")
+
+
+def _money(value):
+    return "N/A" if np.isnan(value) else f"R$ {value:.2f}".replace(".", ",")
+
+
+def format_performance_markdown(performance):
+    """
+    Tabela Markdown dos indicadores para o prompt de análise.
+    """
+    if not performance or not performance["tickers"]:
+        return ""
+    header = ["Ticker", "Preço"] + [f"Ret. {label}" for label, _ in HORIZONS]
+    header += ["Vol. 12m", "Queda máx. 12m"] + [f"MM{w}" for w in MOVING_AVERAGES] + ["Preço x MM200"]
+    lines = [
+        f"### INDICADORES DE DESEMPENHO (histórico local até {performance['data']}, gerado em {datetime.now():%Y-%m-%d})",
+        "Retornos totais (preço + proventos) já calculados a partir do histórico diário; "
+        "use-os diretamente no desempenho de 12 meses, 3 e 5 anos.",
+        "",
+        "| " + " | ".join(header) + " |",
+        "|" + "---|" * len(header),
+    ]
+    for i, ticker in enumerate(performance["tickers"]):
+        cells = [ticker.removesuffix(".SA"), _money(performance["preco"][i])]
+        cells += [_pct(performance["retornos"][label][i]) for label, _ in HORIZONS]
+        cells += [_pct(performance["volatilidade"][i]).lstrip("+"), _pct(performance["queda_maxima"][i])]
+        cells += [_money(performance["medias"][w][i]) for w in MOVING_AVERAGES]
+        cells.append(_pct(performance["distancia_mm200"][i]))
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def build_performance_block(acoes_interesse, market_tools=None):
+    """
+    Atualiza o histórico local dos tickers do perfil e devolve a tabela de desempenho.
+    `market_tools` pode trazer seu próprio armazenamento (`history_store`), como os backends falsos.
+    """
+    from historico_precos import history_store_for
+    from pre_carregamento import parse_tickers
+
+    histories = history_store_for(market_tools).get_many(parse_tickers(acoes_interesse))
+    if not histories:
+        return ""
+    return format_performance_markdown(compute_performance(histories))
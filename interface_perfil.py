@@ -1,12 +1,48 @@
+import contextlib
+import queue
+import threading
+import time
 import tkinter as tk
-from tkinter import messagebox, scrolledtext
-from datetime import datetime
+from tkinter import messagebox, scrolledtext, ttk
 
+# Pausa na digitação dos tickers antes de disparar o pré-carregamento especulativo.
+TICKER_DEBOUNCE_MS = 800
+# Intervalo em que o painel de progresso aplica os eventos recebidos da thread do relatório.
+PROGRESS_POLL_MS = 100
+# Tamanho esperado da análise inicial (em tokens) enquanto ela ainda não terminou; o refinador
+# reescreve o rascunho de forma mais concisa, com cerca de REFINED_TO_DRAFT_RATIO do tamanho dele.
+EXPECTED_ANALYSIS_TOKENS = 3500
+REFINED_TO_DRAFT_RATIO = 0.8
+# Espera máxima pelo pré-carregamento após o envio; o que não terminar é buscado pelo pipeline.
+PREFETCH_WAIT_SECONDS = 30
 
-def run_profile_app():
+ANALYSIS_STREAM = "stream:finance_agent"
+REFINER_STREAM = "stream:report_refiner_agent"
+
+STAGE_LABELS = {
+    "aguardando_pre_carregamento": "Concluindo o pré-carregamento dos dados de mercado",
+    "projecao_objetivos": "Simulando os objetivos (Monte Carlo)",
+    "renda_passiva": "Projetando a renda passiva",
+    "relatorio_incremental": "Comparando com o último relatório",
+    "pre_carregamento": "Pré-carregando os dados de mercado",
+    "indicadores_desempenho": "Calculando os indicadores de desempenho",
+    "comparativo_setorial": "Montando a tabela comparativa setorial",
+    "metricas_proventos": "Calculando as métricas de proventos",
+    "otimizacao_carteira": "Otimizando a alocação mensal",
+    "analises_por_ticker": "Analisando cada ação em paralelo",
+    ANALYSIS_STREAM: "Escrevendo a análise inicial",
+    REFINER_STREAM: "Refinando o relatório final",
+    "export_to_pdf": "Gerando o PDF",
+}
+
+
+def run_profile_app(on_tickers_change=None, on_submit=None):
     """
     Cria e executa a interface gráfica para coletar os dados do perfil do investidor.
     Retorna um dicionário com os dados coletados ou None se a janela for fechada.
+    `on_tickers_change(texto)` é chamado quando o campo de ações perde o foco ou após uma
+    pausa na digitação. Com `on_submit(profile_data, root, form_frame)`, a janela continua
+    aberta após o envio e a função só retorna quando ela for fechada.
     """
     profile_data = {}
 
@@ -54,6 +90,9 @@ def run_profile_app():
                 )
                 return
 
+            if on_submit is not None:
+                on_submit(profile_data, root, main_frame)
+                return
             root.destroy()  
         except ValueError:
             messagebox.showerror(
@@ -226,6 +265,24 @@ def run_profile_app():
     )
     row_idx += 1
 
+    if on_tickers_change is not None:
+        # Os dados de mercado começam a ser buscados enquanto o restante do formulário é preenchido.
+        pending_change = None
+
+        def tickers_changed(event=None):
+            nonlocal pending_change
+            if pending_change is not None:
+                root.after_cancel(pending_change)
+            pending_change = root.after(
+                TICKER_DEBOUNCE_MS, lambda: on_tickers_change(entry_acoes_interesse.get("1.0", tk.END))
+            )
+
+        entry_acoes_interesse.bind("<KeyRelease>", tickers_changed)
+        entry_acoes_interesse.bind(
+            "<FocusOut>", lambda event: on_tickers_change(entry_acoes_interesse.get("1.0", tk.END))
+        )
+        on_tickers_change(entry_acoes_interesse.get("1.0", tk.END))
+
     tk.Label(
         second_frame,
         text="Setores de Interesse (Ex: Energia, Bancos):",
@@ -283,6 +340,256 @@ def run_profile_app():
     return profile_data
 
 
+class ProgressEstimate:
+    """
+    Acompanha os eventos do rastreamento de um relatório: etapa atual, tokens gerados, vazão
+    dos streams e tempo restante estimado pelos tokens que ainda faltam na análise e no refinamento.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self.started = clock()
+        self.stage = "Preparando o relatório"
+        self.tokens = 0
+        self.stream = None
+        self.stream_tokens = 0
+        self._stream_started = None
+        self._stream_seconds = 0.0
+        self.finished_streams = {}
+
+    def update(self, phase, event):
+        from limitador_cota import estimate_tokens
+
+        name = event["nome"]
+        if phase == "inicio":
+            if name in STAGE_LABELS:
+                self.stage = STAGE_LABELS[name]
+            elif name.startswith("stream:secao_"):
+                self.stage = f"Escrevendo a seção '{name.removeprefix('stream:secao_')}'"
+            if event["categoria"] == "stream":
+                self.stream, self.stream_tokens, self._stream_started = name, 0, self._clock()
+        elif phase == "progresso" and name == self.stream:
+            tokens = estimate_tokens(event["atributos"].get("trecho", ""))
+            self.tokens += tokens
+            self.stream_tokens += tokens
+        elif phase == "fim" and name == self.stream:
+            self.finished_streams[name] = self.stream_tokens
+            self._stream_seconds += self._clock() - self._stream_started
+            self.stream = None
+
+    def elapsed(self):
+        return self._clock() - self.started
+
+    def tokens_per_second(self):
+        seconds = self._stream_seconds + (self._clock() - self._stream_started if self.stream else 0.0)
+        return self.tokens / seconds if self.tokens and seconds > 0 else None
+
+    def remaining_tokens(self):
+        """
+        Tokens que ainda faltam nos streams do pipeline, ou None fora do fluxo análise -> refinamento.
+        """
+        streams = set(self.finished_streams) | ({self.stream} if self.stream else set())
+        if streams - {ANALYSIS_STREAM, REFINER_STREAM}:
+            return None
+        if REFINER_STREAM in self.finished_streams:
+            return 0
+        draft = self.finished_streams.get(ANALYSIS_STREAM)
+        if draft is None:
+            written = self.stream_tokens if self.stream == ANALYSIS_STREAM else 0
+            draft = max(EXPECTED_ANALYSIS_TOKENS, written)
+            remaining_draft = draft - written
+        else:
+            remaining_draft = 0
+        refined = self.stream_tokens if self.stream == REFINER_STREAM else 0
+        return remaining_draft + max(0, int(draft * REFINED_TO_DRAFT_RATIO) - refined)
+
+    def eta_seconds(self):
+        rate, remaining = self.tokens_per_second(), self.remaining_tokens()
+        if remaining == 0:
+            return 0.0
+        if rate is None or remaining is None:
+            return None
+        return remaining / rate
+
+    def fraction(self):
+        remaining = self.remaining_tokens()
+        if remaining is None or not self.tokens:
+            return None
+        return self.tokens / (self.tokens + remaining)
+
+
+def _format_seconds(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes} min {seconds:02d} s" if minutes else f"{seconds} s"
+
+
+class ReportProgressPanel:
+    """
+    Painel exibido no lugar do formulário após o envio: etapa atual, tokens gerados, tempo
+    restante estimado e a prévia do texto à medida que os agentes o escrevem. A thread do
+    relatório só coloca eventos em uma fila; os widgets são atualizados na thread da interface.
+    """
+
+    def __init__(self, root, filename):
+        self.root = root
+        self.filename = filename
+        self.events = queue.Queue()
+        self.estimate = ProgressEstimate()
+        self.done = False
+
+        frame = tk.Frame(root, padx=10, pady=10)
+        frame.pack(fill=tk.BOTH, expand=1)
+        tk.Label(frame, text="Gerando o Relatório Financeiro", font=("Helvetica", 12, "bold")).pack(anchor="w")
+
+        label_font = ("Helvetica", 10, "bold")
+        self.stage_var = tk.StringVar(value=self.estimate.stage)
+        self.tokens_var = tk.StringVar(value="Tokens gerados: 0")
+        self.eta_var = tk.StringVar(value="Tempo restante estimado: calculando...")
+        for var in (self.stage_var, self.tokens_var, self.eta_var):
+            tk.Label(frame, textvariable=var, font=label_font, anchor="w").pack(fill=tk.X, pady=2)
+
+        self.progress = ttk.Progressbar(frame, mode="indeterminate", maximum=100)
+        self.progress.pack(fill=tk.X, pady=5)
+        self.progress.start(15)
+
+        tk.Label(frame, text="Prévia do relatório:", font=label_font).pack(anchor="w", pady=(10, 2))
+        self.preview = scrolledtext.ScrolledText(frame, wrap=tk.WORD, font=("Helvetica", 10), height=30)
+        self.preview.pack(fill=tk.BOTH, expand=1)
+        self.preview.configure(state=tk.DISABLED)
+
+        self.close_button = tk.Button(frame, text="Fechar", command=root.destroy, state=tk.DISABLED, font=label_font)
+        self.close_button.pack(pady=10)
+        root.after(PROGRESS_POLL_MS, self._poll)
+
+    def listener(self, phase, event):
+        # Chamado na thread do relatório (tracer.listen).
+        self.events.put((phase, event))
+
+    def finish(self, result=None, error=None):
+        self.events.put(("concluido", {"resultado": result, "erro": error}))
+
+    def _append(self, text, replace=False):
+        self.preview.configure(state=tk.NORMAL)
+        if replace:
+            self.preview.delete("1.0", tk.END)
+        self.preview.insert(tk.END, text)
+        self.preview.see(tk.END)
+        self.preview.configure(state=tk.DISABLED)
+
+    def _apply(self, phase, event):
+        if phase == "concluido":
+            self._finished(event["resultado"], event["erro"])
+            return
+        if event["categoria"] == "stream" and phase == "inicio":
+            # O texto refinado substitui o rascunho; as seções do modo incremental se acumulam.
+            replace = event["nome"] == REFINER_STREAM
+            self._append("" if replace or not self.estimate.tokens else "\n\n", replace)
+        self.estimate.update(phase, event)
+        if phase == "progresso" and event["nome"] == self.estimate.stream:
+            self._append(event["atributos"].get("trecho", ""))
+
+    def _finished(self, result, error):
+        self.done = True
+        self.progress.stop()
+        self.progress.configure(mode="determinate", value=100)
+        self.close_button.configure(state=tk.NORMAL)
+        if error is not None:
+            self.stage_var.set("Erro na geração do relatório.")
+            self.eta_var.set(f"Tempo total: {_format_seconds(self.estimate.elapsed())}")
+            messagebox.showerror("Erro", f"Não foi possível gerar o relatório: {error}")
+            return
+        if result is False:
+            self.stage_var.set(f"PDF salvo com a análise sem refinamento: {self.filename}")
+        else:
+            self.stage_var.set(f"Relatório salvo como: {self.filename}")
+        self.eta_var.set(f"Tempo total: {_format_seconds(self.estimate.elapsed())}")
+
+    def _refresh(self):
+        self.stage_var.set(self.estimate.stage + "...")
+        rate = self.estimate.tokens_per_second()
+        self.tokens_var.set(
+            f"Tokens gerados: {self.estimate.tokens}" + (f" ({rate:.0f} tokens/s)" if rate else "")
+        )
+        eta = self.estimate.eta_seconds()
+        self.eta_var.set(
+            "Tempo restante estimado: " + ("calculando..." if eta is None else _format_seconds(eta))
+            + f"  |  Decorrido: {_format_seconds(self.estimate.elapsed())}"
+        )
+        fraction = self.estimate.fraction()
+        if fraction is not None and str(self.progress["mode"]) != "determinate":
+            self.progress.stop()
+            self.progress.configure(mode="determinate")
+        if fraction is not None:
+            self.progress.configure(value=fraction * 100)
+
+    def _poll(self):
+        try:
+            while True:
+                self._apply(*self.events.get_nowait())
+        except queue.Empty:
+            pass
+        if self.done:
+            return
+        self._refresh()
+        self.root.after(PROGRESS_POLL_MS, self._poll)
+
+
+def run_report_app(generate, filename, prefetcher=None):
+    """
+    Formulário e progresso do relatório na mesma janela. Enquanto o formulário é preenchido,
+    os tickers digitados são pré-carregados por `prefetcher` (pre_carregamento.SpeculativePrefetcher);
+    após o envio, `generate(profile_data)` roda fora da thread da interface e o painel de
+    progresso acompanha as etapas pelo rastreamento. Retorna (profile_data, erro), com
+    profile_data vazio se a janela for fechada antes do envio.
+    """
+    from rastreamento import tracer
+
+    outcome = {"erro": None}
+    # O span do formulário termina no envio; a geração do relatório tem seus próprios spans.
+    form_span = contextlib.ExitStack()
+    form_span.enter_context(tracer.span("formulario"))
+
+    def start(profile_data, root, form_frame):
+        form_span.close()
+        form_frame.pack_forget()
+        panel = ReportProgressPanel(root, filename)
+        tracer.instant("formulario:enviado", "etapa", pre_carregando=prefetcher.pending() if prefetcher else 0)
+
+        def work():
+            try:
+                with tracer.listen(panel.listener):
+                    if prefetcher is not None:
+                        prefetcher.schedule(profile_data["acoes_interesse"])
+                        with tracer.span("aguardando_pre_carregamento"):
+                            prefetcher.wait(PREFETCH_WAIT_SECONDS)
+                    result = generate(profile_data)
+            except Exception as e:
+                outcome["erro"] = e
+                panel.finish(error=e)
+            else:
+                panel.finish(result)
+
+        threading.Thread(target=work, name="relatorio", daemon=True).start()
+
+        def close():
+            if not panel.done:
+                if not messagebox.askyesno(
+                    "Relatório em andamento", "O relatório ainda está sendo gerado. Deseja interromper e sair?"
+                ):
+                    return
+                outcome["erro"] = RuntimeError("Geração do relatório interrompida pelo usuário.")
+            root.destroy()
+
+        root.protocol("WM_DELETE_WINDOW", close)
+
+    try:
+        profile_data = run_profile_app(prefetcher.schedule if prefetcher else None, start)
+    finally:
+        form_span.close()
+        if prefetcher is not None:
+            prefetcher.close()
+    return profile_data, outcome["erro"]
+
 if __name__ == "__main__":
     dados = run_profile_app()
     if dados:
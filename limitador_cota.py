@@ -0,0 +1,308 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+
+from agno.models.google import Gemini
+
+from rastreamento import tracer
+
+# Limites padrão do nível gratuito: (requisições por minuto, tokens por minuto).
+DEFAULT_LIMITS = {
+    "gemini-1.5-flash": (15, 1_000_000),
+    "gemini-1.5-flash-8b": (15, 1_000_000),
+    "gemini-1.5-pro": (2, 32_000),
+    "gemini-2.0-flash": (15, 1_000_000),
+}
+FALLBACK_LIMITS = (10, 250_000)
+WINDOW_SECONDS = 60.0
+
+_RETRY_DELAY_PATTERN = re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+def estimate_tokens(text):
+    """
+    Estimativa simples de tokens (~4 caracteres por token), suficiente para o controle de cota.
+    """
+    return max(1, len(text or "") // 4)
+
+
+def is_quota_error(error):
+    """
+    Indica se a exceção corresponde a um estouro de cota da API do Gemini. O agno converte o
+    ClientError do google-genai em ModelProviderError(status_code=429), com o original em __cause__.
+    """
+    if getattr(error, "status_code", None) == 429:
+        return True
+    cause = error.__cause__
+    if getattr(cause, "code", None) == 429 or getattr(cause, "status", None) == "RESOURCE_EXHAUSTED":
+        return True
+    message = str(error)
+    return "RESOURCE_EXHAUSTED" in message or message.startswith("429")
+
+
+def _retry_delay(error):
+    """
+    retryDelay sugerido pela API, em segundos, na mensagem ou nos detalhes do erro original.
+    """
+    for source in (error, error.__cause__):
+        if source is None:
+            continue
+        match = _RETRY_DELAY_PATTERN.search(str(getattr(source, "details", None) or source))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def _limits_from_env():
+    """
+    Permite sobrescrever os limites via GEMINI_RPM / GEMINI_TPM (valem para todos os modelos).
+    """
+    rpm = os.getenv("GEMINI_RPM")
+    tpm = os.getenv("GEMINI_TPM")
+    if not rpm and not tpm:
+        return {}
+    return {
+        model_id: (int(rpm) if rpm else limits[0], int(tpm) if tpm else limits[1])
+        for model_id, limits in list(DEFAULT_LIMITS.items()) + [("*", FALLBACK_LIMITS)]
+    }
+
+
+class QuotaLimiter:
+    """
+    Janela deslizante de 60 segundos por modelo, contando requisições e tokens.
+    `acquire` só bloqueia pelo tempo estritamente necessário para respeitar a cota.
+    """
+
+    def __init__(self, limits=None, window=WINDOW_SECONDS, clock=time.monotonic, sleep=time.sleep):
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(_limits_from_env())
+        self.limits.update(limits or {})
+        self.window = window
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._events = {}  # model_id -> deque de [instante, requisições, tokens]
+
+    def _limits_for(self, model_id):
+        return self.limits.get(model_id) or self.limits.get("*", FALLBACK_LIMITS)
+
+    def _window_events(self, model_id, now):
+        events = self._events.setdefault(model_id, deque())
+        while events and events[0][0] <= now - self.window:
+            events.popleft()
+        return events
+
+    def _required_delay(self, events, tokens, rpm, tpm, now):
+        delay = 0.0
+
+        request_times = [ts for ts, requests, _ in events if requests]
+        if len(request_times) >= rpm:
+            oldest_blocking = request_times[len(request_times) - rpm]
+            delay = max(delay, oldest_blocking + self.window - now)
+
+        used_tokens = sum(ev_tokens for _, _, ev_tokens in events)
+        excess = used_tokens + min(tokens, tpm) - tpm
+        if excess > 0:
+            freed = 0
+            for ts, _, ev_tokens in events:
+                freed += ev_tokens
+                if freed >= excess:
+                    delay = max(delay, ts + self.window - now)
+                    break
+
+        return delay
+
+    def _try_acquire(self, model_id, tokens):
+        """
+        Registra a requisição se a cota permitir e retorna 0; senão, retorna a espera necessária.
+        """
+        rpm, tpm = self._limits_for(model_id)
+        with self._lock:
+            now = self._clock()
+            events = self._window_events(model_id, now)
+            delay = self._required_delay(events, tokens, rpm, tpm, now)
+            if delay <= 0:
+                events.append([now, 1, tokens])
+                return 0.0
+            return delay
+
+    def acquire(self, model_id, tokens=0):
+        """
+        Reserva uma requisição com `tokens` estimados, aguardando apenas o necessário.
+        Retorna o tempo total de espera em segundos.
+        """
+        waited = 0.0
+        while True:
+            delay = self._try_acquire(model_id, tokens)
+            if delay <= 0:
+                return waited
+            with tracer.span("cota:espera", "cota", modelo=model_id, espera_s=round(delay, 2)):
+                self._sleep(delay)
+            waited += delay
+
+    async def acquire_async(self, model_id, tokens=0):
+        """
+        Versão de `acquire` para o event loop: a espera libera o loop para os demais relatórios.
+        """
+        waited = 0.0
+        while True:
+            delay = self._try_acquire(model_id, tokens)
+            if delay <= 0:
+                return waited
+            with tracer.span("cota:espera", "cota", modelo=model_id, espera_s=round(delay, 2)):
+                await asyncio.sleep(delay)
+            waited += delay
+
+    def utilization(self, model_id):
+        """
+        Fração da cota (requisições, tokens) usada na janela atual do modelo.
+        """
+        rpm, tpm = self._limits_for(model_id)
+        with self._lock:
+            events = self._window_events(model_id, self._clock())
+            requests = sum(ev_requests for _, ev_requests, _ in events)
+            tokens = sum(ev_tokens for _, _, ev_tokens in events)
+        return requests / rpm, tokens / tpm
+
+    def record_usage(self, model_id, tokens):
+        """
+        Contabiliza tokens adicionais (ex.: tokens de saída) na janela do modelo.
+        """
+        if tokens <= 0:
+            return
+        with self._lock:
+            now = self._clock()
+            self._window_events(model_id, now).append([now, 0, tokens])
+
+
+# Limitador compartilhado por todos os agentes do processo.
+shared_limiter = QuotaLimiter()
+
+
+def _backoff_delay(attempt, error, base_delay, max_delay):
+    """
+    Backoff exponencial com "full jitter", respeitando o retryDelay sugerido pela API.
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * (2**attempt)))
+    retry_delay = _retry_delay(error)
+    if retry_delay is not None:
+        delay = max(delay, retry_delay + random.uniform(0, 1))
+    return delay
+
+
+def run_with_quota_retry(func, max_retries=5, base_delay=2.0, max_delay=60.0, on_retry=None, sleep=time.sleep):
+    """
+    Executa `func`, repetindo com backoff exponencial e jitter quando a cota é excedida.
+    Outros erros (ou o esgotamento das tentativas) são propagados.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if not is_quota_error(e) or attempt >= max_retries:
+                raise
+            delay = _backoff_delay(attempt, e, base_delay, max_delay)
+            attempt += 1
+            if on_retry:
+                on_retry(attempt, delay, e)
+            sleep(delay)
+
+
+async def run_with_quota_retry_async(func, max_retries=5, base_delay=2.0, max_delay=60.0, on_retry=None):
+    """
+    Versão assíncrona de `run_with_quota_retry`: `func` é uma função que retorna uma corrotina.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await func()
+        except Exception as e:
+            if not is_quota_error(e) or attempt >= max_retries:
+                raise
+            delay = _backoff_delay(attempt, e, base_delay, max_delay)
+            attempt += 1
+            if on_retry:
+                on_retry(attempt, delay, e)
+            await asyncio.sleep(delay)
+
+
+def _messages_tokens(args, kwargs):
+    messages = kwargs.get("messages", args[0] if args else None) or []
+    return sum(estimate_tokens(str(getattr(m, "content", "") or "")) for m in messages)
+
+
+def _output_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "candidates_token_count", None) or 0
+
+
+def _log_retry(attempt, delay, error):
+    tracer.instant("cota:nova_tentativa", "cota", tentativa=attempt, espera_s=round(delay, 2), erro=str(error)[:200])
+    print(f"\nCota da API do Gemini excedida (tentativa {attempt}). Nova tentativa em {delay:.1f}s...")
+
+
+class QuotaAwareGemini(Gemini):
+    """
+    Modelo Gemini que passa cada chamada (inclusive as rodadas de ferramentas) pelo
+    limitador compartilhado e repete erros de cota sem descartar o trabalho do agente.
+    """
+
+    def invoke(self, *args, **kwargs):
+        def attempt():
+            shared_limiter.acquire(self.id, _messages_tokens(args, kwargs))
+            return super(QuotaAwareGemini, self).invoke(*args, **kwargs)
+
+        response = run_with_quota_retry(attempt, on_retry=_log_retry)
+        shared_limiter.record_usage(self.id, _output_tokens(response))
+        return response
+
+    def invoke_stream(self, *args, **kwargs):
+        # O erro de cota chega na abertura do stream; por isso só a primeira
+        # resposta é protegida pelo retry, sem repetir conteúdo já emitido.
+        def open_stream():
+            shared_limiter.acquire(self.id, _messages_tokens(args, kwargs))
+            stream = iter(super(QuotaAwareGemini, self).invoke_stream(*args, **kwargs))
+            return stream, next(stream, None)
+
+        stream, first = run_with_quota_retry(open_stream, on_retry=_log_retry)
+        if first is None:
+            return
+        last = first
+        yield first
+        for response in stream:
+            last = response
+            yield response
+        shared_limiter.record_usage(self.id, _output_tokens(last))
+
+    async def ainvoke(self, *args, **kwargs):
+        async def attempt():
+            await shared_limiter.acquire_async(self.id, _messages_tokens(args, kwargs))
+            return await super(QuotaAwareGemini, self).ainvoke(*args, **kwargs)
+
+        response = await run_with_quota_retry_async(attempt, on_retry=_log_retry)
+        shared_limiter.record_usage(self.id, _output_tokens(response))
+        return response
+
+    async def ainvoke_stream(self, *args, **kwargs):
+        async def open_stream():
+            await shared_limiter.acquire_async(self.id, _messages_tokens(args, kwargs))
+            stream = super(QuotaAwareGemini, self).ainvoke_stream(*args, **kwargs).__aiter__()
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, None
+
+        stream, first = await run_with_quota_retry_async(open_stream, on_retry=_log_retry)
+        if first is None:
+            return
+        last = first
+        yield first
+        async for response in stream:
+            last = response
+            yield response
+        shared_limiter.record_usage(self.id, _output_tokens(last))
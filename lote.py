@@ -0,0 +1,264 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from checkpoints import open_run
+from rastreamento import export_trace
+
+# Mesmas chaves produzidas por submit_profile() em interface_perfil.py.
+PROFILE_FIELDS = [
+    "nome",
+    "renda_mensal",
+    "gastos_fixos",
+    "reservas_emergencia",
+    "tolerancia_risco",
+    "nivel_conhecimento",
+    "obj_curto",
+    "prazo_curto_meses",
+    "obj_medio",
+    "prazo_medio_anos",
+    "obj_longo",
+    "acoes_interesse",
+    "setores_interesse",
+    "pref_renda",
+    "outras_consideracoes",
+]
+MONETARY_FIELDS = ["renda_mensal", "gastos_fixos", "reservas_emergencia"]
+
+MANIFEST_NAME = "manifesto.json"
+
+
+def normalize_profile(record):
+    """
+    Converte um registro lido do arquivo para o formato de run_profile_app(),
+    aplicando as mesmas validações do formulário.
+    """
+    profile_data = {}
+    for field in PROFILE_FIELDS:
+        value = record.get(field)
+        if field in MONETARY_FIELDS:
+            if isinstance(value, (int, float)):
+                profile_data[field] = float(value)
+            else:
+                try:
+                    profile_data[field] = float(str(value or "0").replace(",", ".").strip())
+                except ValueError:
+                    raise ValueError(f"Valor monetário inválido em '{field}': {value!r}")
+        else:
+            profile_data[field] = "" if value is None else str(value).strip()
+
+    if not profile_data["nome"]:
+        raise ValueError("O campo 'nome' é obrigatório.")
+    if not profile_data["obj_longo"]:
+        raise ValueError("O campo 'obj_longo' é obrigatório.")
+    return profile_data
+
+
+def load_profiles(path):
+    """
+    Lê os perfis de um arquivo JSONL (um objeto por linha) ou CSV (com cabeçalho).
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            return list(csv.DictReader(f))
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _slug(text):
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_") or "perfil"
+
+
+def job_id(filename):
+    """
+    Identificador do job no lote (ex.: "0003_Maria_Silva"), a partir do nome do PDF.
+    """
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+_worker_state = threading.local()
+
+
+def _worker_agents(agent_module):
+    """
+    Cada thread do pool usa seus próprios agentes, pois o Agent guarda estado da execução.
+    """
+    if not hasattr(_worker_state, "agents"):
+        _worker_state.agents = (
+            agent_module.create_finance_agent(),
+            agent_module.create_report_refiner_agent(),
+        )
+    return _worker_state.agents
+
+
+def _process_profile(
+    agent_module, index, record, output_dir, use_response_cache, compact, map_reduce, incremental=False
+):
+    entry = {"indice": index, "nome": record.get("nome"), "pdf": None, "status": "erro", "erro": None}
+    start = time.perf_counter()
+    try:
+        profile_data = normalize_profile(record)
+        filename = os.path.join(output_dir, f"{index:04d}_{_slug(profile_data['nome'])}.pdf")
+        if incremental:
+            from regeneracao_incremental import generate_incremental_report
+
+            result = generate_incremental_report(
+                profile_data, filename, use_response_cache=use_response_cache, investor_id=record.get("id")
+            )
+            entry["secoes_refeitas"] = result["regeneradas"]
+            entry["pdf"] = filename
+            entry["status"] = "incompleto" if result["falharam"] else "ok"
+        else:
+            analysis_agent, refiner_agent = _worker_agents(agent_module)
+            # O nome do PDF identifica o job: perfis repetidos no lote não dividem a mesma pasta de execução.
+            checkpoint = open_run(profile_data, filename, job=job_id(filename))
+            entry["execucao"] = checkpoint.id if checkpoint else None
+            refinado = agent_module.generate_report(
+                profile_data,
+                filename,
+                analysis_agent,
+                refiner_agent,
+                use_response_cache,
+                compact,
+                map_reduce=map_reduce,
+                checkpoint=checkpoint,
+            )
+            entry["pdf"] = filename
+            entry["status"] = "ok" if refinado else "sem_refinamento"
+    except Exception as e:
+        entry["erro"] = str(e)
+    entry["duracao_s"] = round(time.perf_counter() - start, 2)
+    return entry
+
+
+def run_batch(
+    input_path, output_dir, workers=2, use_response_cache=True, compact=None, map_reduce=None, incremental=False
+):
+    """
+    Gera um PDF por perfil do arquivo de entrada usando um pool de `workers` threads
+    e grava o manifesto com o resultado de cada perfil. Retorna a lista de entradas.
+    Com `incremental=True`, cada perfil reaproveita as seções do último relatório do mesmo investidor.
+    """
+    import agent as agent_module
+
+    records = load_profiles(input_path)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"--- PROCESSANDO {len(records)} PERFIS EM LOTE ({workers} workers) ---")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        entries = list(
+            executor.map(
+                lambda item: _process_profile(
+                    agent_module, item[0], item[1], output_dir, use_response_cache, compact, map_reduce, incremental
+                ),
+                enumerate(records, start=1),
+            )
+        )
+
+    write_manifest(input_path, output_dir, entries)
+    return entries
+
+
+def write_manifest(input_path, output_dir, entries):
+    """
+    Grava `manifesto.json` com o resultado de cada perfil do lote.
+    """
+    manifest = {
+        "entrada": os.path.abspath(input_path),
+        "gerado_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "total": len(entries),
+        "sucesso": sum(1 for e in entries if e["status"] != "erro"),
+        "relatorios": entries,
+    }
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"Manifesto salvo como: {manifest_path}")
+    return manifest_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Gera relatórios financeiros em lote, sem interface gráfica."
+    )
+    parser.add_argument("entrada", help="Arquivo de perfis (.jsonl ou .csv)")
+    parser.add_argument(
+        "-o", "--output-dir", default="relatorios", help="Pasta de saída dos PDFs e do manifesto"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=2, help="Quantidade de perfis processados em paralelo"
+    )
+    parser.add_argument(
+        "--assincrono",
+        action="store_true",
+        help="Processa os perfis em um único event loop (asyncio), com o PDF gerado em processos separados",
+    )
+    parser.add_argument(
+        "--pdf-workers",
+        type=int,
+        default=None,
+        help="Processos para gerar os PDFs no modo assíncrono (padrão: número de CPUs)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignora as respostas dos agentes armazenadas em cache",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Usa prompts compactos (sem trechos repetidos das instruções e com o rascunho enxugado)",
+    )
+    parser.add_argument(
+        "--por-ticker",
+        action="store_true",
+        help="Analisa cada ação separadamente; perfis com as mesmas ações reaproveitam as análises do dia",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Refaz apenas as seções do último relatório de cada investidor afetadas pelas mudanças no perfil",
+    )
+    args = parser.parse_args(argv)
+    if args.incremental and args.assincrono:
+        parser.error("--incremental não pode ser combinado com --assincrono")
+
+    if args.assincrono:
+        import asyncio
+
+        from execucao_assincrona import run_batch_async
+
+        entries = asyncio.run(
+            run_batch_async(
+                args.entrada,
+                args.output_dir,
+                max(1, args.workers),
+                args.pdf_workers,
+                not args.no_cache,
+                args.compact or None,
+                map_reduce=args.por_ticker or None,
+            )
+        )
+    else:
+        entries = run_batch(
+            args.entrada,
+            args.output_dir,
+            max(1, args.workers),
+            not args.no_cache,
+            args.compact or None,
+            args.por_ticker or None,
+            args.incremental,
+        )
+    export_trace()
+    return 0 if all(e["status"] != "erro" for e in entries) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import os
+import re
+
+from limitador_cota import estimate_tokens
+
+# Orçamento de tokens por etapa (instruções do agente + prompt), ajustável pelo .env.
+STAGE_BUDGETS = {
+    "analise": int(os.getenv("PROMPT_BUDGET_ANALISE", "24000")),
+    "refinamento": int(os.getenv("PROMPT_BUDGET_REFINAMENTO", "16000")),
+    "ticker": int(os.getenv("PROMPT_BUDGET_TICKER", "8000")),
+    "secao": int(os.getenv("PROMPT_BUDGET_SECAO", "12000")),
+}
+
+# Linhas mais curtas que isso não são consideradas duplicatas (títulos, marcadores, separadores).
+_MIN_DUPLICATE_CHARS = 40
+_TRIM_MARKER = "[...]"
+
+_HEADING = re.compile(r"^#{1,6}\s")
+_BULLET_PREFIX = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+_DISCLAIMER_HEADING = re.compile(r"^#{1,6}\s.*(aviso legal|divulga[çc][ãa]o de riscos)", re.IGNORECASE)
+_HORIZONTAL_RULE = re.compile(r"^\s*(?:-{3,}|\*{3,}|_{3,})\s*$")
+
+
+class PromptBudgetExceeded(RuntimeError):
+    """
+    As partes fixas do prompt ultrapassam o orçamento da etapa mesmo após os cortes.
+    """
+
+
+def compact_mode_requested():
+    """
+    PROMPT_COMPACT=1 ativa o modo compacto sem alterar a linha de comando.
+    """
+    return os.getenv("PROMPT_COMPACT", "").lower() in ("1", "true", "sim", "yes")
+
+
+def _normalize_line(line):
+    return " ".join(_BULLET_PREFIX.sub("", line).split()).lower()
+
+
+def deduplicate_lines(text, reference):
+    """
+    Remove do texto as linhas longas que já aparecem (ignorando marcadores, espaços e
+    maiúsculas) em `reference`, como os trechos repetidos das instruções do agente.
+    """
+    known = {_normalize_line(line) for line in reference.splitlines()}
+    kept = []
+    for line in text.splitlines():
+        normalized = _normalize_line(line)
+        if len(normalized) >= _MIN_DUPLICATE_CHARS and normalized in known:
+            continue
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def compact_draft(text):
+    """
+    Enxuga o rascunho enviado ao refinador: remove a seção de aviso legal (o refinador a
+    reescreve), separadores, parágrafos repetidos e linhas em branco consecutivas.
+    """
+    kept = []
+    seen = set()
+    skipping_level = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if _HEADING.match(stripped):
+            level = len(stripped) - len(stripped.lstrip("#"))
+            if skipping_level is not None and level <= skipping_level:
+                skipping_level = None
+            if _DISCLAIMER_HEADING.match(stripped):
+                skipping_level = level
+        if skipping_level is not None or _HORIZONTAL_RULE.match(stripped):
+            continue
+        if not stripped:
+            if kept and kept[-1]:
+                kept.append("")
+            continue
+        # Tabelas e títulos se repetem de propósito; apenas parágrafos longos são deduplicados.
+        if len(stripped) >= _MIN_DUPLICATE_CHARS and not stripped.startswith("|"):
+            if stripped in seen:
+                continue
+            seen.add(stripped)
+        kept.append(line.rstrip())
+    return "\n".join(kept).strip() + "\n"
+
+
+def _trim_sections(sections, ratio):
+    trimmed = []
+    for section in sections:
+        lines = list(section)
+        if lines and _HEADING.match(lines[0].strip()):
+            trimmed.append(lines.pop(0))
+        allowance = int(sum(len(line) + 1 for line in lines) * ratio)
+        used = 0
+        for line in lines:
+            if used + len(line) + 1 > allowance:
+                trimmed.append(_TRIM_MARKER)
+                break
+            trimmed.append(line)
+            used += len(line) + 1
+    return trimmed
+
+
+def trim_to_tokens(text, max_tokens):
+    """
+    Reduz o texto a no máximo ~`max_tokens`: cada seção Markdown mantém o título e o início do
+    seu conteúdo, na proporção do seu tamanho original. Se nem os títulos couberem, os últimos
+    são descartados.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    sections = [[]]
+    for line in text.splitlines():
+        if _HEADING.match(line.strip()) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+
+    headings_chars = sum(len(s[0]) + 1 for s in sections if _HEADING.match(s[0].strip()))
+    body_chars = max(1, len(text) - headings_chars)
+    ratio = max(0.0, (max_tokens * 4 - headings_chars) / body_chars)
+    # Marcadores de corte e arredondamentos podem passar do limite: a proporção diminui até caber.
+    while True:
+        lines = _trim_sections(sections, ratio)
+        if ratio == 0.0 or estimate_tokens("\n".join(lines) + "\n") <= max_tokens:
+            break
+        ratio = ratio * 0.8 if ratio > 0.01 else 0.0
+    while lines and estimate_tokens("\n".join(lines) + "\n") > max_tokens:
+        lines.pop()
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+class PromptBudget:
+    """
+    Monta o prompt de uma etapa a partir de seções nomeadas, contando os tokens de cada uma.
+    Seções com `trimmable=True` podem ser reduzidas por `enforce()` para caber no orçamento;
+    seções com `in_prompt=False` (ex.: instruções do agente) só entram na contagem.
+    """
+
+    def __init__(self, stage, budget=None):
+        self.stage = stage
+        self.budget = budget if budget is not None else STAGE_BUDGETS[stage]
+        self.sections = []
+
+    def add(self, name, text, trimmable=False, in_prompt=True):
+        self.sections.append({"nome": name, "texto": text, "cortavel": trimmable, "no_prompt": in_prompt})
+
+    def tokens(self):
+        return {s["nome"]: estimate_tokens(s["texto"]) if s["texto"] else 0 for s in self.sections}
+
+    def total_tokens(self):
+        return sum(self.tokens().values())
+
+    def enforce(self):
+        """
+        Corta as seções reduzíveis (a maior primeiro) até o total caber no orçamento ou não
+        restar o que cortar. Levanta PromptBudgetExceeded se nem assim for possível.
+        """
+        exhausted = set()
+        while True:
+            excess = self.total_tokens() - self.budget
+            if excess <= 0:
+                return
+            candidates = [
+                i for i, s in enumerate(self.sections) if s["cortavel"] and s["texto"] and i not in exhausted
+            ]
+            if not candidates:
+                raise PromptBudgetExceeded(
+                    f"Prompt da etapa '{self.stage}' excede o orçamento em ~{excess} tokens. {self.summary()}"
+                )
+            index = max(candidates, key=lambda i: estimate_tokens(self.sections[i]["texto"]))
+            section = self.sections[index]
+            current = estimate_tokens(section["texto"])
+            trimmed = trim_to_tokens(section["texto"], max(0, current - excess))
+            if trimmed == section["texto"]:
+                exhausted.add(index)
+            section["texto"] = trimmed
+
+    def summary(self):
+        parts = ", ".join(f"{name} {count}" for name, count in self.tokens().items())
+        return f"Orçamento do prompt ({self.stage}): {self.total_tokens()} / {self.budget} tokens [{parts}]"
+
+    def render(self):
+        return "".join(s["texto"] for s in self.sections if s["no_prompt"])
@@ -0,0 +1,318 @@
+import math
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+from projecao_objetivos import ASSET_CLASSES, ASSET_LABELS, CORRELATION
+
+# Reserva de emergência alvo, em meses de gastos fixos.
+RESERVE_MONTHS = {"Conservadora": 12, "Moderada": 6, "Agressiva": 6}
+# Com a reserva incompleta: parcela mínima da economia mensal destinada a ela e prazo para completá-la.
+RESERVE_MIN_SHARE = {"Conservadora": 0.6, "Moderada": 0.4, "Agressiva": 0.3}
+RESERVE_FILL_MONTHS = 12
+
+# Média-variância entre as classes (premissas de projecao_objetivos): aversão a risco e
+# limites (mínimo, máximo) de cada classe na parcela investida, por tolerância a risco.
+# As aversões deixam o ótimo próximo de LONG_TERM_ALLOCATION, usado na simulação dos objetivos.
+RISK_AVERSION = {"Conservadora": 2.0, "Moderada": 0.75, "Agressiva": 0.4}
+CLASS_BOUNDS = {
+    "Conservadora": {"renda_fixa": (0.60, 1.0), "fiis": (0.0, 0.25), "acoes": (0.0, 0.15)},
+    "Moderada": {"renda_fixa": (0.30, 0.70), "fiis": (0.10, 0.35), "acoes": (0.10, 0.40)},
+    "Agressiva": {"renda_fixa": (0.10, 0.40), "fiis": (0.10, 0.40), "acoes": (0.30, 0.70)},
+}
+# Peso máximo de um ticker dentro da sua classe (relaxado quando há poucos tickers).
+MAX_TICKER_WEIGHT = {"Conservadora": 0.25, "Moderada": 0.30, "Agressiva": 0.40}
+
+TRADING_DAYS = 252
+# Covariância dos retornos totais diários dos últimos 3 anos; tickers com menos pregões ficam de fora.
+COVARIANCE_DAYS = 3 * TRADING_DAYS
+MIN_OBSERVATIONS = 60
+# Encolhimento da covariância em direção à diagonal: estabiliza a matriz com centenas de ativos.
+SHRINKAGE = 0.2
+
+
+def _tolerance(profile_data):
+    tolerance = profile_data.get("tolerancia_risco", "Moderada")
+    return tolerance if tolerance in CLASS_BOUNDS else "Moderada"
+
+
+def ticker_class(ticker):
+    """
+    "fiis" para fundos imobiliários (setor "FIIs ..." no índice local ou final 11 fora dele),
+    "acoes" para os demais, inclusive units como TAEE11.
+    """
+    from comparacao_setorial import load_sector_index
+
+    base = ticker.upper().removesuffix(".SA")
+    sector = load_sector_index()[1].get(base)
+    if sector is not None:
+        return "fiis" if sector.startswith("FII") else "acoes"
+    return "fiis" if base.endswith("11") else "acoes"
+
+
+def emergency_reserve(profile_data, economia):
+    """
+    Meta da reserva, quanto falta e o aporte mensal destinado a ela antes da parcela investida.
+    """
+    tolerance = _tolerance(profile_data)
+    target = RESERVE_MONTHS[tolerance] * profile_data["gastos_fixos"]
+    shortfall = max(0.0, target - profile_data.get("reservas_emergencia", 0.0))
+    monthly = 0.0
+    if shortfall > 0 and economia > 0:
+        monthly = min(economia, shortfall, max(shortfall / RESERVE_FILL_MONTHS, economia * RESERVE_MIN_SHARE[tolerance]))
+    return {
+        "meta": target,
+        "meses_gastos": RESERVE_MONTHS[tolerance],
+        "atual": profile_data.get("reservas_emergencia", 0.0),
+        "falta": shortfall,
+        "aporte": monthly,
+        "meses_para_completar": math.ceil(shortfall / monthly) if monthly else 0,
+    }
+
+
+def _project_to_box_simplex(v, lower, upper, iterations=60):
+    """
+    Projeção euclidiana de `v` em {soma = 1, lower <= w <= upper}, por bisseção no deslocamento.
+    """
+    low, high = np.min(v - upper), np.max(v - lower)
+    for _ in range(iterations):
+        shift = (low + high) / 2
+        if np.clip(v - shift, lower, upper).sum() > 1:
+            low = shift
+        else:
+            high = shift
+    return np.clip(v - (low + high) / 2, lower, upper)
+
+
+def mean_variance(mu, cov, risk_aversion, lower, upper, iterations=500, tol=1e-12):
+    """
+    Maximiza mu'w - (aversão/2) w'Σw com soma 1 e limites por ativo (gradiente projetado).
+    """
+    lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+    if lower.sum() > 1 + 1e-9 or upper.sum() < 1 - 1e-9:
+        raise ValueError("Limites de alocação incompatíveis com soma 1.")
+    step = 1.0 / (risk_aversion * np.linalg.eigvalsh(cov)[-1])
+    w = _project_to_box_simplex(np.full(len(mu), 1.0 / len(mu)), lower, upper)
+    for _ in range(iterations):
+        new = _project_to_box_simplex(w + step * (mu - risk_aversion * cov @ w), lower, upper)
+        if np.abs(new - w).max() < tol:
+            return new
+        w = new
+    return w
+
+
+def risk_parity(cov, iterations=50, tol=1e-10):
+    """
+    Pesos de contribuição igual ao risco: minimiza 0,5 y'Σy - Σ log(y) pelo método de Newton
+    (uma solução de sistema linear por iteração) e normaliza y para soma 1.
+    """
+    n = len(cov)
+    budget = np.full(n, 1.0 / n)
+    y = budget / np.sqrt(np.diag(cov))
+    for _ in range(iterations):
+        gradient = cov @ y - budget / y
+        if np.abs(gradient * y).max() < tol:
+            break
+        step = np.linalg.solve(cov + np.diag(budget / y**2), gradient)
+        # Passo amortecido para manter todos os pesos positivos.
+        shrink = step > 0
+        t = min(1.0, 0.95 * np.min(y[shrink] / step[shrink])) if shrink.any() else 1.0
+        y = y - t * step
+    return y / y.sum()
+
+
+def capped_risk_parity(cov, max_weight):
+    """
+    Paridade de risco com peso máximo por ativo: os que passam do limite ficam no limite e o
+    restante é redistribuído, em paridade de risco, entre os demais.
+    """
+    n = len(cov)
+    max_weight = max(max_weight, 1.0 / n)
+    capped = np.zeros(n, dtype=bool)
+    weights = np.full(n, max_weight)
+    while not capped.all():
+        free = np.flatnonzero(~capped)
+        weights[free] = risk_parity(cov[np.ix_(free, free)]) * (1.0 - max_weight * capped.sum())
+        over = free[weights[free] > max_weight + 1e-12]
+        if not len(over):
+            break
+        capped[over] = True
+        weights[over] = max_weight
+    return weights
+
+
+def covariance_from_histories(histories):
+    """
+    Covariância anualizada dos retornos totais diários (preço + proventos) dos últimos
+    COVARIANCE_DAYS pregões, com pares calculados sobre os dias em comum, encolhida em
+    direção à diagonal e corrigida para semidefinida positiva.
+    Retorna (tickers com histórico suficiente, matriz, tickers descartados).
+    """
+    from indicadores_desempenho import align_histories
+
+    tickers, dates, closes, dividends = align_histories(histories)
+    closes, dividends = closes[:, -(COVARIANCE_DAYS + 1) :], dividends[:, -(COVARIANCE_DAYS + 1) :]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = np.log((closes[:, 1:] + dividends[:, 1:]) / closes[:, :-1])
+    valid = np.isfinite(returns)
+    enough = valid.sum(axis=1) >= MIN_OBSERVATIONS
+    dropped = [t for t, ok in zip(tickers, enough) if not ok]
+    tickers = [t for t, ok in zip(tickers, enough) if ok]
+    returns, valid = returns[enough], valid[enough].astype(float)
+    if not tickers:
+        return tickers, np.empty((0, 0)), dropped
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        centered = np.where(valid > 0, returns - np.nanmean(returns, axis=1, keepdims=True), 0.0)
+    overlap = valid @ valid.T
+    cov = (centered @ centered.T) / np.maximum(overlap - 1, 1) * TRADING_DAYS
+    cov = (1 - SHRINKAGE) * cov + SHRINKAGE * np.diag(np.diag(cov))
+    try:
+        np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        values, vectors = np.linalg.eigh(cov)
+        cov = (vectors * np.maximum(values, values[-1] * 1e-8)) @ vectors.T
+    return tickers, cov, dropped
+
+
+def class_covariance():
+    vol = np.array([v[1] for v in ASSET_CLASSES.values()])
+    return np.outer(vol, vol) * CORRELATION
+
+
+def optimize_allocation(profile_data, histories):
+    """
+    Divide a economia mensal: primeiro o aporte na reserva de emergência, depois a parcela
+    investida entre as classes (média-variância com limites pela tolerância a risco) e, dentro
+    de ações e FIIs, entre os tickers do perfil (paridade de risco com peso máximo).
+    `histories` é {ticker: colunas de historico_precos}.
+    """
+    tolerance = _tolerance(profile_data)
+    economia = max(0.0, profile_data["renda_mensal"] - profile_data["gastos_fixos"])
+    reserve = emergency_reserve(profile_data, economia)
+    investable = economia - reserve["aporte"]
+
+    classes = list(ASSET_CLASSES)
+    mu = np.array([v[0] for v in ASSET_CLASSES.values()])
+    cov = class_covariance()
+    bounds = CLASS_BOUNDS[tolerance]
+    weights = mean_variance(
+        mu, cov, RISK_AVERSION[tolerance], [bounds[c][0] for c in classes], [bounds[c][1] for c in classes]
+    )
+
+    tickers, ticker_cov, dropped = covariance_from_histories(histories) if histories else ([], None, [])
+    allocations = []
+    for name in ("acoes", "fiis"):
+        members = [i for i, t in enumerate(tickers) if ticker_class(t) == name]
+        if not members:
+            continue
+        sub = ticker_cov[np.ix_(members, members)]
+        member_weights = capped_risk_parity(sub, MAX_TICKER_WEIGHT[tolerance])
+        risk = member_weights * (sub @ member_weights)
+        class_value = investable * weights[classes.index(name)]
+        for j, i in enumerate(members):
+            allocations.append(
+                {
+                    "ticker": tickers[i],
+                    "classe": name,
+                    "peso_classe": float(member_weights[j]),
+                    "valor": float(class_value * member_weights[j]),
+                    "volatilidade": float(np.sqrt(sub[j, j])),
+                    "contribuicao_risco": float(risk[j] / risk.sum()),
+                }
+            )
+
+    return {
+        "tolerancia": tolerance,
+        "economia": economia,
+        "reserva": reserve,
+        "investivel": investable,
+        "classes": {c: {"peso": float(w), "valor": float(investable * w)} for c, w in zip(classes, weights)},
+        "retorno_esperado": float(mu @ weights),
+        "volatilidade": float(np.sqrt(weights @ cov @ weights)),
+        "tickers": allocations,
+        "sem_historico": dropped,
+    }
+
+
+def _brl(value):
+    return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _pct(value):
+    return f"{value * 100:.1f}%".replace(".", ",")
+
+
+def format_allocation_markdown(plan):
+    """
+    Tabelas do plano otimizado para o prompt: divisão da economia mensal por destino e por ticker.
+    """
+    economia = plan["economia"]
+    reserve = plan["reserva"]
+    lines = [
+        f"### PLANO DE ALOCAÇÃO OTIMIZADO (calculado localmente em {datetime.now():%Y-%m-%d})",
+        "Divisão da economia mensal já calculada: explique e justifique estes percentuais e valores em R$ para o "
+        "investidor; não os recalcule nem proponha outra divisão.",
+        "",
+    ]
+    if economia <= 0:
+        lines.append("Sem economia mensal disponível: não há aporte a alocar.")
+        return "\n".join(lines) + "\n"
+
+    if reserve["falta"] > 0:
+        lines.append(
+            f"Reserva de emergência: meta de {reserve['meses_gastos']} meses de gastos fixos ({_brl(reserve['meta'])}), "
+            f"faltam {_brl(reserve['falta'])}; com {_brl(reserve['aporte'])} por mês, completa em "
+            f"{reserve['meses_para_completar']} meses. Depois disso, todo o aporte segue a divisão entre as classes."
+        )
+    else:
+        lines.append(
+            f"Reserva de emergência completa (meta de {reserve['meses_gastos']} meses de gastos fixos, {_brl(reserve['meta'])})."
+        )
+    lines += [
+        f"Classes otimizadas por média-variância para o perfil {plan['tolerancia']}: retorno esperado de "
+        f"{_pct(plan['retorno_esperado'])} a.a. e volatilidade de {_pct(plan['volatilidade'])} a.a. na parcela investida.",
+        "",
+        "| Destino | % da economia mensal | Valor mensal |",
+        "|---|---|---|",
+    ]
+    if reserve["aporte"] > 0:
+        lines.append(f"| Reserva de emergência | {_pct(reserve['aporte'] / economia)} | {_brl(reserve['aporte'])} |")
+    for name, entry in plan["classes"].items():
+        lines.append(f"| {ASSET_LABELS[name]} | {_pct(entry['valor'] / economia)} | {_brl(entry['valor'])} |")
+    lines.append(f"| **Total** | 100% | **{_brl(economia)}** |")
+
+    if plan["tickers"]:
+        lines += [
+            "",
+            "Tickers do perfil por paridade de risco dentro de cada classe (cada um contribui igualmente para o risco "
+            "da classe, com peso máximo por ativo):",
+            "",
+            "| Ticker | Classe | % da classe | Valor mensal | Volatilidade a.a. | Contribuição ao risco |",
+            "|---|---|---|---|---|---|",
+        ]
+        for entry in plan["tickers"]:
+            lines.append(
+                f"| {entry['ticker'].removesuffix('.SA')} | {ASSET_LABELS[entry['classe']]} | {_pct(entry['peso_classe'])} "
+                f"| {_brl(entry['valor'])} | {_pct(entry['volatilidade'])} | {_pct(entry['contribuicao_risco'])} |"
+            )
+    empty = [ASSET_LABELS[c] for c in ("acoes", "fiis") if not any(e["classe"] == c for e in plan["tickers"])]
+    if empty:
+        lines.append("")
+        lines.append(f"Sem tickers do perfil em {' e '.join(empty)}: sugira ativos para o valor mensal da classe.")
+    if plan["sem_historico"]:
+        lines.append("Sem histórico suficiente para otimizar: " + ", ".join(plan["sem_historico"]))
+    return "\n".join(lines) + "\n"
+
+
+def build_allocation_block(profile_data, market_tools=None):
+    """
+    Atualiza o histórico local dos tickers do perfil, otimiza a alocação e devolve o bloco do prompt.
+    """
+    from historico_precos import history_store_for
+    from pre_carregamento import parse_tickers
+
+    histories = history_store_for(market_tools).get_many(parse_tickers(profile_data["acoes_interesse"]))
+    return format_allocation_markdown(optimize_allocation(profile_data, histories))
@@ -0,0 +1,222 @@
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from datetime import datetime, timedelta
+
+from cache_mercado import CachedYFinanceTools
+from rastreamento import tracer
+
+# Tickers da B3 (ex.: ITUB4, MXRF11, GOAU4.SA); o sufixo .SA é acrescentado quando ausente.
+TICKER_PATTERN = re.compile(r"\b([A-Z]{4}\d{1,2}[A-Z]?)(\.SA)?\b", re.IGNORECASE)
+
+MAX_WORKERS = 8
+
+
+def parse_tickers(acoes_interesse):
+    """
+    Extrai os tickers do campo livre "acoes_interesse", sem repetições e na ordem informada.
+    """
+    tickers = []
+    for match in TICKER_PATTERN.finditer(acoes_interesse or ""):
+        ticker = f"{match.group(1).upper()}.SA"
+        if ticker not in tickers:
+            tickers.append(ticker)
+    return tickers
+
+
+# Números em reais no formato brasileiro (3.612,12) ou com ponto decimal (3612.12).
+_NUMBER = r"(\d[\d.,]*)"
+_INVESTED = re.compile(r"R\$\s*" + _NUMBER + r"|" + _NUMBER + r"\s*(?:reais|R\$)", re.IGNORECASE)
+_QUANTITY = re.compile(_NUMBER + r"\s*(?:cotas|a[çc][õo]es|papéis)", re.IGNORECASE)
+# "a" só indica o preço médio entre a quantidade e o valor ("100 cotas a 10,20") ou antes de "R$" ("a R$ 10,20").
+_AVERAGE_PRICE = re.compile(
+    r"(?:\b(?:pre[çc]o m[ée]dio|PM)\b\s*(?:de\s*)?(?:R\$\s*)?"
+    r"|(?:cotas|a[çc][õo]es|papéis)\s+a\s+(?:R\$\s*)?"
+    r"|\ba\s*R\$\s*)" + _NUMBER,
+    re.IGNORECASE,
+)
+
+
+def parse_number(text):
+    """
+    Converte "3.612,12", "3612,12", "3612.12" ou "3.612" em float.
+    """
+    text = text.strip(".,")
+    if "," in text:
+        text = text.replace(".", "").replace(",", ".")
+    elif re.fullmatch(r"\d{1,3}(?:\.\d{3})+", text):
+        text = text.replace(".", "")
+    return float(text)
+
+
+def parse_positions(acoes_interesse):
+    """
+    Posições descritas no campo "acoes_interesse", ex.: "ITUB4.SA (3612.12 reais investidos)",
+    "MXRF11 (100 cotas a R$ 10,20)" ou "GOAU4 (R$ 2.000, preço médio 9,80)".
+    Retorna {ticker: {"investido", "quantidade", "preco_medio"}}, com None no que não foi informado.
+    """
+    text = acoes_interesse or ""
+    matches = list(TICKER_PATTERN.finditer(text))
+    positions = {}
+    for i, match in enumerate(matches):
+        ticker = f"{match.group(1).upper()}.SA"
+        segment = text[match.end() : matches[i + 1].start() if i + 1 < len(matches) else len(text)]
+        quantity = _QUANTITY.search(segment)
+        average = _AVERAGE_PRICE.search(segment)
+        # O valor em reais que faz parte do preço médio ("a R$ 10,20") não é o total investido.
+        invested = next(
+            (
+                m
+                for m in _INVESTED.finditer(segment)
+                if not average or m.end() <= average.start() or m.start() >= average.end()
+            ),
+            None,
+        )
+        position = positions.setdefault(ticker, {"investido": None, "quantidade": None, "preco_medio": None})
+        if invested:
+            position["investido"] = parse_number(invested.group(1) or invested.group(2))
+        if quantity:
+            position["quantidade"] = parse_number(quantity.group(1))
+        if average:
+            position["preco_medio"] = parse_number(average.group(1))
+    return positions
+
+
+def _load_json(payload):
+    try:
+        return json.loads(payload)
+    except (TypeError, ValueError):
+        return None
+
+
+def _summarize_dividends(payload):
+    series = _load_json(payload)
+    if not isinstance(series, dict):
+        return {}
+    payments = sorted(series.items())
+    cutoff = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
+    return {
+        "dividendos_12m": round(sum(v for k, v in payments if k[:10] >= cutoff), 4),
+        "ultimos_dividendos": {k[:10]: round(v, 4) for k, v in payments[-6:]},
+    }
+
+
+def _fetch_tasks(tools, ticker):
+    """
+    Tarefas independentes por ticker: cada uma vira um job no pool de threads.
+    """
+    return {
+        "preco": lambda: tools.get_current_stock_price(ticker),
+        "fundamentos": lambda: tools.get_stock_fundamentals(ticker),
+        "dividendos": lambda: tools.get_dividends(ticker),
+    }
+
+
+def prefetch_market_data(acoes_interesse, tools=None, max_workers=MAX_WORKERS, include_dividends=True):
+    """
+    Busca em paralelo preço, fundamentos e dividendos de todos os tickers do perfil, passando
+    pelo cache de mercado (o histórico de preços vem de historico_precos). Retorna {ticker: dados resumidos}.
+    Com `include_dividends=False` a série de dividendos não é buscada (as métricas de proventos
+    já vêm do módulo dividendos).
+    """
+    tickers = parse_tickers(acoes_interesse)
+    if not tickers:
+        return {}
+    tools = tools or CachedYFinanceTools()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            (ticker, name): executor.submit(fetch)
+            for ticker in tickers
+            for name, fetch in _fetch_tasks(tools, ticker).items()
+            if include_dividends or name != "dividendos"
+        }
+
+    market_data = {}
+    for (ticker, name), future in futures.items():
+        try:
+            payload = future.result()
+        except Exception as e:
+            payload = f"Error fetching {name} for {ticker}: {e}"
+        data = market_data.setdefault(ticker, {})
+        if isinstance(payload, str) and payload.startswith(("Error", "Could not")):
+            data.setdefault("indisponivel", []).append(name)
+        elif name == "preco":
+            data["preco"] = payload
+        elif name == "fundamentos":
+            data["fundamentos"] = _load_json(payload) or payload
+        elif name == "dividendos":
+            data.update(_summarize_dividends(payload))
+    return market_data
+
+
+def format_market_data_block(market_data):
+    """
+    Bloco compacto (uma linha JSON por ticker) para ser anexado ao prompt de análise.
+    """
+    if not market_data:
+        return ""
+    lines = [
+        f"### DADOS DE MERCADO PRÉ-CARREGADOS (Yahoo Finance, {datetime.now():%Y-%m-%d})",
+        "Use estes dados diretamente; recorra às ferramentas apenas para informações que não estejam aqui.",
+    ]
+    for ticker, data in market_data.items():
+        lines.append(f"- {ticker}: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n"
+
+
+class SpeculativePrefetcher:
+    """
+    Aquece os caches dos tickers digitados no formulário enquanto o usuário ainda preenche
+    os demais campos: dados de mercado (com os proventos), histórico diário local e pares do
+    setor. As buscas rodam em uma thread de fundo, uma vez por ticker; quando o relatório
+    começa, o pré-carregamento do pipeline encontra os dados já em cache.
+    """
+
+    def __init__(self, tools=None):
+        self.tools = tools
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pre-carregamento")
+        self._lock = threading.Lock()
+        self._scheduled = set()
+        self._futures = []
+
+    def schedule(self, acoes_interesse):
+        """
+        Agenda os tickers ainda não buscados do texto informado. Retorna a lista agendada.
+        """
+        with self._lock:
+            tickers = [t for t in parse_tickers(acoes_interesse) if t not in self._scheduled]
+            if tickers:
+                self._scheduled.update(tickers)
+                self._futures.append(self._executor.submit(self._warm, tickers))
+        return tickers
+
+    def _warm(self, tickers):
+        from comparacao_setorial import build_sector_comparison
+        from historico_precos import history_store_for
+
+        tools = self.tools or CachedYFinanceTools()
+        text = " ".join(tickers)
+        with tracer.span("pre_carregamento_especulativo", tickers=len(tickers)):
+            prefetch_market_data(text, tools)
+            history_store_for(tools).get_many(tickers)
+            build_sector_comparison(text, tools)
+        return tickers
+
+    def pending(self):
+        with self._lock:
+            return sum(1 for future in self._futures if not future.done())
+
+    def wait(self, timeout=None):
+        """
+        Aguarda as buscas agendadas por até `timeout` segundos no total. Falhas são ignoradas:
+        o pipeline refaz o que faltar.
+        """
+        with self._lock:
+            futures = list(self._futures)
+        wait_futures(futures, timeout)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,263 @@
+import functools
+import re
+
+import numpy as np
+
+# Premissas anuais nominais por classe de ativo: (retorno esperado, volatilidade).
+ASSET_CLASSES = {
+    "renda_fixa": (0.105, 0.01),
+    "fiis": (0.11, 0.13),
+    "acoes": (0.12, 0.25),
+}
+ASSET_LABELS = {"renda_fixa": "Renda Fixa", "fiis": "FIIs", "acoes": "Ações"}
+# Correlação entre as classes, na mesma ordem de ASSET_CLASSES.
+CORRELATION = np.array(
+    [
+        [1.0, 0.1, 0.05],
+        [0.1, 1.0, 0.55],
+        [0.05, 0.55, 1.0],
+    ]
+)
+
+# Alocação de longo prazo por tolerância a risco; o médio prazo usa metade dessa exposição
+# à renda variável e o curto prazo fica integralmente em renda fixa.
+LONG_TERM_ALLOCATION = {
+    "Conservadora": {"renda_fixa": 0.80, "fiis": 0.12, "acoes": 0.08},
+    "Moderada": {"renda_fixa": 0.50, "fiis": 0.25, "acoes": 0.25},
+    "Agressiva": {"renda_fixa": 0.20, "fiis": 0.30, "acoes": 0.50},
+}
+LONG_TERM_HORIZONS_YEARS = (5, 10, 20, 30, 50)
+
+N_PATHS = 10_000
+MAX_MONTHS = 600
+# Janela simulada por horizonte: metas além dela aparecem como "> N anos".
+HORIZON_MONTHS = {"curto": 120, "medio": 360, "longo": MAX_MONTHS}
+PERCENTILES = (10, 50, 90)
+SEED = 20240601
+
+# Valor com ou sem "R$", seguido opcionalmente de escala ("mil", "milhão") e de "reais".
+_AMOUNT_PATTERN = re.compile(
+    r"(R\$\s*)?(\d[\d.,]*)\s*(mil\b|milh[õã]o\b|milh[õo]es\b)?\s*(reais\b)?", re.IGNORECASE
+)
+
+
+def parse_amount(text):
+    """
+    Extrai o primeiro valor em reais de um texto livre ("R$ 5.000,00", "R$ 50000.00", "R$ 1,5 milhão",
+    "50 mil reais"). Só conta um número marcado por "R$", escala ou "reais": prazos, anos e
+    quantidades ("em 5 anos", "em 2027", "6 meses de gastos") não viram metas. Retorna None sem valor.
+    """
+    from pre_carregamento import parse_number
+
+    for match in _AMOUNT_PATTERN.finditer(text or ""):
+        suffix = (match.group(3) or "").lower()
+        if not (match.group(1) or suffix or match.group(4)):
+            continue
+        try:
+            value = parse_number(match.group(2))
+        except ValueError:
+            continue
+        if suffix == "mil":
+            value *= 1_000
+        elif suffix.startswith("milh"):
+            value *= 1_000_000
+        return value
+    return None
+
+
+def _parse_int(text):
+    match = re.search(r"\d+", text or "")
+    return int(match.group()) if match else None
+
+
+def allocation_for(horizon, tolerancia_risco):
+    """
+    Pesos por classe de ativo para o horizonte ("curto", "medio", "longo").
+    """
+    if horizon == "curto":
+        return {"renda_fixa": 1.0, "fiis": 0.0, "acoes": 0.0}
+    long_term = LONG_TERM_ALLOCATION.get(tolerancia_risco, LONG_TERM_ALLOCATION["Moderada"])
+    if horizon == "longo":
+        return dict(long_term)
+    return {
+        "renda_fixa": 1.0 - (1.0 - long_term["renda_fixa"]) / 2,
+        "fiis": long_term["fiis"] / 2,
+        "acoes": long_term["acoes"] / 2,
+    }
+
+
+def _monthly_log_params(weights):
+    """
+    Média e desvio mensais do log-retorno da carteira a partir das premissas anuais.
+    """
+    w = np.array([weights[k] for k in ASSET_CLASSES])
+    annual_mean = np.array([v[0] for v in ASSET_CLASSES.values()])
+    annual_vol = np.array([v[1] for v in ASSET_CLASSES.values()])
+    covariance = np.outer(annual_vol, annual_vol) * CORRELATION
+    portfolio_vol = float(np.sqrt(w @ covariance @ w) / np.sqrt(12))
+    portfolio_mean = float(np.log1p(w @ annual_mean) / 12) - portfolio_vol**2 / 2
+    return portfolio_mean, portfolio_vol
+
+
+def simulate_wealth(shocks, weights, monthly_contribution, initial=0.0):
+    """
+    Patrimônio ao final de cada mês para todos os caminhos, sem laço temporal:
+    W_t = (W_0 + c * S_t) / D_t, com D_t = 1 / G_t o desconto acumulado do retorno e
+    S_t = sum_{k<=t} D_{k-1} o valor presente dos aportes feitos no início de cada mês.
+    `shocks` é uma matriz (caminhos x meses) de normais padrão, compartilhada entre objetivos.
+    """
+    mean, vol = _monthly_log_params(weights)
+    discount = np.multiply(shocks, -vol)
+    discount -= mean
+    np.cumsum(discount, axis=1, out=discount)
+    np.exp(discount, out=discount)
+
+    wealth = np.empty_like(discount)
+    wealth[:, 0] = 1.0
+    np.cumsum(discount[:, :-1], axis=1, out=wealth[:, 1:])
+    wealth[:, 1:] += 1.0
+    wealth *= monthly_contribution
+    wealth += initial
+    wealth /= discount
+    return wealth
+
+
+def months_to_target(wealth, target):
+    """
+    Percentis do número de meses até atingir `target` e a fração de caminhos que atingiram.
+    Caminhos que não atingem a meta no horizonte simulado contam como além do horizonte.
+    """
+    reached = wealth >= target
+    hit = reached.any(axis=1)
+    months = np.where(hit, reached.argmax(axis=1) + 1, wealth.shape[1] + 1)
+    return np.percentile(months, PERCENTILES, method="higher"), hit
+
+
+@functools.lru_cache(maxsize=4)
+def _standard_normal_shocks(n_paths, months, seed):
+    """
+    Choques normais padrão (float32) reutilizados entre chamadas: com semente fixa,
+    as projeções são reprodutíveis e o custo de geração é pago uma vez por processo.
+    """
+    shocks = np.random.default_rng(seed).standard_normal((n_paths, months), dtype=np.float32)
+    shocks.flags.writeable = False
+    return shocks
+
+
+def project_goals(profile_data, n_paths=N_PATHS, max_months=MAX_MONTHS, seed=SEED):
+    """
+    Simula os objetivos de curto, médio e longo prazo do perfil.
+    Cada projeção considera todo o aporte mensal disponível direcionado ao objetivo; a de curto
+    prazo parte das reservas de emergência atuais, as demais partem do zero.
+    """
+    contribution = max(0.0, profile_data["renda_mensal"] - profile_data["gastos_fixos"])
+    tolerance = profile_data.get("tolerancia_risco", "Moderada")
+    shocks = _standard_normal_shocks(n_paths, max_months, seed)
+
+    goals = []
+    specs = [
+        ("curto", "Curto Prazo", profile_data.get("obj_curto", ""), _parse_int(profile_data.get("prazo_curto_meses"))),
+        ("medio", "Médio Prazo", profile_data.get("obj_medio", ""), None),
+    ]
+    prazo_medio = _parse_int(profile_data.get("prazo_medio_anos"))
+    if prazo_medio:
+        specs[1] = specs[1][:3] + (prazo_medio * 12,)
+
+    for horizon, label, objective, deadline in specs:
+        target = parse_amount(objective)
+        if not objective.strip() or not target:
+            continue
+        weights = allocation_for(horizon, tolerance)
+        # O curto prazo fica todo em renda fixa, como a reserva de emergência, e costuma ser a própria
+        # reserva ("Atingir R$ 5.000,00 para reserva de emergência"): parte do que já está guardado.
+        initial = profile_data.get("reservas_emergencia", 0.0) if horizon == "curto" else 0.0
+        window = min(max_months, max(HORIZON_MONTHS[horizon], deadline or 0))
+        wealth = simulate_wealth(shocks[:, :window], weights, contribution, initial)
+        percentiles, hit = months_to_target(wealth, target)
+        probability = None
+        if deadline:
+            probability = float((wealth[:, min(deadline, window) - 1] >= target).mean())
+        goals.append(
+            {
+                "horizonte": label,
+                "objetivo": objective,
+                "meta": target,
+                "prazo_meses": deadline,
+                "janela_meses": window,
+                "alocacao": weights,
+                "meses_percentis": dict(zip(PERCENTILES, percentiles.tolist())),
+                "prob_no_prazo": probability,
+                "prob_no_horizonte": float(hit.mean()),
+            }
+        )
+
+    weights = allocation_for("longo", tolerance)
+    wealth = simulate_wealth(shocks, weights, contribution)
+    horizons = [y for y in LONG_TERM_HORIZONS_YEARS if y * 12 <= max_months]
+    columns = np.array([y * 12 - 1 for y in horizons])
+    wealth_percentiles = np.percentile(wealth[:, columns], PERCENTILES, axis=0)
+    long_term = {
+        "horizonte": "Longo Prazo",
+        "objetivo": profile_data.get("obj_longo", ""),
+        "alocacao": weights,
+        "patrimonio": {
+            years: dict(zip(PERCENTILES, wealth_percentiles[:, i].tolist()))
+            for i, years in enumerate(horizons)
+        },
+    }
+
+    return {"aporte_mensal": contribution, "caminhos": n_paths, "objetivos": goals, "longo_prazo": long_term}
+
+
+def _brl(value):
+    return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _months_label(months, max_months):
+    if months > max_months:
+        return f"> {max_months // 12} anos"
+    years, rest = divmod(int(months), 12)
+    if not years:
+        return f"{rest} meses"
+    return f"{years}a {rest}m" if rest else f"{years} anos"
+
+
+def _allocation_label(weights):
+    return ", ".join(f"{ASSET_LABELS[k]} {v:.0%}" for k, v in weights.items() if v > 0)
+
+
+def format_projection_markdown(projection):
+    """
+    Tabelas Markdown com as projeções, usadas tanto no prompt quanto no PDF final.
+    """
+    lines = [
+        f"Simulação de Monte Carlo com {projection['caminhos']:,} cenários".replace(",", ".")
+        + f", considerando aporte mensal de {_brl(projection['aporte_mensal'])} direcionado a cada objetivo"
+        + " (o de curto prazo parte das reservas atuais).",
+        "",
+    ]
+    if projection["objetivos"]:
+        lines += [
+            "| Objetivo | Meta | Alocação | Pessimista (P90) | Provável (P50) | Otimista (P10) | Chance no prazo |",
+            "|---|---|---|---|---|---|---|",
+        ]
+        for goal in projection["objetivos"]:
+            p = goal["meses_percentis"]
+            chance = f"{goal['prob_no_prazo']:.0%}" if goal["prob_no_prazo"] is not None else "N/A"
+            lines.append(
+                f"| {goal['horizonte']} | {_brl(goal['meta'])} | {_allocation_label(goal['alocacao'])} "
+                f"| {_months_label(p[90], goal['janela_meses'])} | {_months_label(p[50], goal['janela_meses'])} "
+                f"| {_months_label(p[10], goal['janela_meses'])} | {chance} |"
+            )
+        lines.append("")
+
+    long_term = projection["longo_prazo"]
+    lines += [
+        f"Patrimônio projetado no longo prazo ({_allocation_label(long_term['alocacao'])}):",
+        "",
+        "| Horizonte | Pessimista (P10) | Provável (P50) | Otimista (P90) |",
+        "|---|---|---|---|",
+    ]
+    for years, p in long_term["patrimonio"].items():
+        lines.append(f"| {years} anos | {_brl(p[10])} | {_brl(p[50])} | {_brl(p[90])} |")
+    return "\n".join(lines) + "\n"
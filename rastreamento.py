@@ -0,0 +1,243 @@
+import contextlib
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+# PIPELINE_TRACE=arquivo.json grava no formato do Chrome (chrome://tracing, Perfetto);
+# qualquer outra extensão (ex.: .jsonl) grava um span por linha.
+TRACE_PATH = os.getenv("PIPELINE_TRACE", "")
+# PIPELINE_PROFILE=1 ativa cProfile e tracemalloc nos trechos marcados com `profiled`.
+PROFILE_DIR = os.getenv("PIPELINE_PROFILE_DIR", os.path.join(".cache", "profiling"))
+PROFILE_TOP = 25
+# Limite de eventos em memória: em processos longos, os mais antigos são descartados.
+MAX_EVENTS = int(os.getenv("PIPELINE_TRACE_MAX_EVENTS", "100000"))
+
+
+def profiling_requested():
+    return os.getenv("PIPELINE_PROFILE", "").lower() in ("1", "true", "sim", "yes")
+
+
+class Tracer:
+    """
+    Registra spans (etapas, chamadas de ferramentas, streams) e eventos pontuais
+    (novas tentativas, espera de cota) em memória, com a thread de origem de cada um.
+    Os atributos de um span podem ser preenchidos durante a execução pelo dicionário
+    devolvido em `span()`. O span pai é acompanhado por contexto (contextvars), o que
+    vale tanto para threads quanto para tarefas do asyncio no mesmo loop.
+    """
+
+    def __init__(self, clock=time.perf_counter, max_events=MAX_EVENTS):
+        self._clock = clock
+        self._origin = clock()
+        self._lock = threading.Lock()
+        self._current = contextvars.ContextVar(f"span_atual_{id(self)}", default=None)
+        self._listener = contextvars.ContextVar(f"ouvinte_{id(self)}", default=None)
+        self.events = deque(maxlen=max_events)
+
+    def _now_us(self):
+        return (self._clock() - self._origin) * 1e6
+
+    @contextlib.contextmanager
+    def listen(self, callback):
+        """
+        Repassa a `callback(fase, evento)` os spans iniciados ("inicio") e concluídos ("fim"), os
+        eventos pontuais ("evento") e os passos de progresso ("progresso") deste contexto, como o
+        andamento de um job do serviço ou os trechos exibidos na interface.
+        Threads criadas por pools não herdam o contexto e, portanto, não são repassadas.
+        """
+        token = self._listener.set(callback)
+        try:
+            yield
+        finally:
+            self._listener.reset(token)
+
+    def _notify(self, phase, event):
+        callback = self._listener.get()
+        if callback is not None:
+            try:
+                callback(phase, event)
+            except Exception:
+                # Um ouvinte com problema não pode interromper o pipeline.
+                pass
+
+    @contextlib.contextmanager
+    def span(self, name, category="etapa", **attrs):
+        parent = self._current.get()
+        token = self._current.set(name)
+        start = self._now_us()
+        self._notify("inicio", {"nome": name, "categoria": category, "pai": parent})
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["erro"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._current.reset(token)
+            self._record(
+                {
+                    "nome": name,
+                    "categoria": category,
+                    "inicio_us": round(start, 1),
+                    "duracao_us": round(self._now_us() - start, 1),
+                    "thread": threading.get_ident(),
+                    "pai": parent,
+                    "atributos": attrs,
+                }
+            )
+
+    def instant(self, name, category="evento", **attrs):
+        self._record(
+            {
+                "nome": name,
+                "categoria": category,
+                "inicio_us": round(self._now_us(), 1),
+                "duracao_us": None,
+                "thread": threading.get_ident(),
+                "pai": self._current.get(),
+                "atributos": attrs,
+            }
+        )
+
+    def progress(self, name, category="stream", **attrs):
+        """
+        Repassa aos ouvintes um passo de progresso ("progresso"), como um trecho de stream,
+        sem registrá-lo entre os eventos do rastreamento.
+        """
+        self._notify("progresso", {"nome": name, "categoria": category, "pai": self._current.get(), "atributos": attrs})
+
+    def _record(self, event):
+        with self._lock:
+            self.events.append(event)
+        self._notify("evento" if event["duracao_us"] is None else "fim", event)
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self._origin = self._clock()
+
+    def export(self, path):
+        """
+        Grava os eventos em `path`: formato Chrome trace para .json, JSON lines para os demais.
+        """
+        with self._lock:
+            events = list(self.events)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            if path.lower().endswith(".json"):
+                json.dump({"traceEvents": [_chrome_event(e) for e in events]}, f, ensure_ascii=False, default=str)
+            else:
+                for event in events:
+                    f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        return path
+
+    def summary(self, categories=("etapa", "stream", "cota", "ferramenta")):
+        """
+        Linhas com a duração total e a contagem de cada span das categorias informadas,
+        da mais demorada para a mais rápida.
+        """
+        totals = {}
+        with self._lock:
+            for event in self.events:
+                if event["categoria"] in categories and event["duracao_us"] is not None:
+                    total, count = totals.get(event["nome"], (0.0, 0))
+                    totals[event["nome"]] = (total + event["duracao_us"], count + 1)
+        return [
+            f"{name}: {total / 1e6:.2f}s ({count}x)"
+            for name, (total, count) in sorted(totals.items(), key=lambda item: -item[1][0])
+        ]
+
+
+def _chrome_event(event):
+    chrome = {
+        "name": event["nome"],
+        "cat": event["categoria"],
+        "ts": event["inicio_us"],
+        "pid": os.getpid(),
+        "tid": event["thread"],
+        "args": event["atributos"],
+    }
+    if event["duracao_us"] is None:
+        chrome.update(ph="i", s="t")
+    else:
+        chrome.update(ph="X", dur=event["duracao_us"])
+    return chrome
+
+
+# Rastreador compartilhado por todo o processo (inclusive pelos workers do modo em lote).
+tracer = Tracer()
+
+# cProfile só admite um perfilador ativo por vez; trechos concorrentes seguem sem perfil.
+_profile_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def profiled(name):
+    """
+    Com PIPELINE_PROFILE=1, executa o trecho sob cProfile e tracemalloc e grava
+    `<PROFILE_DIR>/<nome>-<instante>.prof` e `.txt` (funções mais caras e maiores alocações).
+    Sem a variável, não tem custo.
+    """
+    if not profiling_requested() or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        yield
+    finally:
+        profiler.disable()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if started_tracemalloc:
+            tracemalloc.stop()
+        _profile_lock.release()
+        _write_profile(name, profiler, after.compare_to(before, "lineno"), peak)
+
+
+def _write_profile(name, profiler, allocations, peak):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() // 1_000_000 % 1000:03d}"
+    base = os.path.join(PROFILE_DIR, f"{name}-{stamp}")
+    profiler.dump_stats(base + ".prof")
+
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    with open(base + ".txt", "w", encoding="utf-8") as f:
+        f.write(f"Pico de memória (tracemalloc): {peak / 1024 / 1024:.1f} MB\n\n")
+        f.write("Maiores alocações:\n")
+        for stat in allocations[:PROFILE_TOP]:
+            f.write(f"{stat}\n")
+        f.write("\n")
+        f.write(report.getvalue())
+    tracer.instant("perfil", arquivo=base + ".prof", pico_memoria_mb=round(peak / 1024 / 1024, 1))
+    print(f"Perfil de execução salvo em: {base}.prof")
+
+
+def export_trace(path=None):
+    """
+    Grava o rastreamento em PIPELINE_TRACE (ou `path`) e imprime o resumo das etapas.
+    Não faz nada se nenhum destino estiver configurado.
+    """
+    path = path or TRACE_PATH
+    if not path:
+        return None
+    tracer.export(path)
+    print("\n--- TEMPO POR ETAPA ---")
+    for line in tracer.summary():
+        print(line)
+    print(f"Rastreamento salvo em: {path}")
+    return path
@@ -0,0 +1,676 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from textwrap import dedent
+
+from lote import MONETARY_FIELDS, PROFILE_FIELDS, normalize_profile
+from rastreamento import tracer
+
+# Último relatório de cada investidor: <REPORTS_DIR>/<chave do investidor>/, com uma seção por arquivo.
+REPORTS_DIR = os.getenv("INCREMENTAL_REPORTS_DIR", os.path.join(".cache", "relatorios_incrementais"))
+# Seções mais antigas que isso são refeitas mesmo sem mudança no perfil (os dados de mercado envelhecem).
+MAX_AGE_SECONDS = float(os.getenv("INCREMENTAL_MAX_AGE_HOURS", "24")) * 60 * 60
+# Seções escritas pelo agente ao mesmo tempo; todas passam pelo mesmo limitador de cota do Gemini.
+MAX_WORKERS = int(os.getenv("INCREMENTAL_WORKERS", "3"))
+
+PROFILE_FILE = "perfil.json"
+INDEX_FILE = "secoes.json"
+
+FIELD_LABELS = {
+    "nome": "Nome",
+    "renda_mensal": "Renda líquida mensal",
+    "gastos_fixos": "Gastos fixos mensais",
+    "reservas_emergencia": "Reservas de emergência",
+    "tolerancia_risco": "Tolerância a risco",
+    "nivel_conhecimento": "Nível de conhecimento",
+    "obj_curto": "Objetivo de curto prazo",
+    "prazo_curto_meses": "Prazo do objetivo de curto prazo (meses)",
+    "obj_medio": "Objetivo de médio prazo",
+    "prazo_medio_anos": "Prazo do objetivo de médio prazo (anos)",
+    "obj_longo": "Objetivo de longo prazo",
+    "acoes_interesse": "Ações de interesse/posse",
+    "setores_interesse": "Setores de interesse",
+    "pref_renda": "Preferência de renda",
+    "outras_consideracoes": "Outras considerações",
+}
+
+# Campos usados pela simulação de Monte Carlo dos objetivos.
+_PROJECTION_FIELDS = (
+    "renda_mensal",
+    "gastos_fixos",
+    "reservas_emergencia",
+    "tolerancia_risco",
+    "obj_curto",
+    "prazo_curto_meses",
+    "obj_medio",
+    "prazo_medio_anos",
+    "obj_longo",
+)
+
+# Seções do relatório, na ordem do PDF, com os campos do perfil de que cada uma depende.
+# "ticker" vira uma seção por ação (análise independente do perfil); "agente" é escrita pelo
+# agente de seções, que recebe apenas esses campos; "local" é calculada sem o modelo.
+SECTIONS = [
+    {"nome": "analise_ticker", "titulo": "📈 Análise das Ações de Interesse", "tipo": "ticker", "campos": ()},
+    {
+        "nome": "comparativo_setorial",
+        "titulo": "🏭 Comparativo Setorial e Oportunidades de Migração",
+        "tipo": "agente",
+        "campos": ("acoes_interesse", "setores_interesse", "tolerancia_risco", "nivel_conhecimento", "pref_renda"),
+    },
+    {
+        "nome": "plano_alocacao",
+        "titulo": "💼 Plano de Alocação de Capital Mensal",
+        "tipo": "agente",
+        "campos": _PROJECTION_FIELDS
+        + ("nivel_conhecimento", "acoes_interesse", "setores_interesse", "pref_renda", "outras_consideracoes"),
+    },
+    {
+        "nome": "roteiro",
+        "titulo": "🧭 Roteiro de Investimento e Desafios",
+        "tipo": "agente",
+        "campos": _PROJECTION_FIELDS + ("nivel_conhecimento", "outras_consideracoes"),
+    },
+    {
+        "nome": "projecao",
+        "titulo": "📊 Projeções dos Objetivos (Simulação de Monte Carlo)",
+        "tipo": "local",
+        "campos": _PROJECTION_FIELDS,
+    },
+    {
+        "nome": "renda_passiva",
+        "titulo": "💰 Renda Passiva Mensal Projetada (Proventos)",
+        "tipo": "local",
+        "campos": ("acoes_interesse", "pref_renda"),
+    },
+    {"nome": "aviso_legal", "titulo": "⚠️ Aviso Legal e Divulgação de Riscos", "tipo": "local", "campos": ()},
+]
+
+SECTION_AGENT_INSTRUCTIONS = dedent(
+    """\
+Você é um **Consultor Financeiro Pessoal e Analista de Investimentos Sênior** especializado na B3.
+
+Você escreve UMA seção de um relatório de consultoria financeira; as demais seções são escritas separadamente e reunidas depois.
+
+- Use apenas os campos do perfil, as análises por ticker, as tabelas e as projeções enviados no pedido; não refaça cálculos já prontos.
+- Responda em português, em Markdown, começando exatamente pelo título `## <título da seção>` informado, com subtítulos `###`, tabelas e bullets quando ajudarem.
+- Seja direto, realista e específico (valores em R$, percentuais, prazos); explique termos técnicos de forma concisa.
+- Não escreva resumo executivo, conclusão geral nem aviso legal: eles não fazem parte desta seção.
+- Se o pedido trouxer a versão anterior da seção e as mudanças do perfil, atualize essa versão de acordo com as mudanças, mantendo o que continua válido.
+"""
+)
+
+SECTION_REQUESTS = {
+    "comparativo_setorial": dedent(
+        """\
+        Compare cada ação de interesse com as líderes do mesmo setor, usando a tabela comparativa setorial e a seção
+        **Pares do setor** das análises por ticker. Avalie EXPLICITAMENTE se compensa migrar (parcial ou totalmente)
+        ou diversificar para essas alternativas, com prós e contras de cada movimento e o impacto para este investidor."""
+    ),
+    "plano_alocacao": dedent(
+        """\
+        Detalhe o plano de alocação da economia mensal disponível (R$ {economia:.2f}) por objetivo (curto, médio e longo
+        prazo), em % e em R$ para Reserva/Renda Fixa, Ações e FIIs, incluindo quanto falta para a reserva de emergência.
+        Use os valores do plano de alocação otimizado (reserva, classes e tickers) e explique-os, sem recalculá-los.
+        Para cada ação de interesse, dê a recomendação (Comprar, Vender, Manter) com valor ou quantidade sugeridos.
+        Use as projeções de Monte Carlo para dizer QUANTO investir e QUANDO cada objetivo será atingido."""
+    ),
+    "roteiro": dedent(
+        """\
+        Escreva o roteiro etapa por etapa para os objetivos de curto e longo prazo: ações imediatas, marcos anuais ou
+        trimestrais, reinvestimento de dividendos e rebalanceamento. Discuta com realismo as dificuldades (volatilidade,
+        inflação, taxas, impostos, liquidez) e a importância da disciplina, e termine com os próximos passos."""
+    ),
+}
+
+DISCLAIMER = dedent(
+    """\
+    - Este relatório é gerado por uma inteligência artificial e se destina exclusivamente a fins **informativos e educacionais**. Não constitui consultoria financeira, jurídica ou fiscal personalizada.
+    - Investimentos em renda variável envolvem riscos, incluindo a perda parcial ou total do capital investido.
+    - Rentabilidade passada **não garante** rentabilidade futura.
+    - As condições de mercado são voláteis. Consulte sempre um **profissional certificado** antes de tomar decisões de investimento.
+    - Seções reaproveitadas de relatórios anteriores refletem os dados de mercado da data em que foram geradas.
+    """
+)
+
+
+def incremental_requested():
+    """
+    RELATORIO_INCREMENTAL=1 ativa a regeneração incremental sem alterar a linha de comando.
+    """
+    return os.getenv("RELATORIO_INCREMENTAL", "").lower() in ("1", "true", "sim", "yes")
+
+
+def _write_atomic(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _digest(material):
+    text = json.dumps(material, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class ProfileRecord:
+    """
+    Perfil tipado (valores monetários em float, demais campos em texto, validados como no
+    formulário), comparável campo a campo com o perfil do relatório anterior.
+    """
+
+    FIELD_TYPES = {field: float if field in MONETARY_FIELDS else str for field in PROFILE_FIELDS}
+
+    def __init__(self, values, investor_id=None):
+        self.values = {field: kind(values[field]) for field, kind in self.FIELD_TYPES.items()}
+        self.investor_id = str(investor_id).strip() if investor_id not in (None, "") else None
+
+    @classmethod
+    def from_profile(cls, profile_data, investor_id=None):
+        return cls(normalize_profile(profile_data), investor_id)
+
+    def __getitem__(self, field):
+        return self.values[field]
+
+    @property
+    def key(self):
+        # O investidor é identificado pelo id informado pelo chamador ou, na falta dele, pelo nome:
+        # os demais campos são justamente os que mudam.
+        if self.investor_id:
+            return _digest({"id": self.investor_id})
+        return _digest(" ".join(self.values["nome"].lower().split()))
+
+    @property
+    def tickers(self):
+        from pre_carregamento import parse_tickers
+
+        return parse_tickers(self.values["acoes_interesse"])
+
+    def subset(self, fields):
+        return {field: self.values[field] for field in fields}
+
+    def to_dict(self):
+        return dict(self.values)
+
+    def diff(self, previous):
+        """
+        {campo: (valor anterior, valor atual)} dos campos alterados; sem perfil anterior, todos os campos.
+        """
+        if previous is None:
+            return {field: (None, value) for field, value in self.values.items()}
+        return {
+            field: (previous.values.get(field), value)
+            for field, value in self.values.items()
+            if previous.values.get(field) != value
+        }
+
+
+def format_changes(changes, fields=None):
+    """
+    Lista Markdown com as mudanças do perfil (apenas as de `fields`, se informados).
+    """
+    lines = []
+    for field, (before, after) in changes.items():
+        if fields is not None and field not in fields:
+            continue
+        if before is None:
+            continue
+        lines.append(f"- **{FIELD_LABELS[field]}:** {before or 'N/A'} → {after or 'N/A'}")
+    return "\n".join(lines)
+
+
+def format_profile_fields(record, fields):
+    """
+    Bloco do perfil com apenas os campos de que a seção depende (e a economia mensal, quando calculável).
+    """
+    lines = ["### PERFIL DO INVESTIDOR (campos usados nesta seção)"]
+    for field in fields:
+        value = record[field]
+        if field in MONETARY_FIELDS:
+            value = f"R$ {value:.2f}"
+        lines.append(f"- **{FIELD_LABELS[field]}:** {value or 'N/A'}")
+    if "renda_mensal" in fields and "gastos_fixos" in fields:
+        lines.append(f"- **Economia mensal disponível:** R$ {record['renda_mensal'] - record['gastos_fixos']:.2f}")
+    return "\n".join(lines) + "\n"
+
+
+def uses_ticker_analyses(section):
+    """
+    Seções escritas pelo agente que recebem as análises por ticker no pedido (ver build_section_prompt).
+    """
+    return section["tipo"] == "agente" and "acoes_interesse" in section["campos"]
+
+
+def ticker_inputs(units):
+    """
+    {unidade: resumo do texto} das análises por ticker; None para as que ainda não existem.
+    """
+    return {unit["unidade"]: unit["texto"] and _digest(unit["texto"]) for unit in units if unit["ticker"]}
+
+
+def section_fingerprint(section, record, ticker=None, analyses=None):
+    """
+    Impressão digital das entradas da seção: campos de que ela depende, modelo, instruções e,
+    nas seções que as usam, as análises por ticker (`analyses`, de ticker_inputs).
+    """
+    from agent import MODEL_ID
+
+    material = {"secao": section["nome"], "campos": record.subset(section["campos"]), "modelo": MODEL_ID}
+    if uses_ticker_analyses(section):
+        material["analises"] = analyses
+    if ticker:
+        from analise_por_ticker import TICKER_AGENT_INSTRUCTIONS
+
+        material.update(ticker=ticker, instrucoes=TICKER_AGENT_INSTRUCTIONS)
+    elif section["tipo"] == "agente":
+        material["instrucoes"] = SECTION_AGENT_INSTRUCTIONS + SECTION_REQUESTS[section["nome"]]
+    elif section["nome"] == "aviso_legal":
+        material["texto"] = DISCLAIMER
+    return _digest(material)
+
+
+class SectionStore:
+    """
+    Último relatório de um investidor: `perfil.json`, o índice `secoes.json` (impressão digital
+    e data de cada seção) e um `<secao>.md` por seção. Cada seção é gravada assim que fica
+    pronta, então uma execução interrompida também aproveita as seções concluídas.
+    """
+
+    def __init__(self, directory, max_age=MAX_AGE_SECONDS, clock=time.time):
+        self.directory = directory
+        self.max_age = max_age
+        self._clock = clock
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _path(self, unit):
+        return os.path.join(self.directory, unit.replace(":", "_") + ".md")
+
+    def load_profile(self):
+        try:
+            with open(os.path.join(self.directory, PROFILE_FILE), encoding="utf-8") as f:
+                return ProfileRecord(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save_profile(self, record):
+        _write_atomic(
+            os.path.join(self.directory, PROFILE_FILE), json.dumps(record.to_dict(), ensure_ascii=False, indent=2)
+        )
+
+    def previous(self, unit):
+        """
+        Texto gravado da seção, qualquer que seja a impressão digital (versão anterior), ou None.
+        """
+        if unit not in self.index:
+            return None
+        try:
+            with open(self._path(unit), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get(self, unit, fingerprint):
+        """
+        Texto da seção se ela foi gerada com as mesmas entradas há menos de `max_age`; senão None.
+        """
+        entry = self.index.get(unit)
+        if not entry or entry["impressao"] != fingerprint or self._clock() - entry["gerado_em"] > self.max_age:
+            return None
+        return self.previous(unit)
+
+    def save(self, unit, fingerprint, text):
+        _write_atomic(self._path(unit), text)
+        with self._lock:
+            self.index[unit] = {"impressao": fingerprint, "gerado_em": self._clock()}
+            index = json.dumps(self.index, ensure_ascii=False, indent=2)
+            _write_atomic(os.path.join(self.directory, INDEX_FILE), index)
+        return text
+
+
+def open_section_store(record, reports_dir=REPORTS_DIR):
+    return SectionStore(os.path.join(reports_dir, record.key))
+
+
+_store_locks = {}
+_store_locks_lock = threading.Lock()
+
+
+def _store_lock(store):
+    """
+    Um relatório incremental por vez em cada pasta: jobs do mesmo investidor em um lote não
+    intercalam a leitura do perfil anterior e a gravação das seções.
+    """
+    with _store_locks_lock:
+        return _store_locks.setdefault(os.path.abspath(store.directory), threading.Lock())
+
+
+def plan_sections(record, store):
+    """
+    Uma unidade por seção (e por ticker na análise das ações), com o texto reaproveitável
+    em "texto" ou None quando a seção precisa ser gerada.
+    """
+    units = []
+    for section in SECTIONS:
+        tickers = record.tickers if section["tipo"] == "ticker" else [None]
+        for ticker in tickers:
+            unit = f"{section['nome']}:{ticker}" if ticker else section["nome"]
+            analyses = ticker_inputs(units) if uses_ticker_analyses(section) else None
+            fingerprint = section_fingerprint(section, record, ticker, analyses)
+            # Com alguma análise por ticker a refazer, a impressão final só é conhecida depois dela.
+            reusable = not analyses or None not in analyses.values()
+            units.append(
+                {
+                    "unidade": unit,
+                    "secao": section,
+                    "ticker": ticker,
+                    "impressao": fingerprint,
+                    "texto": store.get(unit, fingerprint) if reusable else None,
+                }
+            )
+    return units
+
+
+def create_section_agent():
+    """
+    Cria o agente que escreve uma seção do relatório a partir dos dados enviados no pedido.
+    """
+    from agent import create_model, load_environment
+
+    load_environment()
+    from agno.agent import Agent
+
+    return Agent(
+        model=create_model(),
+        instructions=SECTION_AGENT_INSTRUCTIONS,
+        add_datetime_to_instructions=False,
+        show_tool_calls=False,
+        markdown=True,
+    )
+
+
+def build_section_prompt(section, record, context, changes=None, previous=None):
+    """
+    Pedido de uma seção: apenas os campos do perfil de que ela depende, os blocos calculados
+    (análises por ticker, tabela setorial, projeções, proventos) e, se houver, a versão
+    anterior da seção com as mudanças do perfil desde então.
+    """
+    from orcamento_prompt import PromptBudget
+
+    fields = section["campos"]
+    economia = record["renda_mensal"] - record["gastos_fixos"]
+    orcamento = PromptBudget("secao")
+    orcamento.add("instrucoes", SECTION_AGENT_INSTRUCTIONS, in_prompt=False)
+    orcamento.add(
+        "pedido",
+        f"Escreva a seção **## {section['titulo']}** do relatório, na data de {datetime.now():%Y-%m-%d}.\n"
+        + SECTION_REQUESTS[section["nome"]].format(economia=economia)
+        + "\n\n",
+    )
+    orcamento.add("perfil", format_profile_fields(record, fields))
+    if "acoes_interesse" in fields:
+        orcamento.add("analises_ticker", "\n" + context["analises_ticker"], trimmable=True)
+    if section["nome"] == "comparativo_setorial":
+        orcamento.add("comparativo_setorial", "\n" + context["comparativo"], trimmable=True)
+    if section["nome"] == "plano_alocacao":
+        orcamento.add("alocacao", "\n" + context["alocacao"])
+        orcamento.add("proventos", context["proventos"] and "\n" + context["proventos"], trimmable=True)
+    if set(_PROJECTION_FIELDS) <= set(fields):
+        orcamento.add(
+            "projecoes",
+            "\n### PROJEÇÕES DOS OBJETIVOS (SIMULAÇÃO DE MONTE CARLO)\n"
+            "Use estes prazos e valores; não refaça os cálculos.\n" + context["projecao"],
+        )
+    mudancas = format_changes(changes or {}, fields)
+    if previous and mudancas:
+        orcamento.add("mudancas", "\n### MUDANÇAS NO PERFIL DESDE O ÚLTIMO RELATÓRIO\n" + mudancas + "\n")
+        orcamento.add("versao_anterior", "\n### VERSÃO ANTERIOR DA SEÇÃO\n" + previous, trimmable=True)
+    orcamento.enforce()
+    tracer.instant(
+        f"orcamento:{orcamento.stage}",
+        "prompt",
+        secao=section["nome"],
+        total=orcamento.total_tokens(),
+        **orcamento.tokens(),
+    )
+    return orcamento.render()
+
+
+def _local_section(section, record, market_tools):
+    """
+    Corpo das seções calculadas sem o modelo.
+    """
+    from agent import build_goal_projection, build_income_section
+
+    if section["nome"] == "projecao":
+        return build_goal_projection(record.to_dict())
+    if section["nome"] == "renda_passiva":
+        return build_income_section(record.to_dict(), market_tools)
+    return DISCLAIMER
+
+
+def _context_for(record, units, market_tools):
+    """
+    Blocos calculados localmente que alimentam as seções a gerar (só os que elas usam).
+    """
+    from analise_por_ticker import format_ticker_analyses
+
+    pending = {unit["secao"]["nome"] for unit in units if unit["texto"] is None and unit["secao"]["tipo"] == "agente"}
+    texts = {unit["unidade"]: unit["texto"] for unit in units}
+    context = {
+        "projecao": texts.get("projecao") or "",
+        "analises_ticker": format_ticker_analyses(
+            {unit["ticker"]: unit["texto"] for unit in units if unit["ticker"]}
+        ),
+    }
+    if "comparativo_setorial" in pending:
+        from comparacao_setorial import build_sector_comparison, format_comparison_markdown
+
+        print("--- MONTANDO A TABELA COMPARATIVA SETORIAL ---")
+        with tracer.span("comparativo_setorial"):
+            context["comparativo"] = format_comparison_markdown(
+                build_sector_comparison(record["acoes_interesse"], market_tools)
+            )
+    if "plano_alocacao" in pending:
+        from dividendos import build_dividend_block
+        from otimizador_carteira import build_allocation_block
+
+        with tracer.span("otimizacao_carteira"):
+            context["alocacao"] = build_allocation_block(record.to_dict(), market_tools)
+        with tracer.span("metricas_proventos"):
+            context["proventos"] = build_dividend_block(record.to_dict(), market_tools)
+    return context
+
+
+def _run_parallel(function, items, max_workers):
+    """
+    Aplica `function` a cada item em paralelo; itens que falharem ficam com None.
+    """
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+        futures = [executor.submit(function, item) for item in items]
+    results = []
+    for item, future in zip(items, futures):
+        try:
+            results.append(future.result() or None)
+        except Exception as e:
+            print(f"\nERRO na seção '{item['unidade']}': {e}")
+            results.append(None)
+    return results
+
+
+def assemble_report(record, units):
+    """
+    Markdown final: título, seções na ordem de SECTIONS e as análises por ticker sob um único título.
+    """
+    parts = [
+        f"# Relatório de Consultoria Financeira — {record['nome']}\n",
+        f"*Atualizado em {datetime.now():%d/%m/%Y}.*\n",
+    ]
+    tickers_title = False
+    for unit in units:
+        section, text = unit["secao"], unit["texto"]
+        if section["tipo"] == "ticker":
+            if not tickers_title:
+                parts.append(f"\n## {section['titulo']}\n")
+                tickers_title = True
+            parts.append((text or f"### {unit['ticker']}\nAnálise indisponível nesta execução.").strip() + "\n\n")
+        elif section["tipo"] == "agente":
+            text = text or f"## {section['titulo']}\nSeção indisponível nesta execução."
+            parts.append("\n" + text.strip() + "\n")
+        elif text:
+            parts.append(f"\n## {section['titulo']}\n" + text)
+    return "".join(parts)
+
+
+def generate_incremental_report(
+    profile_data,
+    filename,
+    agent_factory=None,
+    use_response_cache=True,
+    market_tools=None,
+    ticker_agent_factory=None,
+    store=None,
+    max_workers=MAX_WORKERS,
+    investor_id=None,
+):
+    """
+    Gera o PDF reaproveitando as seções do último relatório do mesmo investidor cujas entradas
+    (campos do perfil de que dependem e análises por ticker) não mudaram; só as demais são refeitas,
+    em paralelo. O investidor é identificado por `investor_id` ou, sem ele, pelo nome.
+    Retorna {"alterados": campos do perfil alterados, "regeneradas": [...], "reaproveitadas": [...]}.
+    `store` substitui o armazenamento padrão (open_section_store); `agent_factory` cria o agente de seções.
+    """
+    from agent import export_to_pdf, run_agent_stream
+    from analise_por_ticker import analyze_ticker
+    from cache_respostas import bypass_requested, with_response_cache
+
+    record = ProfileRecord.from_profile(profile_data, investor_id)
+    store = store or open_section_store(record)
+    agent_factory = agent_factory or create_section_agent
+    if not use_response_cache or bypass_requested():
+        # Sem cache, nada é reaproveitado: o relatório inteiro é refeito.
+        store.max_age = -1
+
+    with _store_lock(store), tracer.span("relatorio_incremental", arquivo=filename) as span:
+        previous_record = store.load_profile()
+        changes = record.diff(previous_record)
+        if previous_record is None:
+            print(f"--- PRIMEIRO RELATÓRIO INCREMENTAL DE {record['nome']} ---")
+        else:
+            print(f"--- CAMPOS ALTERADOS DESDE O ÚLTIMO RELATÓRIO: {', '.join(changes) or 'nenhum'} ---")
+
+        units = plan_sections(record, store)
+        pending = [unit for unit in units if unit["texto"] is None]
+        print(
+            f"--- {len(pending)} SEÇÕES A GERAR, {len(units) - len(pending)} REAPROVEITADAS: "
+            f"{', '.join(unit['unidade'] for unit in pending) or 'nenhuma'} ---"
+        )
+
+        for unit in pending:
+            if unit["secao"]["tipo"] == "local":
+                with tracer.span(f"secao:{unit['unidade']}"):
+                    text = _local_section(unit["secao"], record, market_tools)
+                unit["texto"] = store.save(unit["unidade"], unit["impressao"], text)
+
+        def write_ticker(unit):
+            text = analyze_ticker(unit["ticker"], market_tools, ticker_agent_factory, use_cache=use_response_cache)
+            return text and store.save(unit["unidade"], unit["impressao"], text)
+
+        tickers = [unit for unit in pending if unit["ticker"]]
+        if tickers:
+            print(f"--- ANALISANDO {len(tickers)} AÇÕES EM PARALELO ---")
+        for unit, text in zip(tickers, _run_parallel(write_ticker, tickers, max_workers)):
+            unit["texto"] = text
+
+        analyses = ticker_inputs(units)
+        for unit in pending:
+            if uses_ticker_analyses(unit["secao"]):
+                unit["impressao"] = section_fingerprint(unit["secao"], record, analyses=analyses)
+
+        context = _context_for(record, units, market_tools)
+
+        def write_section(unit):
+            section = unit["secao"]
+            prompt = build_section_prompt(section, record, context, changes, store.previous(unit["unidade"]))
+            agent = with_response_cache(agent_factory(), use_response_cache)
+            text = run_agent_stream(agent, prompt, name=f"secao_{section['nome']}")
+            return text and store.save(unit["unidade"], unit["impressao"], text)
+
+        sections = [unit for unit in pending if unit["secao"]["tipo"] == "agente"]
+        if sections:
+            print(f"--- ESCREVENDO {len(sections)} SEÇÕES EM PARALELO ---")
+        for unit, text in zip(sections, _run_parallel(write_section, sections, max_workers)):
+            unit["texto"] = text
+
+        print("\n--- FINALIZANDO RELATÓRIO EM PDF ---")
+        export_to_pdf(assemble_report(record, units), filename)
+        missing = [unit["unidade"] for unit in units if unit["texto"] is None and unit["secao"]["tipo"] != "local"]
+        if not missing:
+            # Só um relatório completo passa a ser a referência da próxima comparação.
+            store.save_profile(record)
+
+        result = {
+            "alterados": [] if previous_record is None else list(changes),
+            "regeneradas": [unit["unidade"] for unit in pending if unit["texto"] is not None],
+            "reaproveitadas": [unit["unidade"] for unit in units if unit not in pending],
+            "falharam": missing,
+        }
+        span.update(regeneradas=len(result["regeneradas"]), reaproveitadas=len(result["reaproveitadas"]))
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Gera o relatório refazendo apenas as seções afetadas pelas mudanças no perfil."
+    )
+    parser.add_argument("perfil", help="Arquivo JSON com o perfil (mesmas chaves do formulário)")
+    parser.add_argument(
+        "-o", "--output", default="Relatorio_Financeiro_Personalizado.pdf", help="Arquivo PDF de saída"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Refaz todas as seções e ignora as respostas em cache"
+    )
+    parser.add_argument(
+        "--id", help="Identificador do investidor (padrão: campo \"id\" do arquivo ou, sem ele, o nome)"
+    )
+    args = parser.parse_args(argv)
+
+    from rastreamento import export_trace
+
+    with open(args.perfil, encoding="utf-8") as f:
+        profile_data = json.load(f)
+    try:
+        result = generate_incremental_report(
+            profile_data,
+            args.output,
+            use_response_cache=not args.no_cache,
+            investor_id=args.id or profile_data.get("id"),
+        )
+    except Exception as e:
+        print(f"\n{e}")
+        return 1
+    finally:
+        export_trace()
+    print(f"Seções refeitas: {len(result['regeneradas'])}; reaproveitadas: {len(result['reaproveitadas'])}.")
+    return 0 if not result["falharam"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+import os
+import re
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_JUSTIFY
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import (
+    SimpleDocTemplate,
+    Paragraph,
+    Preformatted,
+    Spacer,
+    Table,
+    TableStyle,
+)
+
+# --- TOKENIZAÇÃO ---
+# Classificação de blocos: a primeira expressão que casar define o tipo da linha.
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_LIST_ITEM = re.compile(r"^(?:[-*+]|\d+[.)])\s+(.*)$")
+_TABLE_ROW = re.compile(r"^\|.*\|")
+_TABLE_SEPARATOR = re.compile(r"^\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?$")
+_CODE_FENCE = re.compile(r"^(```|~~~)")
+_HORIZONTAL_RULE = re.compile(r"^(?:-{3,}|\*{3,}|_{3,})$")
+
+# Ênfase e código em linha, resolvidos em uma única passada por linha.
+_INLINE = re.compile(
+    r"\*\*(.+?)\*\*|__(.+?)__|`([^`]+)`|\*(?!\s)(.+?)\*|(?<!\w)_(?!\s)(.+?)_(?!\w)"
+)
+
+# Caracteres que exigem Paragraph (marcação ou escape); sem eles a célula pode ser texto simples.
+_MARKUP_CHARS = re.compile(r"[*_`&<>]|- ")
+
+# Limites usados no cálculo da largura das colunas a partir do conteúdo.
+_MIN_COLUMN_CHARS = 6
+_MAX_COLUMN_CHARS = 60
+_CELL_FONT = "Helvetica"
+_CELL_FONT_SIZE = 9
+_CELL_PADDING = 8
+
+
+def _inline_replace(match):
+    bold, bold_alt, code, italic, italic_alt = match.groups()
+    if bold or bold_alt:
+        return f"<b>{bold or bold_alt}</b>"
+    if code:
+        return f'<font face="Courier">{code}</font>'
+    return f"<i>{italic or italic_alt}</i>"
+
+
+def format_inline(text):
+    """
+    Escapa o texto para o mini-HTML do ReportLab e converte negrito, itálico e código.
+    """
+    if not _MARKUP_CHARS.search(text):
+        return text
+    return _INLINE.sub(_inline_replace, escape(text))
+
+
+def split_table_row(line):
+    """
+    Divide uma linha de tabela Markdown em células, preservando células vazias.
+    """
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [cell.strip() for cell in line.split("|")]
+
+
+# --- ESTILOS COMPARTILHADOS ---
+_styles = None
+_table_style = None
+
+
+def get_styles():
+    """
+    Folha de estilos do relatório, criada uma única vez e reutilizada em todos os PDFs.
+    """
+    global _styles
+    if _styles is None:
+        styles = getSampleStyleSheet()
+        styles["h1"].fontName = "Helvetica-Bold"
+        styles["h1"].fontSize = 18
+        styles["h1"].spaceAfter = 14
+
+        styles["h2"].fontName = "Helvetica-Bold"
+        styles["h2"].fontSize = 14
+        styles["h2"].spaceAfter = 10
+
+        styles["h3"].fontName = "Helvetica-Bold"
+        styles["h3"].fontSize = 11
+        styles["h3"].spaceAfter = 6
+
+        styles["Normal"].fontName = "Helvetica"
+        styles["Normal"].fontSize = 10
+        styles["Normal"].leading = 12
+        styles["Normal"].alignment = TA_JUSTIFY
+
+        styles.add(
+            ParagraphStyle(
+                name="CustomListItem",
+                fontName="Helvetica",
+                fontSize=10,
+                leading=12,
+                leftIndent=12,
+            )
+        )
+        styles.add(
+            ParagraphStyle(
+                name="CustomTableText",
+                fontName="Helvetica",
+                fontSize=9,
+                leading=11,
+                alignment=TA_JUSTIFY,
+            )
+        )
+        styles.add(
+            ParagraphStyle(
+                name="CustomCode",
+                fontName="Courier",
+                fontSize=8,
+                leading=10,
+                leftIndent=6,
+                backColor=colors.HexColor("#F7F7F7"),
+            )
+        )
+        _styles = styles
+    return _styles
+
+
+def get_table_style():
+    """
+    Estilo comum a todas as tabelas (cabeçalho destacado e grade leve).
+    """
+    global _table_style
+    if _table_style is None:
+        _table_style = TableStyle(
+            [
+                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#F2F2F2")),
+                ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+                ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+                ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                ("FONTNAME", (0, 1), (-1, -1), _CELL_FONT),
+                ("FONTSIZE", (0, 0), (-1, -1), _CELL_FONT_SIZE),
+                ("LEADING", (0, 0), (-1, -1), 11),
+                ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+                ("BACKGROUND", (0, 1), (-1, -1), colors.white),
+                ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#CCCCCC")),
+                ("LEFTPADDING", (0, 0), (-1, -1), 4),
+                ("RIGHTPADDING", (0, 0), (-1, -1), 4),
+                ("TOPPADDING", (0, 0), (-1, -1), 4),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+            ]
+        )
+    return _table_style
+
+
+def column_widths(rows, total_width):
+    """
+    Distribui a largura útil proporcionalmente ao maior texto de cada coluna.
+    """
+    num_cols = len(rows[0])
+    weights = [_MIN_COLUMN_CHARS] * num_cols
+    for row in rows:
+        for i, cell in enumerate(row):
+            size = min(len(cell), _MAX_COLUMN_CHARS)
+            if size > weights[i]:
+                weights[i] = size
+    total = sum(weights)
+    return [total_width * w / total for w in weights]
+
+
+# --- RENDERIZAÇÃO ---
+class StreamingPdfRenderer:
+    """
+    Converte Markdown em flowables do ReportLab à medida que o texto chega.
+    Cada linha completa (ou tabela/bloco de código completo) vira flowable imediatamente;
+    ao final do stream, `close()` só precisa paginar e gravar o PDF.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.doc = SimpleDocTemplate(
+            filename,
+            pagesize=A4,
+            rightMargin=2 * cm,
+            leftMargin=2 * cm,
+            topMargin=2 * cm,
+            bottomMargin=2 * cm,
+        )
+        self.styles = get_styles()
+        self.story = []
+        self._pending = ""
+        self._table_rows = []
+        self._code_lines = None
+
+    def feed(self, chunk):
+        """
+        Recebe um trecho do stream; apenas a última linha incompleta fica em memória.
+        """
+        if not chunk:
+            return
+        lines = (self._pending + chunk).split("\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self._handle_line(line)
+
+    def close(self):
+        """
+        Processa o restante do buffer e grava o PDF.
+        """
+        if self._pending:
+            self._handle_line(self._pending)
+            self._pending = ""
+        self._flush_code()
+        self._flush_table()
+        # Grava em um arquivo temporário: uma interrupção nunca deixa um PDF pela metade.
+        self.doc.filename = f"{self.filename}.tmp"
+        self.doc.build(self.story)
+        os.replace(self.doc.filename, self.filename)
+        print(f"Relatório salvo como: {self.filename}")
+
+    def _handle_line(self, line):
+        stripped_line = line.strip()
+
+        if self._code_lines is not None:
+            if _CODE_FENCE.match(stripped_line):
+                self._flush_code()
+            else:
+                self._code_lines.append(line)
+            return
+
+        if _TABLE_ROW.match(stripped_line):
+            if not (self._table_rows and _TABLE_SEPARATOR.match(stripped_line)):
+                self._table_rows.append(split_table_row(stripped_line))
+            return
+        self._flush_table()
+
+        styles = self.styles
+        story = self.story
+
+        if not stripped_line:
+            story.append(Spacer(1, 0.1 * cm))
+            return
+
+        if _CODE_FENCE.match(stripped_line):
+            self._code_lines = []
+            return
+
+        heading = _HEADING.match(stripped_line)
+        if heading:
+            level = len(heading.group(1))
+            text = format_inline(heading.group(2).strip())
+            if level <= 2:
+                story.append(Paragraph(text, styles["h1"]))
+                story.append(Spacer(1, 0.2 * cm))
+            elif level == 3:
+                story.append(Paragraph(text, styles["h2"]))
+                story.append(Spacer(1, 0.1 * cm))
+            else:
+                story.append(Paragraph(text, styles["h3"]))
+            return
+
+        if _HORIZONTAL_RULE.match(stripped_line):
+            story.append(Spacer(1, 0.3 * cm))
+            return
+
+        item = _LIST_ITEM.match(stripped_line)
+        if item:
+            story.append(Paragraph(f"- {format_inline(item.group(1))}", styles["CustomListItem"]))
+            return
+
+        story.append(Paragraph(format_inline(stripped_line), styles["Normal"]))
+        story.append(Spacer(1, 0.1 * cm))
+
+    def _flush_table(self):
+        rows = self._table_rows
+        if not rows:
+            return
+        self._table_rows = []
+
+        num_cols = max(len(row) for row in rows)
+        for row in rows:
+            row.extend([""] * (num_cols - len(row)))
+
+        widths = column_widths(rows, self.doc.width)
+        cell_style = self.styles["CustomTableText"]
+        table_data = []
+        for row in rows:
+            cells = []
+            for cell, width in zip(row, widths):
+                # Células curtas e sem marcação dispensam o parser de Paragraph (o trecho mais caro).
+                if not _MARKUP_CHARS.search(cell) and (
+                    stringWidth(cell, _CELL_FONT, _CELL_FONT_SIZE) <= width - _CELL_PADDING
+                ):
+                    cells.append(cell)
+                else:
+                    cells.append(Paragraph(format_inline(cell).replace("- ", "<br/>- "), cell_style))
+            table_data.append(cells)
+
+        table_obj = Table(table_data, colWidths=widths, repeatRows=1)
+        table_obj.setStyle(get_table_style())
+        self.story.append(table_obj)
+        self.story.append(Spacer(1, 0.2 * cm))
+
+    def _flush_code(self):
+        if self._code_lines is None:
+            return
+        code = "\n".join(self._code_lines)
+        self._code_lines = None
+        self.story.append(Preformatted(code, self.styles["CustomCode"]))
+        self.story.append(Spacer(1, 0.1 * cm))
+
+
+def export_to_pdf(text_content, filename="relatorio_financeiro.pdf"):
+    """
+    Converte um texto Markdown (com tabelas e cabeçalhos simples) em um arquivo PDF.
+    """
+    renderer = StreamingPdfRenderer(filename)
+    renderer.feed(text_content)
+    renderer.close()
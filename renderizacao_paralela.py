@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# O ReportLab é importado apenas nos processos de renderização.
+
+
+def _init_worker():
+    # Folha de estilos e TableStyle montados uma única vez por processo, antes do primeiro PDF.
+    from relatorio_pdf import get_styles, get_table_style
+
+    get_styles()
+    get_table_style()
+
+
+def _render(text_content, filename):
+    from relatorio_pdf import export_to_pdf
+
+    export_to_pdf(text_content, filename)
+    return filename
+
+
+class PdfRenderService:
+    """
+    Pool de processos que converte relatórios Markdown já concluídos em PDF, usando todos os
+    núcleos. Cada processo reaproveita seus estilos entre os relatórios.
+    """
+
+    def __init__(self, max_workers=None):
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def submit(self, text_content, filename):
+        """
+        Agenda a geração de `filename` e retorna um Future com o nome do arquivo.
+        """
+        # O texto segue como argumento comum: serializá-lo custa menos que a renderização.
+        return self._executor.submit(_render, text_content, filename)
+
+    def render_all(self, reports):
+        """
+        Gera os PDFs de um iterável de (texto, arquivo), enviando cada relatório assim que ele
+        chega; uma fila pode ser consumida com `render_all(iter(fila.get, None))`.
+        Retorna {arquivo: None ou mensagem de erro}.
+        """
+        futures = {self.submit(text_content, filename): filename for text_content, filename in reports}
+        results = {}
+        for future in as_completed(futures):
+            error = future.exception()
+            results[futures[future]] = None if error is None else f"{type(error).__name__}: {error}"
+        return results
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,427 @@
+import argparse
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from checkpoints import open_run, profile_hash
+from lote import normalize_profile
+from rastreamento import export_trace, tracer
+from sessao_http import connection_stats
+
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8765"))
+# Relatórios gerados ao mesmo tempo; cada worker mantém seus próprios agentes aquecidos.
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "2"))
+# Jobs aguardando um worker; acima disso o serviço responde 503.
+SERVICE_QUEUE_SIZE = int(os.getenv("SERVICE_QUEUE_SIZE", "32"))
+OUTPUT_DIR = os.getenv("SERVICE_OUTPUT_DIR", "relatorios_servico")
+# Jobs concluídos mantidos em memória (os PDFs continuam na pasta de saída).
+MAX_FINISHED_JOBS = 200
+MAX_BODY_BYTES = 64 * 1024
+# Intervalo entre comentários de keep-alive no stream de eventos, em segundos.
+SSE_KEEPALIVE_SECONDS = 15
+
+FINAL_STATUSES = ("concluido", "sem_refinamento", "erro")
+# Spans repassados como progresso: as etapas do pipeline e os streams dos agentes.
+PROGRESS_CATEGORIES = ("etapa", "stream")
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+class Job:
+    """
+    Um pedido de relatório. Os eventos de progresso ficam em ordem em `events` e quem
+    acompanha o stream espera novos eventos pela condição do job.
+    """
+
+    def __init__(self, profile_data, output_dir):
+        self.id = uuid.uuid4().hex[:12]
+        self.profile_data = profile_data
+        self.filename = os.path.join(output_dir, f"relatorio_{self.id}.pdf")
+        self.status = "na_fila"
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.events = []
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in FINAL_STATUSES
+
+    def publish(self, kind, **data):
+        with self._condition:
+            self.events.append({"id": len(self.events), "tipo": kind, **data})
+            self._condition.notify_all()
+
+    def set_status(self, status, **data):
+        self.status = status
+        if self.finished:
+            self.finished_at = time.time()
+        self.publish("status", status=status, **data)
+
+    def wait_events(self, after, timeout):
+        """
+        Eventos com índice >= `after`, esperando até `timeout` segundos se ainda não houver nenhum.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.events) > after or self.finished, timeout)
+            return self.events[after:]
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "nome": self.profile_data.get("nome"),
+            "status": self.status,
+            "erro": self.error,
+            "criado_em": self.created_at,
+            "concluido_em": self.finished_at,
+            "eventos": f"/relatorios/{self.id}/eventos",
+            "pdf": f"/relatorios/{self.id}/pdf",
+        }
+
+
+def default_agent_factory():
+    import agent as agent_module
+
+    return agent_module.create_finance_agent(), agent_module.create_report_refiner_agent()
+
+
+class ReportService:
+    """
+    Fila de relatórios com concorrência limitada: `workers` threads, cada uma com seu par de
+    agentes criado uma única vez (o Agent guarda estado da execução), consomem os jobs e
+    geram os PDFs em `output_dir`. Perfis idênticos ainda na fila ou em execução
+    compartilham o mesmo job.
+    """
+
+    def __init__(
+        self,
+        output_dir=OUTPUT_DIR,
+        workers=SERVICE_WORKERS,
+        queue_size=SERVICE_QUEUE_SIZE,
+        agent_factory=default_agent_factory,
+        use_response_cache=True,
+        compact=None,
+        map_reduce=None,
+        market_tools=None,
+    ):
+        self.output_dir = output_dir
+        self.workers = workers
+        self.agent_factory = agent_factory
+        self.use_response_cache = use_response_cache
+        self.compact = compact
+        self.map_reduce = map_reduce
+        self.market_tools = market_tools
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._ready = threading.Barrier(workers + 1)
+        self.warm_errors = []
+
+    def start(self):
+        """
+        Inicia os workers e espera que todos tenham os agentes e os estilos do PDF prontos.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"servico-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._ready.wait()
+        return self
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _warm(self):
+        # Importações pesadas, estilos do ReportLab e clientes HTTP dos agentes, antes do primeiro pedido.
+        from relatorio_pdf import get_styles, get_table_style
+
+        get_styles()
+        get_table_style()
+        return self.agent_factory()
+
+    def _worker(self):
+        try:
+            agents = self._warm()
+        except Exception as e:
+            self.warm_errors.append(f"{type(e).__name__}: {e}")
+            agents = None
+        self._ready.wait()
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                if agents is None:
+                    agents = self.agent_factory()
+                self._run(job, agents)
+            except Exception as e:
+                job.error = str(e)
+                job.set_status("erro", erro=job.error)
+            finally:
+                key = profile_hash(job.profile_data)
+                with self._lock:
+                    if self._active.get(key) is job:
+                        del self._active[key]
+                self._queue.task_done()
+
+    def _run(self, job, agents):
+        import agent as agent_module
+
+        analysis_agent, refiner_agent = agents
+        job.set_status("executando")
+
+        def progress(phase, event):
+            if phase in ("inicio", "fim") and event["categoria"] in PROGRESS_CATEGORIES:
+                data = {"etapa": event["nome"], "fase": phase}
+                if phase == "fim":
+                    data["duracao_s"] = round(event["duracao_us"] / 1e6, 3)
+                job.publish("etapa", **data)
+
+        with tracer.listen(progress), tracer.span("servico:job", job=job.id):
+            checkpoint = open_run(job.profile_data, job.filename)
+            refinado = agent_module.generate_report(
+                job.profile_data,
+                job.filename,
+                analysis_agent,
+                refiner_agent,
+                self.use_response_cache,
+                self.compact,
+                market_tools=self.market_tools,
+                map_reduce=self.map_reduce,
+                checkpoint=checkpoint,
+            )
+        job.set_status("concluido" if refinado else "sem_refinamento", pdf=f"/relatorios/{job.id}/pdf")
+
+    def submit(self, record):
+        """
+        Valida o perfil (mesmo formato de run_profile_app) e enfileira o job.
+        Levanta ValueError para perfis inválidos e ServiceBusy com a fila cheia.
+        """
+        profile_data = normalize_profile(record)
+        key = profile_hash(profile_data)
+        with self._lock:
+            existing = self._active.get(key)
+            if existing is not None:
+                return existing
+            job = Job(profile_data, self.output_dir)
+            job.publish("status", status=job.status, posicao=self._queue.qsize() + 1)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise ServiceBusy(f"Fila cheia ({self._queue.maxsize} relatórios aguardando).")
+            self._active[key] = job
+            self._jobs[job.id] = job
+            self._prune()
+        return job
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in sorted(finished, key=lambda j: j.finished_at)[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def health(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "workers": self.workers,
+            "na_fila": self._queue.qsize(),
+            "executando": sum(1 for job in jobs if job.status == "executando"),
+            "concluidos": sum(1 for job in jobs if job.finished),
+            "erros_aquecimento": self.warm_errors,
+            "conexoes": connection_stats.snapshot(),
+        }
+
+
+_JOB_PATH = re.compile(r"^/relatorios/([0-9a-f]+)(/eventos|/pdf)?/?$")
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /relatorios                  perfil em JSON -> 202 com o job
+    GET  /relatorios/<id>             situação do job
+    GET  /relatorios/<id>/eventos     progresso por Server-Sent Events até o fim do job
+    GET  /relatorios/<id>/pdf         PDF gerado (409 enquanto o job não terminar)
+    GET  /saude                       workers, fila e jobs
+    """
+
+    server_version = "ConsultorFinanceiro/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        tracer.instant("servico:http", "servico", requisicao=format % args)
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send_json(status, {"erro": message})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/relatorios":
+            return self._send_error(HTTPStatus.NOT_FOUND, "Rota não encontrada.")
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            return self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Perfil grande demais.")
+        try:
+            record = json.loads(self.rfile.read(length) or b"null")
+            if not isinstance(record, dict):
+                raise ValueError("O corpo deve ser um objeto JSON com os campos do perfil.")
+            job = self.service.submit(record)
+        except ServiceBusy as e:
+            return self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"erro": str(e)}, {"Retry-After": "30"})
+        except ValueError as e:
+            return self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+        self._send_json(HTTPStatus.ACCEPTED, job.to_dict(), {"Location": f"/relatorios/{job.id}"})
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/saude":
+            return self._send_json(HTTPStatus.OK, self.service.health())
+        match = _JOB_PATH.match(self.path)
+        job = self.service.get(match.group(1)) if match else None
+        if job is None:
+            return self._send_error(HTTPStatus.NOT_FOUND, "Relatório não encontrado.")
+        if match.group(2) == "/eventos":
+            return self._stream_events(job)
+        if match.group(2) == "/pdf":
+            return self._send_pdf(job)
+        self._send_json(HTTPStatus.OK, job.to_dict())
+
+    def _send_pdf(self, job):
+        if not job.finished:
+            return self._send_error(HTTPStatus.CONFLICT, f"Relatório ainda em andamento ({job.status}).")
+        if job.status == "erro" or not os.path.exists(job.filename):
+            return self._send_error(HTTPStatus.GONE, job.error or "PDF indisponível.")
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(os.path.getsize(job.filename)))
+        self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(job.filename)}"')
+        self.end_headers()
+        with open(job.filename, "rb") as f:
+            while True:
+                block = f.read(64 * 1024)
+                if not block:
+                    break
+                self.wfile.write(block)
+
+    def _stream_events(self, job):
+        """
+        Envia os eventos do job (a partir de Last-Event-ID, ao reconectar) até o status final.
+        """
+        try:
+            after = int(self.headers.get("Last-Event-ID", "-1")) + 1
+        except ValueError:
+            after = 0
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            while True:
+                events = job.wait_events(after, SSE_KEEPALIVE_SECONDS)
+                if not events:
+                    if job.finished:
+                        return
+                    self.wfile.write(b": aguardando\n\n")
+                for event in events:
+                    data = json.dumps(event, ensure_ascii=False)
+                    self.wfile.write(f"id: {event['id']}\nevent: {event['tipo']}\ndata: {data}\n\n".encode("utf-8"))
+                after += len(events)
+                self.wfile.flush()
+                if job.finished and after >= len(job.events):
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class ReportHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        self.service = service
+        super().__init__(address, ReportRequestHandler)
+
+
+def serve(service, host=SERVICE_HOST, port=SERVICE_PORT):
+    """
+    Inicia os workers do serviço e devolve o servidor HTTP (ainda sem atender; use serve_forever).
+    """
+    service.start()
+    return ReportHTTPServer((host, port), service)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serviço HTTP local que gera relatórios com agentes mantidos em memória."
+    )
+    parser.add_argument("--host", default=SERVICE_HOST, help="Endereço de escuta")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help="Porta de escuta")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=SERVICE_WORKERS, help="Relatórios gerados ao mesmo tempo"
+    )
+    parser.add_argument("--fila", type=int, default=SERVICE_QUEUE_SIZE, help="Jobs aguardando na fila")
+    parser.add_argument("-o", "--output-dir", default=OUTPUT_DIR, help="Pasta dos PDFs gerados")
+    parser.add_argument("--no-cache", action="store_true", help="Ignora as respostas dos agentes armazenadas em cache")
+    parser.add_argument("--compact", action="store_true", help="Usa prompts compactos")
+    parser.add_argument("--por-ticker", action="store_true", help="Analisa cada ação separadamente")
+    args = parser.parse_args(argv)
+
+    service = ReportService(
+        args.output_dir,
+        max(1, args.workers),
+        max(1, args.fila),
+        use_response_cache=not args.no_cache,
+        compact=args.compact or None,
+        map_reduce=args.por_ticker or None,
+    )
+    print(f"--- AQUECENDO {service.workers} WORKERS ---")
+    server = serve(service, args.host, args.port)
+    for error in service.warm_errors:
+        print(f"ERRO ao preparar um worker: {error}")
+    print(f"Serviço disponível em http://{args.host}:{server.server_address[1]} (Ctrl+C para encerrar)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nEncerrando o serviço...")
+    finally:
+        server.server_close()
+        service.shutdown()
+        print(connection_stats.summary())
+        export_trace()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+# Conexões simultâneas por host (Gemini e Yahoo Finance) mantidas no pool compartilhado.
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+# Tempo máximo que uma conexão ociosa fica aberta para ser reaproveitada.
+KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "90"))
+# Hosts distintos cujas conexões cada handle do curl guarda (query1/query2/fc/guce do Yahoo).
+CURL_MAX_HOSTS = 8
+
+
+def shared_sessions_enabled():
+    """
+    HTTP_SHARED_SESSIONS=0 volta aos clientes padrão do google-genai e do yfinance.
+    """
+    return os.getenv("HTTP_SHARED_SESSIONS", "1").lower() not in ("0", "false", "nao", "no")
+
+
+class ConnectionStats:
+    """
+    Por host: requisições, conexões novas (com o tempo gasto em TCP + TLS) e conexões reaproveitadas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def record(self, host, new_connection, connect_seconds=0.0):
+        with self._lock:
+            entry = self._hosts.setdefault(host, {"requisicoes": 0, "novas": 0, "reaproveitadas": 0, "conexao_s": 0.0})
+            entry["requisicoes"] += 1
+            if new_connection:
+                entry["novas"] += 1
+                entry["conexao_s"] += connect_seconds
+            else:
+                entry["reaproveitadas"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            hosts = {host: dict(entry) for host, entry in self._hosts.items()}
+        for entry in hosts.values():
+            entry["reuso"] = round(entry["reaproveitadas"] / entry["requisicoes"], 3) if entry["requisicoes"] else 0.0
+            entry["conexao_s"] = round(entry["conexao_s"], 3)
+        return hosts
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+    def summary(self):
+        hosts = self.snapshot()
+        if not hosts:
+            return "Conexões HTTP: nenhuma requisição"
+        parts = [
+            f"{host} {e['requisicoes']} req., {e['novas']} novas, {e['reuso']:.0%} reaproveitadas ({e['conexao_s']:.2f}s em conexão)"
+            for host, e in sorted(hosts.items(), key=lambda item: -item[1]["requisicoes"])
+        ]
+        return "Conexões HTTP: " + "; ".join(parts)
+
+
+connection_stats = ConnectionStats()
+
+
+# --- GEMINI (httpx, usado pelo google-genai) ---
+
+
+class _ConnectionTrace:
+    """
+    Acompanha os eventos de conexão do httpcore de uma requisição: se houve `connect_tcp`,
+    a conexão é nova; senão, veio do pool.
+    """
+
+    def __init__(self):
+        self.started = None
+        self.finished = None
+
+    def observe(self, name):
+        if name == "connection.connect_tcp.started":
+            self.started = time.perf_counter()
+        elif name in ("connection.connect_tcp.complete", "connection.start_tls.complete") and self.started:
+            self.finished = time.perf_counter()
+
+    def record(self, stats, host):
+        connect_seconds = (self.finished or self.started or 0.0) - (self.started or 0.0)
+        stats.record(host, self.started is not None, connect_seconds)
+
+
+def _limits():
+    import httpx
+
+    return httpx.Limits(
+        max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE, keepalive_expiry=KEEPALIVE_SECONDS
+    )
+
+
+def _timeout():
+    import httpx
+
+    # Streams longos do Gemini: leitura generosa, conexão curta.
+    return httpx.Timeout(connect=10.0, read=300.0, write=60.0, pool=60.0)
+
+
+def _counting_transport(stats):
+    import httpx
+
+    class CountingTransport(httpx.BaseTransport):
+        def __init__(self):
+            self._transport = httpx.HTTPTransport(limits=_limits())
+
+        def handle_request(self, request):
+            trace = _ConnectionTrace()
+            request.extensions["trace"] = lambda name, info: trace.observe(name)
+            response = self._transport.handle_request(request)
+            trace.record(stats, request.url.host)
+            return response
+
+        def close(self):
+            self._transport.close()
+
+    return CountingTransport()
+
+
+def _async_counting_transport(stats):
+    import httpx
+
+    class LoopLocalCountingTransport(httpx.AsyncBaseTransport):
+        # As conexões assíncronas pertencem ao event loop em que foram abertas: um pool por loop.
+        def __init__(self):
+            self._transports = weakref.WeakKeyDictionary()
+
+        async def handle_async_request(self, request):
+            loop = asyncio.get_running_loop()
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = httpx.AsyncHTTPTransport(limits=_limits())
+            trace = _ConnectionTrace()
+
+            async def observe(name, info):
+                trace.observe(name)
+
+            request.extensions["trace"] = observe
+            response = await transport.handle_async_request(request)
+            trace.record(stats, request.url.host)
+            return response
+
+        async def aclose(self):
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+            if transport is not None:
+                await transport.aclose()
+
+    return LoopLocalCountingTransport()
+
+
+_lock = threading.Lock()
+_httpx_client = None
+_httpx_async_client = None
+_yfinance_session = None
+
+
+def get_httpx_client():
+    """
+    Cliente httpx compartilhado por todos os modelos Gemini do processo (keep-alive, pool limitado).
+    """
+    global _httpx_client
+    with _lock:
+        if _httpx_client is None:
+            import httpx
+
+            _httpx_client = httpx.Client(
+                transport=_counting_transport(connection_stats), timeout=_timeout(), follow_redirects=True
+            )
+        return _httpx_client
+
+
+def get_httpx_async_client():
+    global _httpx_async_client
+    with _lock:
+        if _httpx_async_client is None:
+            import httpx
+
+            _httpx_async_client = httpx.AsyncClient(
+                transport=_async_counting_transport(connection_stats), timeout=_timeout(), follow_redirects=True
+            )
+        return _httpx_async_client
+
+
+def gemini_http_options(base_url=None):
+    """
+    `http_options` do google-genai com os clientes compartilhados (e, se informado, outro endpoint).
+    """
+    options = {"httpx_client": get_httpx_client(), "httpx_async_client": get_httpx_async_client()}
+    if base_url:
+        options["base_url"] = base_url
+    return options
+
+
+# --- YAHOO FINANCE (curl_cffi, usado pelo yfinance) ---
+
+
+def _pooled_curl_session_class():
+    from curl_cffi import Curl, CurlInfo, CurlOpt
+    from curl_cffi.requests import Session
+
+    class PooledCurlSession(Session):
+        """
+        Session do curl_cffi em que cada requisição pega emprestado um handle de um pool de
+        `pool_size` handles (no lugar de um handle novo por thread). Cada handle guarda suas
+        conexões abertas, que são reaproveitadas por qualquer thread, de qualquer relatório.
+        """
+
+        def __init__(self, pool_size=POOL_SIZE, stats=connection_stats, **kwargs):
+            kwargs.setdefault("curl_infos", [CurlInfo.NUM_CONNECTS, CurlInfo.CONNECT_TIME, CurlInfo.APPCONNECT_TIME])
+            kwargs.setdefault(
+                "curl_options", {CurlOpt.MAXCONNECTS: CURL_MAX_HOSTS, CurlOpt.MAXAGE_CONN: int(KEEPALIVE_SECONDS)}
+            )
+            super().__init__(**kwargs)
+            self.stats = stats
+            self._handles = queue.LifoQueue()
+            self._slots = threading.BoundedSemaphore(pool_size)
+            self._borrowed = threading.local()
+
+        @property
+        def curl(self):
+            handle = getattr(self._borrowed, "handle", None)
+            return handle if handle is not None else super().curl
+
+        def request(self, method, url, *args, **kwargs):
+            with self._slots:
+                try:
+                    handle = self._handles.get_nowait()
+                except queue.Empty:
+                    handle = Curl(debug=self.debug)
+                self._borrowed.handle = handle
+                try:
+                    response = super().request(method, url, *args, **kwargs)
+                finally:
+                    self._borrowed.handle = None
+                    self._handles.put(handle)
+            infos = response.infos
+            if CurlInfo.NUM_CONNECTS in infos:
+                # CONNECT_TIME/APPCONNECT_TIME são acumulados desde o início: o maior é TCP + TLS.
+                connect = max(infos.get(CurlInfo.CONNECT_TIME, 0.0), infos.get(CurlInfo.APPCONNECT_TIME, 0.0))
+                self.stats.record(urlsplit(url).hostname, infos[CurlInfo.NUM_CONNECTS] > 0, connect)
+            return response
+
+        def close(self):
+            while True:
+                try:
+                    self._handles.get_nowait().close()
+                except queue.Empty:
+                    break
+            super().close()
+
+    return PooledCurlSession
+
+
+def create_curl_session(pool_size=POOL_SIZE, stats=connection_stats, **kwargs):
+    return _pooled_curl_session_class()(pool_size=pool_size, stats=stats, **kwargs)
+
+
+def get_yfinance_session():
+    """
+    Session compartilhada do yfinance (o mesmo perfil de navegador da sessão padrão dele).
+    Na primeira chamada, passa a ser a sessão de todas as consultas do yfinance no processo,
+    inclusive as feitas pelas ferramentas do agno.
+    """
+    global _yfinance_session
+    with _lock:
+        if _yfinance_session is None:
+            from yfinance.data import YfData
+
+            _yfinance_session = create_curl_session(impersonate="chrome")
+            YfData(session=_yfinance_session)
+        return _yfinance_session
+
+
+def install_yfinance_session():
+    """
+    Instala a sessão compartilhada no yfinance (se HTTP_SHARED_SESSIONS não a desativar).
+    Chamado por quem consulta o yfinance diretamente ou pelas ferramentas do agno.
+    """
+    if shared_sessions_enabled():
+        get_yfinance_session()
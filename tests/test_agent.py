@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_does_not_load_heavy_dependencies():
+    heavy = ("agno", "reportlab", "yfinance", "dotenv", "numpy", "tkinter")
+    code = f"import sys, agent; print(','.join(m for m in {heavy!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+
+@pytest.fixture
+def agentes_preguicosos(monkeypatch):
+    import agent
+
+    created = []
+    monkeypatch.setattr(agent, "create_finance_agent", lambda: created.append("analise") or "agente de análise")
+    monkeypatch.setattr(agent, "create_report_refiner_agent", lambda: created.append("refino") or "agente de refino")
+    agent.get_finance_agent.cache_clear()
+    agent.get_report_refiner_agent.cache_clear()
+    yield agent, created
+    agent.get_finance_agent.cache_clear()
+    agent.get_report_refiner_agent.cache_clear()
+
+
+def test_module_level_agents_are_built_once_on_first_use(agentes_preguicosos):
+    agent, created = agentes_preguicosos
+    assert created == []
+    assert agent.finance_agent == agent.finance_agent == "agente de análise"
+    assert created == ["analise"]
+    assert agent.report_refiner_agent == "agente de refino"
+    assert created == ["analise", "refino"]
+    with pytest.raises(AttributeError):
+        agent.agente_inexistente
@@ -0,0 +1,69 @@
+import contextlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from analise_por_ticker import TickerAnalysisStore, run_ticker_analyses
+from backends_falsos import FakeAgent, FakeYFinanceTools
+
+
+@pytest.fixture(autouse=True)
+def pasta_temporaria(tmp_path, monkeypatch):
+    # Caches de mercado e de respostas usam caminhos relativos à pasta atual.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("RESPONSE_CACHE_BYPASS", raising=False)
+    return tmp_path
+
+
+def test_concurrent_requests_compute_once_and_release_the_key_lock(tmp_path):
+    store = TickerAnalysisStore(str(tmp_path / "analises"))
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "### ITUB4.SA — análise"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(store.get_or_compute, "ITUB4.SA", "2026-01-02", compute) for _ in range(4)]
+        started.wait(5)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert sorted(cached for _, cached in results) == [False, True, True, True]
+    assert store._key_locks == {}
+    # Outro dia é outra chave.
+    assert store.get_or_compute("ITUB4.SA", "2026-01-03", lambda: "nova") == ("nova", False)
+    assert store._key_locks == {}
+
+
+def test_run_ticker_analyses_reuses_the_day_cache_and_isolates_failures(tmp_path):
+    store = TickerAnalysisStore(str(tmp_path / "analises"))
+    agents = []
+
+    def agent_factory():
+        agent = FakeAgent(lambda prompt: [f"### {prompt.split('ação ')[1].split(' ')[0]} — análise\n"])
+        agents.append(agent)
+        return agent
+
+    tools = FakeYFinanceTools()
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyses = run_ticker_analyses("ITUB4, GOAU4", tools, agent_factory, store)
+        assert analyses == {"ITUB4.SA": "### ITUB4.SA — análise\n", "GOAU4.SA": "### GOAU4.SA — análise\n"}
+        assert len(agents) == 2
+
+        assert run_ticker_analyses("GOAU4 ITUB4", tools, agent_factory, store) == analyses
+        assert len(agents) == 2
+
+        def failing_factory():
+            raise RuntimeError("sem modelo")
+
+        assert run_ticker_analyses("ITUB4, MXRF11", tools, failing_factory, store) == {
+            "ITUB4.SA": analyses["ITUB4.SA"],
+            "MXRF11.SA": None,
+        }
@@ -0,0 +1,59 @@
+import asyncio
+import http.client
+import json
+from datetime import date, timedelta
+from urllib.parse import urlparse
+
+import numpy as np
+
+from backends_falsos import FakeAgent, FakeGeminiServer, FakeYFinanceTools, split_chunks, synthetic_daily_history
+
+
+def test_fake_agent_streams_chunks_with_latency():
+    sleeps = []
+    agent = FakeAgent(["a", "b", "c"], first_chunk_latency=1.0, chunk_latency=0.1, sleep=sleeps.append)
+    assert [chunk.content for chunk in agent.run("prompt", stream=True)] == ["a", "b", "c"]
+    assert sleeps == [1.0, 0.1, 0.1]
+    assert agent.run("outro").content == "abc"
+    assert agent.prompts == ["prompt", "outro"]
+
+    async def collect():
+        return [chunk.content async for chunk in await agent.arun("assíncrono", stream=True)]
+
+    assert asyncio.run(collect()) == ["a", "b", "c"]
+    assert FakeAgent(lambda prompt: [prompt.upper()]).run("eco").content == "ECO"
+    assert "".join(split_chunks("x" * 450, 200)) == "x" * 450 and len(split_chunks("x" * 450, 200)) == 3
+
+
+def test_fake_tools_are_deterministic_and_count_calls():
+    tools = FakeYFinanceTools(payloads={"price": {"ITUB4.SA": "31.5"}})
+    assert tools.get_current_stock_price("itub4.sa") == "31.5"
+    assert tools.get_stock_fundamentals("ITUB4.SA") == FakeYFinanceTools().get_stock_fundamentals("ITUB4.SA")
+    assert json.loads(tools.get_key_financial_ratios("GOAU4.SA"))
+    assert tools.calls == {"price": 1, "fundamentals": 1, "financial_ratios": 1}
+
+
+def test_synthetic_history_covers_business_days_with_dividends():
+    start = date.today() - timedelta(days=365)
+    history = synthetic_daily_history("MXRF11.SA", start, years=1)
+    assert np.is_busday(history["data"]).all()
+    assert history["data"][-1] <= np.datetime64(date.today(), "D")
+    again = synthetic_daily_history("MXRF11.SA", start, years=1)
+    assert np.array_equal(history["fechamento"], again["fechamento"])
+    # FIIs pagam proventos com frequência mensal; ações, trimestral.
+    stock = synthetic_daily_history("ITUB4.SA", start, years=1)
+    assert (history["dividendos"] > 0).sum() > (stock["dividendos"] > 0).sum() > 0
+
+
+def test_fake_gemini_server_streams_sse():
+    with FakeGeminiServer(["Olá, ", "mundo"]) as server:
+        address = urlparse(server.url)
+        connection = http.client.HTTPConnection(address.hostname, address.port, timeout=10)
+        body = json.dumps({"contents": [{"role": "user", "parts": [{"text": "Oi"}]}]})
+        connection.request("POST", "/v1beta/models/gemini:streamGenerateContent?alt=sse", body)
+        response = connection.getresponse()
+        events = [json.loads(line[len(b"data: ") :]) for line in response.read().splitlines() if line]
+    texts = [event["candidates"][0]["content"]["parts"][0]["text"] for event in events]
+    assert texts == ["Olá, ", "mundo"]
+    assert events[-1]["candidates"][0]["finishReason"] == "STOP"
+    assert server.prompts == ["Oi"]
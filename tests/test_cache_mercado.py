@@ -0,0 +1,73 @@
+import json
+
+from cache_mercado import ENDPOINT_TTLS, MarketDataCache
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1_000_000.0
+
+    def __call__(self):
+        return self.agora
+
+
+def _cache(tmp_path, **kwargs):
+    relogio = Relogio()
+    return MarketDataCache(str(tmp_path / "mercado.sqlite3"), clock=relogio, **kwargs), relogio
+
+
+def test_entries_expire_with_the_endpoint_ttl(tmp_path):
+    cache, relogio = _cache(tmp_path)
+    fetched = []
+
+    def fetch():
+        fetched.append(1)
+        return json.dumps({"preco": 30.1 + len(fetched)})
+
+    first = cache.get_or_fetch("itub4.sa", "price", None, fetch)
+    relogio.agora += ENDPOINT_TTLS["price"] - 1
+    assert cache.get_or_fetch("ITUB4.SA", "price", None, fetch) == first
+    relogio.agora += 2
+    assert cache.get_or_fetch("ITUB4.SA", "price", None, fetch) != first
+    assert len(fetched) == 2
+    # Os fundamentos, gravados agora, seguem válidos muito depois do preço expirar.
+    cache.put("ITUB4.SA", "fundamentals", None, "{}")
+    relogio.agora += ENDPOINT_TTLS["price"] * 10
+    assert cache.get_fresh("ITUB4.SA", "fundamentals") == "{}"
+    assert cache.get_fresh("ITUB4.SA", "price") is None
+    assert cache.stats() == {"fundamentals": {"hits": 1, "misses": 0}, "price": {"hits": 1, "misses": 3}}
+
+
+def test_error_payloads_are_not_stored(tmp_path):
+    cache, _ = _cache(tmp_path)
+    assert cache.get_or_fetch("XXXX3.SA", "price", None, lambda: "Error fetching price") == "Error fetching price"
+    assert cache.get("XXXX3.SA", "price") is None
+
+
+def test_params_are_part_of_the_key(tmp_path):
+    cache, _ = _cache(tmp_path)
+    cache.put("ITUB4.SA", "news", {"num_stories": 3}, "tres")
+    cache.put("ITUB4.SA", "news", {"num_stories": 5}, "cinco")
+    assert cache.get_fresh("ITUB4.SA", "news", {"num_stories": 3}) == "tres"
+    assert cache.get_fresh("ITUB4.SA", "news", {"num_stories": 5}) == "cinco"
+
+
+def test_evicts_least_recently_used_entries_above_max_bytes(tmp_path):
+    cache, relogio = _cache(tmp_path, max_bytes=250)
+    for ticker in ("AAAA3.SA", "BBBB3.SA"):
+        cache.put(ticker, "fundamentals", None, "x" * 100)
+        relogio.agora += 1
+    # Lido por último, AAAA3 passa a ser o mais recente; BBBB3 sai quando o limite estoura.
+    assert cache.get("AAAA3.SA", "fundamentals") is not None
+    relogio.agora += 1
+    cache.put("CCCC3.SA", "fundamentals", None, "x" * 100)
+    assert cache.get("BBBB3.SA", "fundamentals") is None
+    assert cache.get("AAAA3.SA", "fundamentals") is not None
+    assert cache.get("CCCC3.SA", "fundamentals") is not None
+
+
+def test_entries_persist_across_instances(tmp_path):
+    cache, _ = _cache(tmp_path)
+    cache.put("ITUB4.SA", "dividends", None, '{"2026-01-02": 0.5}')
+    reopened, _ = _cache(tmp_path)
+    assert reopened.get_fresh("ITUB4.SA", "dividends") == '{"2026-01-02": 0.5}'
@@ -0,0 +1,64 @@
+import contextlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backends_falsos import FakeAgent, FakeYFinanceTools
+from cache_respostas import CachedAgent, ResponseCache, keyed_by
+
+ANALISE = "## Análise\n\n" + "Texto da análise da carteira do investidor. " * 30 + "\n"
+
+
+@pytest.fixture(autouse=True)
+def pasta_temporaria(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("RESPONSE_CACHE_BYPASS", raising=False)
+    monkeypatch.setenv("PIPELINE_CHECKPOINTS", "0")
+    return tmp_path
+
+
+def test_keyed_agent_ignores_live_data_in_the_bound_prompt(tmp_path):
+    agent = CachedAgent(FakeAgent.from_text(ANALISE), ResponseCache(str(tmp_path / "respostas")))
+    material = {"perfil": "abc", "dados_mercado": "2026-10-18"}
+    manha = keyed_by(agent, material, "Preço ITUB4: 30,10")
+    tarde = keyed_by(agent, material, "Preço ITUB4: 30,45")
+    assert manha.cache_key("Preço ITUB4: 30,10") == tarde.cache_key("Preço ITUB4: 30,45")
+    # Outros prompts (ex.: continuação de um stream interrompido) seguem com a chave pelo texto.
+    assert manha.cache_key("continuação") != manha.cache_key("Preço ITUB4: 30,10")
+    assert keyed_by(FakeAgent.from_text(ANALISE), material, "x").__class__ is FakeAgent
+
+
+def test_same_profile_hits_response_cache_on_second_run(tmp_path, perfil):
+    import agent
+
+    analysis_agent = FakeAgent.from_text(ANALISE)
+    refiner_agent = FakeAgent.from_text(ANALISE)
+    for preco in ("30.10", "30.45"):
+        # As cotações mudam entre as execuções, como acontece com o TTL de 30 s do preço.
+        tools = FakeYFinanceTools(payloads={"price": {"ITUB4.SA": preco}})
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent.generate_report(
+                perfil, str(tmp_path / f"relatorio_{preco}.pdf"), analysis_agent, refiner_agent, market_tools=tools
+            )
+
+    assert len(analysis_agent.prompts) == 1
+    assert "30.10" in analysis_agent.prompts[0]
+    assert len(refiner_agent.prompts) == 1
+
+
+def test_shared_cache_counts_hits_and_misses_across_threads(tmp_path):
+    cache = ResponseCache(str(tmp_path / "respostas"))
+    agent = CachedAgent(FakeAgent.from_text(ANALISE), cache)
+    with contextlib.redirect_stdout(io.StringIO()):
+        "".join(chunk.content for chunk in agent.run("prompt", stream=True))
+
+    def read(_):
+        cached = CachedAgent(FakeAgent.from_text("x"), cache)
+        return "".join(chunk.content for chunk in cached.run("prompt", stream=True))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert set(executor.map(read, range(200))) == {ANALISE}
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: (cache.record_hit(), cache.record_miss()), range(5000)))
+    assert (cache.hits, cache.misses) == (5200, 5001)
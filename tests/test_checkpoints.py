@@ -0,0 +1,83 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+
+import pytest
+
+from backends_falsos import FakeAgent, FakeYFinanceTools
+from checkpoints import STAGES, RunCheckpoint, open_run, resume
+
+RELATORIO = "# Relatório\n\n## Análise\n\n" + "Texto da análise da carteira do investidor. " * 40 + "\n"
+
+
+@pytest.fixture(autouse=True)
+def pasta_temporaria(tmp_path, monkeypatch):
+    # Checkpoints, caches e PDFs ficam em caminhos relativos à pasta atual.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PIPELINE_CHECKPOINTS", "1")
+    return tmp_path
+
+
+def test_open_run_separates_jobs_of_the_same_profile(tmp_path, perfil):
+    first = open_run(perfil, "a.pdf", runs_dir=str(tmp_path), job="0001_a")
+    second = open_run(perfil, "b.pdf", runs_dir=str(tmp_path), job="0002_a")
+    assert first.directory != second.directory
+    assert first.id.endswith("-0001_a") and second.id.endswith("-0002_a")
+    # Sem job, o mesmo perfil continua a mesma execução.
+    assert open_run(perfil, runs_dir=str(tmp_path)).id == open_run(perfil, runs_dir=str(tmp_path)).id
+
+
+def test_resume_skips_completed_stages_and_continues_partial_stream(tmp_path, perfil):
+    import agent
+
+    run = open_run(perfil, str(tmp_path / "relatorio.pdf"), runs_dir=str(tmp_path / "execucoes"))
+    run.save("analise", RELATORIO)
+    with run.partial_writer("refinado") as writer:
+        writer.write("# Relatório refinado\n\nInício já gerado. ")
+
+    analysis_agent = FakeAgent.from_text("não deveria ser usado")
+    refiner_agent = FakeAgent.from_text("Continuação do texto refinado.\n")
+    with contextlib.redirect_stdout(io.StringIO()):
+        refinado = resume(
+            run.id,
+            runs_dir=str(tmp_path / "execucoes"),
+            analysis_agent=analysis_agent,
+            refiner_agent=refiner_agent,
+            use_response_cache=False,
+            market_tools=FakeYFinanceTools(),
+        )
+
+    assert refinado
+    assert analysis_agent.prompts == []
+    assert "Início já gerado." in refiner_agent.prompts[0]
+    resumed = RunCheckpoint(run.directory)
+    assert resumed.completed()
+    assert resumed.load("refinado") == "# Relatório refinado\n\nInício já gerado. Continuação do texto refinado.\n"
+    assert os.path.getsize(tmp_path / "relatorio.pdf") > 0
+
+
+def test_async_batch_writes_one_checkpoint_per_job(tmp_path, perfil):
+    from execucao_assincrona import run_batch_async
+
+    entrada = tmp_path / "perfis.jsonl"
+    entrada.write_text("\n".join(json.dumps(perfil, ensure_ascii=False) for _ in range(2)), encoding="utf-8")
+    tools = FakeYFinanceTools()
+
+    def agentes():
+        return FakeAgent.from_text(RELATORIO), FakeAgent.from_text(RELATORIO)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        entries = asyncio.run(
+            run_batch_async(
+                str(entrada), str(tmp_path / "saida"), 2, 1, False, agent_factory=agentes, market_tools=tools
+            )
+        )
+
+    assert [e["status"] for e in entries] == ["ok", "ok"]
+    assert len({e["execucao"] for e in entries}) == 2
+    for entry in entries:
+        run = RunCheckpoint(os.path.join(".cache", "execucoes", entry["execucao"]))
+        assert run.completed()
+        assert all(run.done(stage) for stage in STAGES)
@@ -0,0 +1,50 @@
+import numpy as np
+
+from backends_falsos import FakeYFinanceTools
+from comparacao_setorial import (
+    METRICS,
+    build_sector_comparison,
+    format_comparison_markdown,
+    peer_groups,
+    score_peers,
+)
+
+PL, ROE = 0, 2
+
+
+def test_peer_groups_complete_each_sector_with_index_leaders():
+    groups = peer_groups(["ITUB4.SA", "bbdc4", "ZZZZ3"], max_peers=3)
+    assert groups["Bancos"] == ["ITUB4.SA", "BBDC4.SA", "BBAS3.SA", "SANB11.SA", "BPAC11.SA"]
+    assert groups[None] == ["ZZZZ3.SA"]
+
+
+def test_scores_follow_metric_direction_and_skip_missing_values():
+    values = np.full((3, len(METRICS)), np.nan)
+    values[:, PL] = [5.0, 10.0, -3.0]  # P/L negativo (prejuízo) fica fora da nota
+    values[:, ROE] = [0.20, 0.10, np.nan]
+    z, ranks, composite, overall = score_peers(values)
+
+    # Colunas das notas: só as métricas com direção (P/L, P/VP e ROE são as três primeiras).
+    # Menor P/L é melhor; maior ROE é melhor.
+    assert list(ranks[:2, PL]) == [1.0, 2.0] and np.isnan(ranks[2, PL])
+    assert list(ranks[:2, ROE]) == [1.0, 2.0]
+    assert z[0, PL] > 0 > z[1, PL] and z[0, ROE] > 0 > z[1, ROE]
+    assert np.isnan(composite[2]) and np.isnan(overall[2])
+    assert list(overall[:2]) == [1.0, 2.0]
+    # A entrada não é alterada.
+    assert values[2, PL] == -3.0
+
+
+def test_comparison_table_from_fake_ratios():
+    payloads = {"financial_ratios": {"BBAS3.SA": "Error fetching ratios"}}
+    comparison = build_sector_comparison("ITUB4", FakeYFinanceTools(payloads=payloads), max_peers=2)
+    (group,) = comparison
+    assert group["setor"] == "Bancos"
+    assert group["tickers"] == ["ITUB4.SA", "BBDC4.SA", "BBAS3.SA"]
+    assert group["interesse"] == [True, False, False]
+    assert group["indisponiveis"] == ["BBAS3.SA"]
+    assert np.isnan(group["posicao"][2]) and sorted(group["posicao"][:2]) == [1.0, 2.0]
+
+    table = format_comparison_markdown(comparison)
+    assert "**Bancos**" in table and "| **ITUB4** |" in table
+    assert "Sem dados disponíveis: BBAS3.SA" in table
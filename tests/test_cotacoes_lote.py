@@ -0,0 +1,132 @@
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+from backends_falsos import FakeYFinanceTools, synthetic_daily_history
+from cache_mercado import MarketDataCache
+from cotacoes_lote import BulkQuoteFetcher, format_quotes_table, normalize_symbols, summarize_quotes
+
+
+def test_normalize_symbols_dedups_and_adds_the_b3_suffix():
+    assert normalize_symbols("itub4, GOAU4 itub4 MXRF11") == ["ITUB4.SA", "GOAU4.SA", "MXRF11.SA"]
+    assert normalize_symbols(["AAPL", "itub4.sa", "ITUB4"]) == ["AAPL", "ITUB4.SA"]
+    assert normalize_symbols(None) == []
+
+
+def test_summarize_quotes():
+    columns = {
+        "data": np.arange("2024-01-01", "2025-01-03", dtype="datetime64[D]"),
+    }
+    n = len(columns["data"])
+    columns["fechamento"] = np.linspace(10.0, 12.0, n)
+    columns["maxima"] = columns["fechamento"] + 0.5
+    columns["minima"] = columns["fechamento"] - 0.5
+    columns["dividendos"] = np.zeros(n)
+    columns["dividendos"][[1, 300]] = [0.4, 0.6]
+
+    resumo = summarize_quotes(columns)
+
+    assert resumo["preco"] == 12.0
+    assert resumo["var_dia"] > 0
+    assert 0.15 < resumo["var_12m"] < 0.2
+    # O provento de 2024-01-02 fica fora da janela de 12 meses.
+    assert resumo["proventos_12m"] == 0.6
+    assert resumo["ultimo_provento"] == [str(columns["data"][300]), 0.6]
+    assert resumo["maxima_52s"] == 12.5
+
+    assert summarize_quotes({"data": columns["data"][:2], "fechamento": [np.nan, np.nan], "dividendos": [0, 0]}) == {}
+
+
+def test_one_batch_per_call_and_rows_stored_in_the_market_cache(tmp_path):
+    tools = FakeYFinanceTools()
+    tools.cache = MarketDataCache(str(tmp_path / "mercado.sqlite3"))
+    fetcher = BulkQuoteFetcher()
+
+    tickers, rows = fetcher.fetch("ITUB4 GOAU4 itub4", tools)
+
+    assert tickers == ["ITUB4.SA", "GOAU4.SA"]
+    assert tools.calls["quotes_batch"] == 1
+    assert fetcher.batches == 1
+    assert rows["ITUB4.SA"]["preco"] is not None
+    assert rows["ITUB4.SA"]["pl"] is not None
+
+    # Segunda chamada: tudo do cache, sem novo download nem indicadores.
+    ratios = tools.calls["financial_ratios"]
+    _, cached = fetcher.fetch(["GOAU4", "ITUB4"], tools)
+    assert cached == rows
+    assert tools.calls["quotes_batch"] == 1
+    assert tools.calls["financial_ratios"] == ratios
+    assert fetcher.batches == 1
+
+
+def test_concurrent_calls_wait_for_the_fetch_in_progress():
+    tools = FakeYFinanceTools()
+    started, release = threading.Event(), threading.Event()
+
+    def download(tickers, start):
+        started.set()
+        release.wait(5)
+        return {ticker: synthetic_daily_history(ticker, start) for ticker in tickers}
+
+    tools.download_quotes = download
+    fetcher = BulkQuoteFetcher()
+    results = {}
+
+    def fetch(name, symbols):
+        results[name] = fetcher.fetch(symbols, tools)
+
+    first = threading.Thread(target=fetch, args=("primeira", ["ITUB4", "GOAU4"]))
+    first.start()
+    assert started.wait(5)
+    second = threading.Thread(target=fetch, args=("segunda", ["GOAU4", "ITUB4"]))
+    second.start()
+    # A segunda chamada encontra os dois tickers em andamento e espera por eles.
+    deadline = time.monotonic() + 5
+    while fetcher.merged < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert fetcher.merged == 2
+    assert fetcher.batches == 1
+    assert results["segunda"][0] == ["GOAU4.SA", "ITUB4.SA"]
+    assert results["segunda"][1] == results["primeira"][1]
+    assert fetcher._inflight == {}
+
+
+def test_download_error_keeps_the_ratios_and_clears_the_inflight_entries():
+    tools = FakeYFinanceTools()
+
+    def download(tickers, start):
+        raise RuntimeError("yahoo indisponível")
+
+    tools.download_quotes = download
+    fetcher = BulkQuoteFetcher()
+
+    _, rows = fetcher.fetch(["ITUB4"], tools)
+
+    assert "preco" not in rows["ITUB4.SA"]
+    assert rows["ITUB4.SA"]["pl"] is not None
+    assert fetcher._inflight == {}
+
+
+def test_format_quotes_table_lists_tickers_without_data():
+    rows = {
+        "ITUB4.SA": {
+            "nome": "Itaú Unibanco",
+            "preco": 32.0,
+            "proventos_12m": 1.6,
+            "ultimo_provento": ["2024-12-02", 0.2],
+        },
+        "GOAU4.SA": None,
+    }
+
+    table = format_quotes_table(["ITUB4.SA", "GOAU4.SA"], rows)
+
+    assert table.startswith(f"Resumo de 2 ativos (Yahoo Finance, {date.today():%Y-%m-%d}).")
+    linha = next(line for line in table.splitlines() if line.startswith("| ITUB4 |"))
+    assert "Itaú Unibanco" in linha and "2024-12-02" in linha
+    assert table.rstrip().endswith("Sem dados disponíveis: GOAU4.SA")
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from dividendos import compute_dividend_metrics, dividend_path_requested, project_passive_income
+
+AS_OF = np.datetime64("2026-06-15")
+
+
+def _monthly_history(first_month, payment, price=10.0):
+    """
+    Um pregão por mês, do mês `first_month` ao de AS_OF, com `payment(meses_antes_de_as_of)` de proventos.
+    """
+    months = np.arange(np.datetime64(first_month, "M"), AS_OF.astype("datetime64[M]") + 1)
+    dates = months.astype("datetime64[D]") + 1
+    before = (AS_OF.astype("datetime64[M]") - months).astype(int)
+    return {
+        "data": dates,
+        "fechamento": np.full(len(dates), price),
+        "dividendos": np.array([payment(m) for m in before], dtype=float),
+    }
+
+
+def test_ttm_yield_and_cagr_on_a_growing_monthly_payer():
+    # Cresce 10% a cada janela de 12 meses terminada no mês de AS_OF.
+    growing = _monthly_history("2020-01", lambda m: 0.1 * 1.1 ** (4 - m // 12) if m < 60 else 0.05)
+    # Pagamentos trimestrais constantes, com histórico de apenas 2 anos.
+    quarterly = _monthly_history("2024-07", lambda m: 0.3 if m % 3 == 0 else 0.0, price=20.0)
+    without = _monthly_history("2020-01", lambda m: 0.0)
+    metrics = compute_dividend_metrics({"AAAA11.SA": growing, "BBBB3.SA": quarterly, "CCCC3.SA": without}, AS_OF)
+
+    assert metrics["mes"] == "2026-06"
+    assert metrics["proventos_12m"] == pytest.approx([12 * 0.1 * 1.1**4, 4 * 0.3, 0.0])
+    assert metrics["dy_12m"] == pytest.approx([12 * 0.1 * 1.1**4 / 10, 4 * 0.3 / 20, 0.0])
+    assert metrics["cagr"][0] == pytest.approx(0.10) and metrics["cagr_anos"][0] == 4
+    # Só dois anos completos de histórico: CAGR de 1 ano, sem crescimento.
+    assert metrics["cagr"][1] == pytest.approx(0.0) and metrics["cagr_anos"][1] == 1
+    assert np.isnan(metrics["cagr"][2]) and metrics["cagr_anos"][2] == 0
+
+    # Regularidade conta apenas os trimestres cobertos pelo histórico.
+    assert list(metrics["regularidade"]) == pytest.approx([1.0, 1.0, 0.0])
+    assert list(metrics["meses_sem_pagamento"]) == [0, 8, 12]
+    assert metrics["meses_desde_ultimo"][:2].tolist() == [0, 0] and np.isnan(metrics["meses_desde_ultimo"][2])
+
+
+def test_passive_income_uses_quantity_or_estimates_it():
+    history = _monthly_history("2024-07", lambda m: 0.1)
+    metrics = compute_dividend_metrics({"AAAA11.SA": history, "BBBB11.SA": history, "CCCC11.SA": history}, AS_OF)
+    positions = {
+        "AAAA11.SA": {"quantidade": 100, "preco_medio": 8.0},
+        "BBBB11.SA": {"investido": 1000.0},
+    }
+    income = project_passive_income(metrics, positions)
+    assert income["quantidade"][:2].tolist() == [100, 100]  # 1000 / último fechamento de 10
+    assert income["estimada"].tolist() == [False, True, True]
+    assert income["yield_on_cost"][0] == pytest.approx(1.2 / 8.0) and np.isnan(income["yield_on_cost"][1])
+    assert income["renda_mensal"][:2] == pytest.approx([10.0, 10.0])
+    assert income["renda_mensal_total"] == pytest.approx(20.0) and income["posicoes"] == 2
+
+
+def test_dividend_path_follows_the_income_preference(perfil):
+    assert dividend_path_requested(dict(perfil, pref_renda="Dividendo"))
+    assert dividend_path_requested(dict(perfil, pref_renda="Ambos"))
+    assert not dividend_path_requested(dict(perfil, pref_renda="Valorização"))
@@ -0,0 +1,76 @@
+import asyncio
+import contextlib
+import io
+import os
+import threading
+
+import pytest
+
+from backends_falsos import FakeAgent, FakeYFinanceTools
+from checkpoints import STAGES, open_run
+
+RELATORIO = "# Relatório\n\n## Análise\n\n" + "Texto da análise da carteira do investidor. " * 40 + "\n"
+
+
+@pytest.fixture(autouse=True)
+def pasta_temporaria(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PIPELINE_CHECKPOINTS", "1")
+    monkeypatch.delenv("RESPONSE_CACHE_BYPASS", raising=False)
+    return tmp_path
+
+
+def test_stream_async_collects_chunks():
+    from execucao_assincrona import run_agent_stream_async
+
+    received = []
+    texto = asyncio.run(run_agent_stream_async(FakeAgent(["Olá", " ", " mundo"]), "prompt", received.append))
+    # Trechos só com espaços (keep-alive do stream) são descartados.
+    assert texto == "Olá mundo"
+    assert received == ["Olá", " mundo"]
+
+
+def test_checkpoint_io_stays_off_the_event_loop(tmp_path, perfil, monkeypatch):
+    import agent
+    from execucao_assincrona import generate_report_async
+
+    run = open_run(perfil, str(tmp_path / "relatorio.pdf"), runs_dir=str(tmp_path / "execucoes"))
+    threads = {}
+    checkpointed, mark = agent._checkpointed, run.mark
+
+    def record(stage):
+        threads[stage] = threading.current_thread()
+
+    def recording_checkpointed(checkpoint, stage, build):
+        record(stage)
+        return checkpointed(checkpoint, stage, build)
+
+    def recording_mark(stage, **data):
+        record(stage)
+        return mark(stage, **data)
+
+    monkeypatch.setattr(agent, "_checkpointed", recording_checkpointed)
+    monkeypatch.setattr(run, "mark", recording_mark)
+
+    async def main():
+        loop_thread = threading.current_thread()
+        refinado = await generate_report_async(
+            perfil,
+            str(tmp_path / "relatorio.pdf"),
+            FakeAgent.from_text(RELATORIO),
+            FakeAgent.from_text(RELATORIO),
+            use_response_cache=False,
+            market_tools=FakeYFinanceTools(),
+            checkpoint=run,
+        )
+        return refinado, loop_thread
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        refinado, loop_thread = asyncio.run(main())
+
+    assert refinado
+    # O perfil é gravado por open_run, antes do event loop.
+    assert set(threads) == set(STAGES) - {"perfil"}
+    assert all(thread is not loop_thread for thread in threads.values())
+    assert all(run.done(stage) for stage in STAGES)
+    assert os.path.getsize(tmp_path / "relatorio.pdf") > 0
@@ -0,0 +1,64 @@
+import numpy as np
+
+from backends_falsos import synthetic_daily_history
+from historico_precos import REFRESH_SECONDS, PriceHistoryStore
+
+
+class Fonte:
+    """
+    Histórico sintético que pode anunciar um desdobramento no trecho novo e encurtar a recarga.
+    """
+
+    def __init__(self):
+        self.desdobramento = False
+        self.anos = 6
+
+    def __call__(self, ticker, start):
+        history = synthetic_daily_history(ticker, start, years=self.anos)
+        if self.desdobramento:
+            history["desdobramentos"] = np.ones(len(history["data"]))
+        return history
+
+
+def _store(tmp_path):
+    clock = [1_000_000.0]
+    fonte = Fonte()
+    store = PriceHistoryStore(str(tmp_path), fetch=fonte, clock=lambda: clock[0])
+    return store, fonte, clock
+
+
+def test_incremental_update_keeps_generation(tmp_path):
+    store, _, clock = _store(tmp_path)
+    assert store.update("ITUB4.SA") == "completa"
+    rows = store.meta("ITUB4.SA")["linhas"]
+    clock[0] += REFRESH_SECONDS + 1
+    assert store.update("ITUB4.SA") == "incremental"
+    assert store.meta("ITUB4.SA")["geracao"] == 1
+    assert store.meta("ITUB4.SA")["linhas"] == rows
+
+
+def test_reload_after_split_does_not_shrink_files_under_readers(tmp_path):
+    store, fonte, clock = _store(tmp_path)
+    store.update("ITUB4.SA")
+    old_meta = store.meta("ITUB4.SA")
+    old = store.load("ITUB4.SA")
+    old_close = np.array(old["fechamento"])
+
+    # Recarga completa com menos pregões que os gravados.
+    fonte.desdobramento, fonte.anos = True, 1
+    clock[0] += REFRESH_SECONDS + 1
+    assert store.update("ITUB4.SA") == "completa"
+    new_meta = store.meta("ITUB4.SA")
+    assert new_meta["geracao"] == old_meta["geracao"] + 1
+    assert new_meta["linhas"] < old_meta["linhas"]
+
+    # Quem já tinha o memmap ou o meta antigo continua lendo a geração anterior inteira.
+    np.testing.assert_array_equal(old["fechamento"], old_close)
+    assert len(store._open_columns("ITUB4.SA", old_meta)["fechamento"]) == old_meta["linhas"]
+    assert len(store.load("ITUB4.SA")["fechamento"]) == new_meta["linhas"]
+
+    # Uma nova recarga remove a geração de antes da anterior.
+    clock[0] += REFRESH_SECONDS + 1
+    store.update("ITUB4.SA")
+    assert not (tmp_path / "ITUB4.SA" / f"fechamento.{old_meta['geracao']}.bin").exists()
+    assert (tmp_path / "ITUB4.SA" / f"fechamento.{new_meta['geracao']}.bin").exists()
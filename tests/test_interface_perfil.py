@@ -0,0 +1,51 @@
+import pytest
+
+from interface_perfil import ANALYSIS_STREAM, EXPECTED_ANALYSIS_TOKENS, REFINER_STREAM, ProgressEstimate
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def _event(nome, categoria="stream", **atributos):
+    return {"nome": nome, "categoria": categoria, "atributos": atributos}
+
+
+def test_progress_estimate_follows_the_streams():
+    relogio = Relogio()
+    progress = ProgressEstimate(clock=relogio)
+    progress.update("inicio", _event("projecao_objetivos", "etapa"))
+    assert progress.stage == "Simulando os objetivos (Monte Carlo)"
+    assert progress.eta_seconds() is None and progress.fraction() is None
+
+    progress.update("inicio", _event(ANALYSIS_STREAM))
+    relogio.agora += 10
+    progress.update("progresso", _event(ANALYSIS_STREAM, trecho="x" * 4000))  # ~1000 tokens em 10 s
+    assert progress.tokens_per_second() == pytest.approx(100)
+    remaining = EXPECTED_ANALYSIS_TOKENS - 1000 + int(EXPECTED_ANALYSIS_TOKENS * 0.8)
+    assert progress.remaining_tokens() == remaining
+    assert progress.eta_seconds() == pytest.approx(remaining / 100)
+
+    relogio.agora += 10
+    progress.update("progresso", _event(ANALYSIS_STREAM, trecho="x" * 4000))
+    progress.update("fim", _event(ANALYSIS_STREAM))
+    # Com o rascunho pronto, só falta o refinamento (~80% do tamanho dele).
+    assert progress.remaining_tokens() == 1600
+
+    progress.update("inicio", _event(REFINER_STREAM))
+    assert progress.stage == "Refinando o relatório final"
+    relogio.agora += 8
+    progress.update("progresso", _event(REFINER_STREAM, trecho="x" * 6400))
+    progress.update("fim", _event(REFINER_STREAM))
+    assert progress.eta_seconds() == 0.0 and progress.fraction() == 1.0
+
+
+def test_progress_estimate_has_no_eta_outside_the_two_stream_flow():
+    progress = ProgressEstimate(clock=Relogio())
+    progress.update("inicio", _event("stream:secao_carteira"))
+    assert progress.stage == "Escrevendo a seção 'carteira'"
+    assert progress.remaining_tokens() is None
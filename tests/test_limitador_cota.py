@@ -0,0 +1,109 @@
+import pytest
+from agno.exceptions import ModelProviderError
+from google.genai.errors import ClientError
+
+import limitador_cota
+from limitador_cota import QuotaLimiter, _backoff_delay, is_quota_error, run_with_quota_retry
+
+
+class Relogio:
+    """
+    Relógio manual: `sleep` apenas avança o tempo e registra a espera.
+    """
+
+    def __init__(self):
+        self.agora = 1000.0
+        self.esperas = []
+
+    def __call__(self):
+        return self.agora
+
+    def sleep(self, seconds):
+        self.esperas.append(seconds)
+        self.agora += seconds
+
+
+def _erro_de_cota(retry_delay=None):
+    """
+    Erro como o agno o entrega: ModelProviderError com o ClientError do google-genai em __cause__.
+    """
+    details = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": retry_delay}] if retry_delay else []
+    body = {"error": {"code": 429, "message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED", "details": details}}
+    cause = ClientError(429, body)
+    try:
+        raise ModelProviderError("<Response [429 Too Many Requests]>", status_code=429) from cause
+    except ModelProviderError as e:
+        return e
+
+
+def _limiter(rpm, tpm, relogio):
+    return QuotaLimiter({"modelo": (rpm, tpm)}, window=60.0, clock=relogio, sleep=relogio.sleep)
+
+
+def test_requests_wait_only_until_the_window_frees_a_slot():
+    relogio = Relogio()
+    limiter = _limiter(2, 1_000_000, relogio)
+    assert limiter.acquire("modelo") == 0
+    relogio.agora += 10
+    assert limiter.acquire("modelo") == 0
+    # A terceira requisição espera a primeira sair da janela de 60 s (50 s depois).
+    assert limiter.acquire("modelo") == pytest.approx(50)
+    assert limiter.utilization("modelo")[0] == pytest.approx(1.0)
+
+
+def test_tokens_count_against_the_window():
+    relogio = Relogio()
+    limiter = _limiter(100, 1000, relogio)
+    limiter.acquire("modelo", 800)
+    relogio.agora += 5
+    limiter.record_usage("modelo", 100)
+    # 900 usados: 400 novos só cabem quando a primeira requisição (800) sair da janela.
+    assert limiter.acquire("modelo", 400) == pytest.approx(55)
+    assert limiter.utilization("modelo")[1] == pytest.approx(0.5)
+
+
+def test_recognizes_agno_quota_errors():
+    assert is_quota_error(_erro_de_cota())
+    # Mesmo sem status_code, o ClientError original identifica o estouro de cota.
+    try:
+        raise ModelProviderError("<Response [429 Too Many Requests]>") from _erro_de_cota().__cause__
+    except ModelProviderError as e:
+        assert is_quota_error(e)
+    assert not is_quota_error(ModelProviderError("Internal error", status_code=500))
+    assert not is_quota_error(ValueError("erro de rede"))
+
+
+def test_backoff_is_bounded_and_respects_retry_delay(monkeypatch):
+    monkeypatch.setattr(limitador_cota.random, "uniform", lambda a, b: b)
+    assert _backoff_delay(0, _erro_de_cota(), 2.0, 60.0) == 2.0
+    assert _backoff_delay(3, _erro_de_cota(), 2.0, 60.0) == 16.0
+    assert _backoff_delay(10, _erro_de_cota(), 2.0, 60.0) == 60.0
+    # retryDelay vem dos detalhes do ClientError, não da mensagem do ModelProviderError.
+    assert _backoff_delay(0, _erro_de_cota("7s"), 2.0, 60.0) == 8.0
+
+
+def test_retry_on_quota_errors_only():
+    chamadas, esperas = [], []
+
+    def instavel():
+        chamadas.append(1)
+        if len(chamadas) < 3:
+            raise _erro_de_cota()
+        return "ok"
+
+    assert run_with_quota_retry(instavel, sleep=esperas.append) == "ok"
+    assert len(chamadas) == 3 and len(esperas) == 2
+
+    def quebrado():
+        raise ModelProviderError("Internal error", status_code=500)
+
+    with pytest.raises(ModelProviderError):
+        run_with_quota_retry(quebrado, sleep=esperas.append)
+    assert len(esperas) == 2
+
+    def sempre_sem_cota():
+        raise _erro_de_cota()
+
+    with pytest.raises(ModelProviderError):
+        run_with_quota_retry(sempre_sem_cota, max_retries=2, sleep=esperas.append)
+    assert len(esperas) == 4
@@ -0,0 +1,78 @@
+import contextlib
+import csv
+import io
+import json
+import threading
+
+import pytest
+
+from lote import MANIFEST_NAME, load_profiles, normalize_profile, run_batch
+
+
+@pytest.fixture(autouse=True)
+def pasta_temporaria(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PIPELINE_CHECKPOINTS", "0")
+    return tmp_path
+
+
+def test_normalize_profile_applies_the_form_rules(perfil):
+    profile = normalize_profile(dict(perfil, renda_mensal="8000,50", gastos_fixos=4500, nome="  Ana  "))
+    assert profile["renda_mensal"] == 8000.5 and profile["gastos_fixos"] == 4500.0
+    assert profile["nome"] == "Ana"
+    assert normalize_profile({"nome": "Ana", "obj_longo": "Aposentar"})["reservas_emergencia"] == 0.0
+    with pytest.raises(ValueError, match="renda_mensal"):
+        normalize_profile(dict(perfil, renda_mensal="muita"))
+    with pytest.raises(ValueError, match="obj_longo"):
+        normalize_profile(dict(perfil, obj_longo=""))
+
+
+def test_load_profiles_reads_jsonl_and_csv(tmp_path, perfil):
+    jsonl = tmp_path / "perfis.jsonl"
+    jsonl.write_text(json.dumps(perfil, ensure_ascii=False) + "\n\n", encoding="utf-8")
+    assert load_profiles(str(jsonl)) == [perfil]
+
+    arquivo_csv = tmp_path / "perfis.csv"
+    with open(arquivo_csv, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(perfil))
+        writer.writeheader()
+        writer.writerow(perfil)
+    assert normalize_profile(load_profiles(str(arquivo_csv))[0]) == normalize_profile(perfil)
+
+
+def test_run_batch_writes_one_pdf_per_profile_and_a_manifest(tmp_path, perfil, monkeypatch):
+    import agent
+
+    agents_by_thread = {}
+
+    def create_agent():
+        agents_by_thread.setdefault(threading.get_ident(), []).append(object())
+        return agents_by_thread[threading.get_ident()][-1]
+
+    def generate_report(profile_data, filename, *args, **kwargs):
+        if profile_data["nome"] == "Falha":
+            raise RuntimeError("modelo indisponível")
+        with open(filename, "wb") as f:
+            f.write(b"%PDF-1.4")
+        return profile_data["nome"] != "Sem Refino"
+
+    monkeypatch.setattr(agent, "create_finance_agent", create_agent)
+    monkeypatch.setattr(agent, "create_report_refiner_agent", create_agent)
+    monkeypatch.setattr(agent, "generate_report", generate_report)
+
+    records = [perfil, dict(perfil, nome="Falha"), dict(perfil, nome="Sem Refino"), dict(perfil, nome="")]
+    entrada = tmp_path / "perfis.jsonl"
+    entrada.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in records), encoding="utf-8")
+    with contextlib.redirect_stdout(io.StringIO()):
+        entries = run_batch(str(entrada), str(tmp_path / "saida"), workers=2, use_response_cache=False)
+
+    assert [e["status"] for e in entries] == ["ok", "erro", "sem_refinamento", "erro"]
+    assert entries[0]["pdf"].endswith(f"0001_{perfil['nome'].replace(' ', '_')}.pdf")
+    assert entries[1]["erro"] == "modelo indisponível"
+    assert "nome" in entries[3]["erro"]
+    # Cada thread do pool cria seu par de agentes uma única vez.
+    assert all(len(agents) == 2 for agents in agents_by_thread.values())
+
+    manifest = json.loads((tmp_path / "saida" / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert manifest["total"] == 4 and manifest["sucesso"] == 2
+    assert manifest["relatorios"] == entries
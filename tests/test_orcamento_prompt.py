@@ -0,0 +1,46 @@
+import pytest
+
+from limitador_cota import estimate_tokens
+from orcamento_prompt import PromptBudget, PromptBudgetExceeded, trim_to_tokens
+
+
+def _document(sections=30, lines=12):
+    parts = []
+    for i in range(sections):
+        parts.append(f"## Seção {i}")
+        parts += [f"Linha {j} da seção {i} com algum texto de análise financeira." for j in range(lines)]
+    return "\n".join(parts) + "\n"
+
+
+def test_trim_keeps_short_text():
+    text = "## Título\nConteúdo curto.\n"
+    assert trim_to_tokens(text, 100) == text
+
+
+@pytest.mark.parametrize("max_tokens", [2000, 500, 100, 20, 0])
+def test_trim_fits_budget(max_tokens):
+    trimmed = trim_to_tokens(_document(), max_tokens)
+    assert trimmed == "" or estimate_tokens(trimmed) <= max_tokens
+
+
+def test_trim_keeps_headings_while_they_fit():
+    trimmed = trim_to_tokens(_document(sections=5), 150)
+    assert all(f"## Seção {i}" in trimmed for i in range(5))
+    assert "[...]" in trimmed
+
+
+def test_enforce_trims_until_budget_fits():
+    budget = PromptBudget("analise", budget=300)
+    budget.add("instrucoes", "x" * 400, in_prompt=False)
+    budget.add("dados", _document(), trimmable=True)
+    budget.add("contexto", _document(sections=10), trimmable=True)
+    budget.enforce()
+    assert budget.total_tokens() <= 300
+
+
+def test_enforce_raises_when_fixed_parts_exceed_budget():
+    budget = PromptBudget("analise", budget=100)
+    budget.add("instrucoes", "x" * 800)
+    budget.add("dados", _document(), trimmable=True)
+    with pytest.raises(PromptBudgetExceeded):
+        budget.enforce()
@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from backends_falsos import synthetic_daily_history
+from otimizador_carteira import (
+    CLASS_BOUNDS,
+    capped_risk_parity,
+    covariance_from_histories,
+    emergency_reserve,
+    mean_variance,
+    optimize_allocation,
+    risk_parity,
+)
+
+
+def _random_cov(n, seed=0):
+    rng = np.random.default_rng(seed)
+    factors = rng.standard_normal((n, n + 5)) * 0.1
+    return factors @ factors.T + np.diag(rng.uniform(0.01, 0.05, n))
+
+
+def _histories(tickers, years=4):
+    start = date.today() - timedelta(days=365 * years)
+    return {ticker: synthetic_daily_history(ticker, start, years=years) for ticker in tickers}
+
+
+def test_risk_parity_equalizes_risk_contributions():
+    cov = _random_cov(8)
+    weights = risk_parity(cov)
+    contributions = weights * (cov @ weights)
+    assert weights.sum() == pytest.approx(1.0)
+    np.testing.assert_allclose(contributions, contributions.mean(), rtol=1e-6)
+
+
+def test_capped_risk_parity_respects_the_cap():
+    cov = np.diag([0.01, 0.04, 0.09, 0.16, 0.25])
+    weights = capped_risk_parity(cov, 0.25)
+    assert weights.sum() == pytest.approx(1.0)
+    assert weights.max() <= 0.25 + 1e-9
+    # Com poucos ativos o limite é relaxado para 1/n.
+    assert capped_risk_parity(cov[:2, :2], 0.25) == pytest.approx([0.5, 0.5])
+
+
+def test_mean_variance_stays_within_bounds():
+    cov = _random_cov(3)
+    mu = np.array([0.10, 0.12, 0.16])
+    lower, upper = [0.3, 0.1, 0.1], [0.7, 0.35, 0.4]
+    weights = mean_variance(mu, cov, 0.75, lower, upper)
+    assert weights.sum() == pytest.approx(1.0)
+    assert np.all(weights >= np.array(lower) - 1e-9) and np.all(weights <= np.array(upper) + 1e-9)
+    with pytest.raises(ValueError):
+        mean_variance(mu, cov, 0.75, [0.5, 0.5, 0.5], upper)
+
+
+def test_emergency_reserve_shortfall(perfil):
+    reserve = emergency_reserve(perfil, 3500.0)
+    assert reserve["meta"] == 6 * perfil["gastos_fixos"]
+    assert reserve["falta"] == reserve["meta"] - perfil["reservas_emergencia"]
+    assert 0 < reserve["aporte"] <= 3500.0
+    assert reserve["meses_para_completar"] * reserve["aporte"] >= reserve["falta"]
+    assert emergency_reserve(dict(perfil, reservas_emergencia=1e6), 3500.0)["aporte"] == 0
+
+
+def test_covariance_drops_short_histories():
+    histories = _histories(["AAAA3.SA", "BBBB3.SA"])
+    short = synthetic_daily_history("CCCC3.SA", date.today() - timedelta(days=365), years=1)
+    histories["CCCC3.SA"] = {name: column[-40:] for name, column in short.items()}
+    tickers, cov, dropped = covariance_from_histories(histories)
+    assert tickers == ["AAAA3.SA", "BBBB3.SA"] and dropped == ["CCCC3.SA"]
+    np.linalg.cholesky(cov)
+
+
+def test_optimize_allocation_splits_the_savings(perfil):
+    plan = optimize_allocation(perfil, _histories(["ITUB4.SA", "GOAU4.SA", "PETR4.SA", "MXRF11.SA"]))
+    assert plan["economia"] == perfil["renda_mensal"] - perfil["gastos_fixos"]
+    invested = sum(c["valor"] for c in plan["classes"].values())
+    assert invested + plan["reserva"]["aporte"] == pytest.approx(plan["economia"])
+    for name, (low, high) in CLASS_BOUNDS[perfil["tolerancia_risco"]].items():
+        assert low - 1e-9 <= plan["classes"][name]["peso"] <= high + 1e-9
+
+    for name in ("acoes", "fiis"):
+        members = [t for t in plan["tickers"] if t["classe"] == name]
+        assert sum(t["valor"] for t in members) == pytest.approx(plan["classes"][name]["valor"])
+    assert len(plan["tickers"]) == 4 and plan["sem_historico"] == []
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from backends_falsos import FakeYFinanceTools
+from pre_carregamento import SpeculativePrefetcher, parse_number, parse_positions, prefetch_market_data
+
+
+def test_parse_number_formats():
+    assert parse_number("3.612,12") == 3612.12
+    assert parse_number("3612,12") == 3612.12
+    assert parse_number("3612.12") == 3612.12
+    assert parse_number("3.612") == 3612.0
+
+
+def test_parse_positions_invested_quantity_and_average():
+    positions = parse_positions("MXRF11 (100 cotas a R$ 10,20), GOAU4 (R$ 2.000, preço médio 9,80)")
+    assert positions["MXRF11.SA"] == {"investido": None, "quantidade": 100.0, "preco_medio": 10.2}
+    assert positions["GOAU4.SA"] == {"investido": 2000.0, "quantidade": None, "preco_medio": 9.8}
+
+
+def test_parse_positions_plain_a_is_not_an_average_price():
+    positions = parse_positions("ITUB4.SA (3612.12 reais investidos) pretendo manter a 5 anos")
+    assert positions["ITUB4.SA"] == {"investido": 3612.12, "quantidade": None, "preco_medio": None}
+
+
+def test_parse_positions_a_between_quantity_and_price():
+    positions = parse_positions("ITUB4 20 ações a 30,00, total R$ 600")
+    assert positions["ITUB4.SA"] == {"investido": 600.0, "quantidade": 20.0, "preco_medio": 30.0}
+
+
+def test_prefetch_runs_ticker_calls_concurrently():
+    tools = FakeYFinanceTools(payloads={"price": {"GOAU4.SA": "Error fetching price for GOAU4.SA"}}, latency=0.1)
+    start = time.perf_counter()
+    market_data = prefetch_market_data("ITUB4, GOAU4 e MXRF11", tools)
+    # 9 chamadas de 0,1 s: em série levariam 0,9 s.
+    assert time.perf_counter() - start < 0.5
+    assert set(market_data) == {"ITUB4.SA", "GOAU4.SA", "MXRF11.SA"}
+    assert tools.calls == {"price": 3, "fundamentals": 3, "dividends": 3}
+    assert market_data["GOAU4.SA"]["indisponivel"] == ["preco"]
+    assert "preco" in market_data["ITUB4.SA"] and "dividendos_12m" in market_data["MXRF11.SA"]
+
+
+def test_speculative_wait_is_a_total_timeout():
+    release = threading.Event()
+    prefetcher = SpeculativePrefetcher()
+    prefetcher._warm = lambda tickers: release.wait()
+    try:
+        for ticker in ("ITUB4", "GOAU4", "MXRF11"):
+            prefetcher.schedule(ticker)
+        start = time.perf_counter()
+        prefetcher.wait(0.2)
+        assert time.perf_counter() - start < 0.4
+        assert prefetcher.pending() == 3
+    finally:
+        release.set()
+        prefetcher.close()
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from projecao_objetivos import _monthly_log_params, allocation_for, parse_amount, project_goals, simulate_wealth
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Atingir R$ 5.000,00 para reserva de emergência.", 5_000.0),
+        ("R$ 50000.00", 50_000.0),
+        ("R$ 1.5 milhão", 1_500_000.0),
+        ("R$ 1,5 milhão", 1_500_000.0),
+        ("Entrada de apartamento de R$ 120 mil", 120_000.0),
+        ("50 mil reais", 50_000.0),
+        ("carro de R$ 80000 em 24 meses", 80_000.0),
+        ("viajar pelo Brasil", None),
+        # Números sem "R$", escala ou "reais" são prazos e quantidades, não metas.
+        ("Comprar um apartamento em 5 anos", None),
+        ("Viajar para a Europa em 2027", None),
+        ("Reserva de 6 meses de gastos", None),
+        ("carro de 80000 em 24 meses", None),
+    ],
+)
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == expected
+
+
+def test_allocations_sum_to_one():
+    for horizon in ("curto", "medio", "longo"):
+        for tolerance in ("Conservadora", "Moderada", "Agressiva"):
+            assert sum(allocation_for(horizon, tolerance).values()) == pytest.approx(1.0)
+
+
+def test_simulate_wealth_matches_monthly_loop():
+    shocks = np.random.default_rng(1).standard_normal((5, 24))
+    weights = allocation_for("longo", "Moderada")
+    wealth = simulate_wealth(shocks, weights, 500.0, initial=1000.0)
+
+    mean, vol = _monthly_log_params(weights)
+    expected = np.empty_like(shocks)
+    balance = np.full(len(shocks), 1000.0)
+    for month in range(shocks.shape[1]):
+        balance = (balance + 500.0) * np.exp(mean + vol * shocks[:, month])
+        expected[:, month] = balance
+    np.testing.assert_allclose(wealth, expected, rtol=1e-9)
+
+
+def test_project_goals_is_reproducible_and_uses_reserves(perfil):
+    projection = project_goals(perfil, n_paths=2000)
+    assert projection == project_goals(perfil, n_paths=2000)
+    assert projection["aporte_mensal"] == perfil["renda_mensal"] - perfil["gastos_fixos"]
+    goals = {goal["horizonte"]: goal for goal in projection["objetivos"]}
+    assert goals["Curto Prazo"]["meta"] == 25_000.0
+    assert goals["Médio Prazo"]["meta"] == 120_000.0
+
+    # O curto prazo parte das reservas atuais: com mais reserva, a meta chega antes.
+    mais_reserva = project_goals(dict(perfil, reservas_emergencia=20_000.0), n_paths=2000)
+    curto = next(goal for goal in mais_reserva["objetivos"] if goal["horizonte"] == "Curto Prazo")
+    assert curto["meses_percentis"][50] < goals["Curto Prazo"]["meses_percentis"][50]
+
+    long_term = projection["longo_prazo"]["patrimonio"]
+    assert long_term[5][10] <= long_term[5][50] <= long_term[5][90]
+    assert long_term[5][50] < long_term[30][50]
+
+
+def test_goals_without_an_amount_are_not_projected(perfil):
+    projection = project_goals(dict(perfil, obj_medio="Comprar um apartamento em 5 anos"), n_paths=500)
+    assert [goal["horizonte"] for goal in projection["objetivos"]] == ["Curto Prazo"]
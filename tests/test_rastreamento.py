@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import pytest
+
+import rastreamento
+from rastreamento import Tracer
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def test_spans_record_parent_duration_and_errors():
+    relogio = Relogio()
+    tracer = Tracer(clock=relogio)
+    with tracer.span("relatorio") as span:
+        relogio.agora += 1
+        with tracer.span("export_to_pdf"):
+            relogio.agora += 0.5
+        span["refinado"] = True
+        tracer.instant("retry", "cota", tentativa=1)
+    with pytest.raises(ValueError):
+        with tracer.span("falha"):
+            raise ValueError("sem dados")
+
+    events = {event["nome"]: event for event in tracer.events}
+    assert events["export_to_pdf"]["pai"] == "relatorio" and events["export_to_pdf"]["duracao_us"] == 500_000
+    assert events["relatorio"]["duracao_us"] == 1_500_000 and events["relatorio"]["atributos"] == {"refinado": True}
+    assert events["retry"]["pai"] == "relatorio" and events["retry"]["duracao_us"] is None
+    assert events["falha"]["atributos"]["erro"] == "ValueError: sem dados"
+    assert tracer.summary() == ["relatorio: 1.50s (1x)", "export_to_pdf: 0.50s (1x)", "falha: 0.00s (1x)"]
+
+
+def test_parent_span_follows_asyncio_tasks():
+    tracer = Tracer()
+
+    async def job(name):
+        with tracer.span(name):
+            await asyncio.sleep(0)
+            with tracer.span(f"{name}:etapa"):
+                await asyncio.sleep(0)
+
+    async def main():
+        await asyncio.gather(job("a"), job("b"))
+
+    asyncio.run(main())
+    parents = {event["nome"]: event["pai"] for event in tracer.events}
+    assert parents == {"a:etapa": "a", "b:etapa": "b", "a": None, "b": None}
+
+
+def test_listeners_see_their_context_and_cannot_break_the_pipeline():
+    tracer = Tracer()
+    seen = []
+    with tracer.listen(lambda phase, event: seen.append((phase, event["nome"]))):
+        with tracer.span("etapa"):
+            tracer.progress("stream:x", trecho="abc")
+    with tracer.listen(lambda phase, event: 1 / 0):
+        with tracer.span("sem_ouvinte_valido"):
+            pass
+    with tracer.span("fora"):
+        pass
+    assert seen == [("inicio", "etapa"), ("progresso", "stream:x"), ("fim", "etapa")]
+
+
+def test_event_buffer_is_bounded_and_exports(tmp_path):
+    tracer = Tracer(max_events=3)
+    for i in range(5):
+        tracer.instant(f"evento{i}")
+    assert [event["nome"] for event in tracer.events] == ["evento2", "evento3", "evento4"]
+
+    chrome = json.loads(open(tracer.export(str(tmp_path / "trace.json")), encoding="utf-8").read())
+    assert [e["ph"] for e in chrome["traceEvents"]] == ["i", "i", "i"]
+    lines = open(tracer.export(str(tmp_path / "trace.jsonl")), encoding="utf-8").read().splitlines()
+    assert [json.loads(line)["nome"] for line in lines] == ["evento2", "evento3", "evento4"]
+
+
+def test_profiled_writes_reports_only_when_requested(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(rastreamento, "PROFILE_DIR", str(tmp_path / "perfis"))
+    monkeypatch.delenv("PIPELINE_PROFILE", raising=False)
+    with rastreamento.profiled("sem_perfil"):
+        sum(range(1000))
+    assert not (tmp_path / "perfis").exists()
+
+    monkeypatch.setenv("PIPELINE_PROFILE", "1")
+    with rastreamento.profiled("com_perfil"):
+        sorted(range(10000), reverse=True)
+    names = sorted(p.suffix for p in (tmp_path / "perfis").iterdir())
+    assert names == [".prof", ".txt"]
@@ -0,0 +1,72 @@
+import contextlib
+import io
+import shutil
+
+import pytest
+
+from backends_falsos import FakeAgent, FakeYFinanceTools
+from regeneracao_incremental import ProfileRecord, SectionStore, generate_incremental_report
+
+
+@pytest.fixture(autouse=True)
+def pasta_temporaria(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("RESPONSE_CACHE_BYPASS", raising=False)
+    return tmp_path
+
+
+def test_store_key_uses_investor_id_when_given(perfil):
+    sem_id = ProfileRecord.from_profile(perfil)
+    assert sem_id.key == ProfileRecord.from_profile(dict(perfil, renda_mensal=9000)).key
+    a = ProfileRecord.from_profile(perfil, investor_id="cliente-1")
+    b = ProfileRecord.from_profile(perfil, investor_id="cliente-2")
+    assert len({sem_id.key, a.key, b.key}) == 3
+
+
+class Agentes:
+    """
+    Agentes falsos que contam as chamadas; a análise por ticker muda de versão sob demanda.
+    """
+
+    def __init__(self):
+        self.versao = 1
+        self.secoes = 0
+
+    def secao(self):
+        def chunks(prompt):
+            self.secoes += 1
+            return [prompt.split("**", 2)[1] + "\nTexto da seção.\n"]
+
+        return FakeAgent(chunks)
+
+    def ticker(self):
+        return FakeAgent(lambda prompt: [f"### Análise\nVersão {self.versao}.\n"])
+
+
+def _gerar(perfil, store, agentes, tools):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return generate_incremental_report(
+            perfil,
+            "relatorio.pdf",
+            agent_factory=agentes.secao,
+            market_tools=tools,
+            ticker_agent_factory=agentes.ticker,
+            store=store,
+            max_workers=1,
+        )
+
+
+def test_changed_ticker_analysis_regenerates_dependent_sections(tmp_path, perfil):
+    store = SectionStore(str(tmp_path / "secoes"))
+    agentes, tools = Agentes(), FakeYFinanceTools()
+
+    primeiro = _gerar(perfil, store, agentes, tools)
+    assert not primeiro["falharam"]
+    assert _gerar(perfil, store, agentes, tools)["regeneradas"] == []
+
+    # Uma análise por ticker refeita com outro texto invalida as seções que a usam.
+    store.index["analise_ticker:ITUB4.SA"]["impressao"] = "antiga"
+    shutil.rmtree(tmp_path / ".cache" / "analises_ticker")
+    agentes.versao = 2
+    refeitas = _gerar(perfil, store, agentes, tools)["regeneradas"]
+    assert set(refeitas) == {"analise_ticker:ITUB4.SA", "comparativo_setorial", "plano_alocacao"}
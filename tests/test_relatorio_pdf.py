@@ -0,0 +1,122 @@
+import os
+
+import pytest
+from reportlab.platypus import Paragraph, Preformatted, Table
+
+from relatorio_pdf import StreamingPdfRenderer, column_widths, export_to_pdf, format_inline, split_table_row
+
+RELATORIO = """# Relatório
+
+## Carteira
+
+Texto com **negrito** e `código`.
+
+- item um
+- item dois
+
+| Ticker | Peso |
+|---|---|
+| ITUB4 | 40% |
+| MXRF11 | 60% |
+
+```
+bloco de código
+```
+
+| Resumo | Valor |
+|:--|--:|
+| Total | R$ 1.000 |"""
+
+
+def _describe(story):
+    """
+    Sequência comparável dos flowables: tipo e conteúdo (espaçadores ignorados).
+    """
+    items = []
+    for flowable in story:
+        if isinstance(flowable, Paragraph):
+            items.append(("p", flowable.text))
+        elif isinstance(flowable, Table):
+            items.append(("t", [[getattr(c, "text", c) for c in row] for row in flowable._cellvalues]))
+        elif isinstance(flowable, Preformatted):
+            items.append(("code", "\n".join(flowable.lines)))
+    return items
+
+
+def _stream(tmp_path, chunks, name):
+    """
+    Alimenta o renderizador trecho a trecho; `built` recebe a história entregue ao doc.build
+    (que consome a lista original ao paginar).
+    """
+    renderer = StreamingPdfRenderer(str(tmp_path / name))
+    build, built = renderer.doc.build, []
+
+    def capture(story):
+        built.extend(_describe(story))
+        build(story)
+
+    renderer.doc.build = capture
+    for chunk in chunks:
+        renderer.feed(chunk)
+    return renderer, built
+
+
+def test_chunk_boundaries_do_not_change_the_document(tmp_path, capsys):
+    whole, built_whole = _stream(tmp_path, [RELATORIO], "inteiro.pdf")
+    pieces, built_pieces = _stream(
+        tmp_path, [RELATORIO[i : i + 7] for i in range(0, len(RELATORIO), 7)], "trechos.pdf"
+    )
+    whole.close()
+    pieces.close()
+    assert built_whole == built_pieces
+    assert [kind for kind, _ in built_whole] == ["p", "p", "p", "p", "p", "t", "code", "t"]
+
+
+def test_trailing_table_is_kept_and_pdf_is_written_atomically(tmp_path, capsys):
+    filename = str(tmp_path / "relatorio.pdf")
+    export_to_pdf(RELATORIO, filename)
+    with open(filename, "rb") as f:
+        assert f.read(5) == b"%PDF-"
+    assert not os.path.exists(filename + ".tmp")
+
+    renderer, built = _stream(tmp_path, [RELATORIO], "final.pdf")
+    # A última linha, sem quebra, só é processada no close().
+    assert _describe(renderer.story)[-1] == ("code", "bloco de código")
+    renderer.close()
+    assert built[-1] == ("t", [["Resumo", "Valor"], ["Total", "R$ 1.000"]])
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("texto simples", "texto simples"),
+        ("**forte** e __forte__", "<b>forte</b> e <b>forte</b>"),
+        ("*ênfase* e _ênfase_", "<i>ênfase</i> e <i>ênfase</i>"),
+        ("use `pip`", 'use <font face="Courier">pip</font>'),
+        ("P/L < 10 & ROE > 15%", "P/L &lt; 10 &amp; ROE &gt; 15%"),
+        ("**a < b**", "<b>a &lt; b</b>"),
+        ("nome_do_arquivo e 2 * 3 * 4", "nome_do_arquivo e 2 * 3 * 4"),
+    ],
+)
+def test_format_inline(text, expected):
+    assert format_inline(text) == expected
+
+
+def test_split_table_row_keeps_empty_cells():
+    assert split_table_row("| a | | c |") == ["a", "", "c"]
+    assert split_table_row("a | b") == ["a", "b"]
+
+
+def test_table_separators_and_ragged_rows(tmp_path, capsys):
+    renderer = StreamingPdfRenderer(str(tmp_path / "tabela.pdf"))
+    renderer.feed("| A | B | C |\n| :--- | ---: | :-: |\n| 1 | 2 |\n\n")
+    (table,) = [f for f in renderer.story if isinstance(f, Table)]
+    assert table._cellvalues == [["A", "B", "C"], ["1", "2", ""]]
+    assert table.repeatRows == 1
+
+
+def test_column_widths_follow_content():
+    widths = column_widths([["Ticker", "Descrição"], ["ITUB4", "x" * 200]], 600)
+    assert sum(widths) == pytest.approx(600)
+    # Texto longo é limitado a 60 caracteres; colunas curtas têm um mínimo de 6.
+    assert widths[1] / widths[0] == pytest.approx(60 / 6)
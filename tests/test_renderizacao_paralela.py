@@ -0,0 +1,24 @@
+import queue
+
+from renderizacao_paralela import PdfRenderService
+
+RELATORIO = "# Relatório\n\n| Ticker | Peso |\n|---|---|\n| ITUB4 | 40% |\n\n" + "Parágrafo do relatório. " * 50
+
+
+def test_render_all_writes_every_pdf_and_reports_errors(tmp_path):
+    reports = queue.Queue()
+    for i in range(3):
+        reports.put((RELATORIO, str(tmp_path / f"relatorio_{i}.pdf")))
+    reports.put((RELATORIO, str(tmp_path / "pasta_inexistente" / "relatorio.pdf")))
+    reports.put(None)
+
+    with PdfRenderService(max_workers=2) as service:
+        results = service.render_all(iter(reports.get, None))
+        assert service.submit(RELATORIO, str(tmp_path / "avulso.pdf")).result() == str(tmp_path / "avulso.pdf")
+
+    errors = {name: error for name, error in results.items() if error}
+    assert list(errors) == [str(tmp_path / "pasta_inexistente" / "relatorio.pdf")]
+    for i in range(3):
+        assert results[str(tmp_path / f"relatorio_{i}.pdf")] is None
+        assert (tmp_path / f"relatorio_{i}.pdf").read_bytes().startswith(b"%PDF")
+    assert (tmp_path / "avulso.pdf").read_bytes().startswith(b"%PDF")
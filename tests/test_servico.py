@@ -0,0 +1,93 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+from backends_falsos import FakeGeminiServer, FakeYFinanceTools, split_chunks
+from servico import ReportService, serve
+
+RELATORIO = "# Relatório\n\n## Análise\n\n" + "Texto da análise da carteira do investidor. " * 40 + "\n"
+
+
+@pytest.fixture
+def servico(tmp_path, monkeypatch):
+    """
+    Serviço real (agentes agno) em porta efêmera, com o modelo apontado para o Gemini falso.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PIPELINE_CHECKPOINTS", "0")
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    with FakeGeminiServer(split_chunks(RELATORIO)) as gemini:
+        monkeypatch.setenv("GEMINI_BASE_URL", gemini.url)
+        service = ReportService(
+            str(tmp_path / "saida"), workers=1, use_response_cache=False, market_tools=FakeYFinanceTools()
+        )
+        server = serve(service, "127.0.0.1", 0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield server.server_address[1], gemini
+        finally:
+            server.shutdown()
+            server.server_close()
+            service.shutdown()
+
+
+def _request(port, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = connection.getresponse()
+    return response, response.read()
+
+
+def _read_events(port, path):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    connection.request("GET", path)
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.getheader("Content-Type").startswith("text/event-stream")
+    events, fields = [], {}
+    for line in response:
+        line = line.decode("utf-8").rstrip("\n")
+        if line.startswith("data: "):
+            fields["data"] = json.loads(line[len("data: ") :])
+        elif line.startswith("event: "):
+            fields["event"] = line[len("event: ") :]
+        elif not line and fields:
+            events.append(fields)
+            fields = {}
+    return events
+
+
+def test_profile_to_pdf_over_http(servico, perfil):
+    port, gemini = servico
+    response, body = _request(port, "POST", "/relatorios", perfil)
+    assert response.status == 202
+    job = json.loads(body)
+
+    events = _read_events(port, job["eventos"])
+    statuses = [e["data"]["status"] for e in events if e["event"] == "status"]
+    assert statuses[0] == "na_fila" and "executando" in statuses
+    assert statuses[-1] == "concluido"
+    assert any(e["event"] == "etapa" for e in events)
+
+    response, pdf = _request(port, "GET", job["pdf"])
+    assert response.status == 200
+    assert response.getheader("Content-Type") == "application/pdf"
+    assert pdf.startswith(b"%PDF")
+    # Análise e refinamento passaram pelo modelo falso.
+    assert len(gemini.prompts) >= 2
+
+    response, body = _request(port, "GET", "/saude")
+    assert response.status == 200
+
+
+def test_rejects_invalid_profiles(servico):
+    port, _ = servico
+    response, body = _request(port, "POST", "/relatorios", {"renda_mensal": "muita"})
+    assert response.status == 400
+    assert "erro" in json.loads(body)
+    response, _ = _request(port, "GET", "/relatorios/inexistente/pdf")
+    assert response.status == 404
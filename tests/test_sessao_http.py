@@ -0,0 +1,96 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from sessao_http import ConnectionStats, _counting_transport, create_curl_session
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_connection_stats_counts_new_and_reused_connections():
+    stats = ConnectionStats()
+    assert stats.summary() == "Conexões HTTP: nenhuma requisição"
+
+    stats.record("query1.finance.yahoo.com", True, 0.25)
+    stats.record("query1.finance.yahoo.com", False)
+    stats.record("query1.finance.yahoo.com", False)
+    stats.record("generativelanguage.googleapis.com", True, 0.1)
+
+    yahoo = stats.snapshot()["query1.finance.yahoo.com"]
+    assert yahoo == {"requisicoes": 3, "novas": 1, "reaproveitadas": 2, "conexao_s": 0.25, "reuso": 0.667}
+    # O host com mais requisições vem primeiro no resumo.
+    assert stats.summary().startswith("Conexões HTTP: query1.finance.yahoo.com 3 req., 1 novas, 67% reaproveitadas")
+
+    stats.reset()
+    assert stats.snapshot() == {}
+
+
+def test_pooled_curl_session_reuses_connections_across_threads(servidor):
+    stats = ConnectionStats()
+    session = create_curl_session(pool_size=2, stats=stats)
+    try:
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            responses = list(pool.map(lambda _: session.get(servidor), range(24)))
+        assert {response.status_code for response in responses} == {200}
+        # No máximo um handle por vaga do pool, e nenhum handle fica emprestado ao final.
+        assert session._handles.qsize() <= 2
+        assert session.curl is not None
+
+        entry = stats.snapshot()["127.0.0.1"]
+        assert entry["requisicoes"] == 24
+        # Cada handle abre a sua conexão uma vez; as demais requisições a reaproveitam.
+        assert entry["novas"] <= 2
+        assert entry["reaproveitadas"] == 24 - entry["novas"]
+    finally:
+        session.close()
+    assert session._handles.empty()
+
+
+def test_pool_size_bounds_concurrent_requests(servidor):
+    session = create_curl_session(pool_size=1, stats=ConnectionStats())
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda _: session.get(servidor), range(8)))
+        # Com uma vaga, as requisições se revezam no mesmo handle.
+        assert session._handles.qsize() == 1
+    finally:
+        session.close()
+
+
+def test_httpx_counting_transport_records_reuse(servidor):
+    import httpx
+
+    stats = ConnectionStats()
+    with httpx.Client(transport=_counting_transport(stats)) as client:
+        for _ in range(5):
+            assert client.get(servidor).text == "ok"
+
+    entry = stats.snapshot()["127.0.0.1"]
+    assert (entry["requisicoes"], entry["novas"], entry["reaproveitadas"]) == (5, 1, 4)